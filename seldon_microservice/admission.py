@@ -0,0 +1,230 @@
+"""
+Admission control.
+
+An overloaded server queues requests without limit until they all time out together. An
+AdmissionController caps the requests processed at once, lets a bounded number of others
+wait for a slot, and rejects the rest straight away with MicroserviceOverloaded (503 for
+REST, RESOURCE_EXHAUSTED for gRPC, reason MICROSERVICE_OVERLOADED). A request is also
+rejected as soon as the wait expected from the queue ahead of it, estimated from recent
+service times, is longer than its client is willing to wait: the gRPC deadline, or the
+Seldon-Timeout-Ms header of REST requests.
+
+Enabled with --max-in-flight N for the REST and gRPC servers. The gRPC server then has a
+worker for each call processed or queued and accepts no more calls. The flatbuffers server is
+left out: it handles one request at a time on its event loop and the requests waiting
+behind it stay unread in the sockets, where they cannot be counted.
+"""
+from __future__ import absolute_import, division, print_function
+import contextlib
+import threading
+import time
+
+from .common import SeldonMicroserviceException
+
+MAX_IN_FLIGHT_ENV_NAME = "SELDON_MAX_IN_FLIGHT"
+MAX_QUEUE_ENV_NAME = "SELDON_MAX_QUEUE"
+MAX_QUEUE_TIME_ENV_NAME = "SELDON_MAX_QUEUE_TIME"
+
+# milliseconds, from the time it is received, that the client of a REST request waits for it
+TIMEOUT_HEADER = "Seldon-Timeout-Ms"
+# weight of the latest request in the moving average of the service time
+SMOOTHING = 0.1
+# requests that are not predictions, e.g. probes, always go through
+EXEMPT_PATHS = ("/live", "/ready", "/seldon.json", "/feedback-metrics")
+
+
+class MicroserviceOverloaded(SeldonMicroserviceException):
+    status_code = 503
+    reason = "MICROSERVICE_OVERLOADED"
+
+
+class AdmissionController(object):
+    """
+    Admits up to max_in_flight requests at once, with up to max_queue more waiting at most
+    max_queue_time seconds (or their own timeout) for a slot.
+    """
+
+    def __init__(self, max_in_flight, max_queue=0, max_queue_time=None):
+        if max_in_flight <= 0:
+            raise ValueError("Admission control needs a positive number of requests in flight")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_time = max_queue_time
+        self.in_flight = 0
+        self.queued = 0
+        self.service_time = None
+        self.admitted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+    def estimated_wait(self, position):
+        """Expected time before the request at position in the queue gets a slot."""
+        if self.service_time is None:
+            return 0.
+        return position * self.service_time / self.max_in_flight
+
+    def _reject(self, message):
+        self.rejected += 1
+        raise MicroserviceOverloaded(message)
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a slot and return the admission time, to be handed to release. timeout is
+        the time left before the client gives up, None if unknown.
+        """
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                if self.queued >= self.max_queue:
+                    self._reject("Too many requests in flight")
+                if timeout is not None and self.estimated_wait(self.queued + 1) > timeout:
+                    self._reject("Expected queue time exceeds the request timeout")
+                waits = [wait for wait in (timeout, self.max_queue_time) if wait is not None]
+                deadline = time.time() + min(waits) if waits else None
+                self.queued += 1
+                try:
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = None if deadline is None else deadline - time.time()
+                        if remaining is not None and remaining <= 0:
+                            self._reject("Timed out waiting for a request slot")
+                        self._available.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.in_flight += 1
+            self.admitted += 1
+            return time.time()
+
+    def release(self, admitted_at):
+        elapsed = time.time() - admitted_at
+        with self._lock:
+            self.in_flight -= 1
+            if self.service_time is None:
+                self.service_time = elapsed
+            else:
+                self.service_time += SMOOTHING * (elapsed - self.service_time)
+            self._available.notify()
+
+    @contextlib.contextmanager
+    def admit(self, timeout=None):
+        admitted_at = self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release(admitted_at)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "service_time_seconds": self.service_time,
+            }
+
+
+def get_admission_controller(max_in_flight, max_queue=0, max_queue_time=None):
+    """An AdmissionController, or None when max_in_flight is 0."""
+    if max_in_flight <= 0:
+        return None
+    return AdmissionController(max_in_flight, max_queue, max_queue_time)
+
+
+def request_timeout(headers):
+    """The timeout in seconds of a REST request, from its headers, or None."""
+    value = headers.get(TIMEOUT_HEADER)
+    if value is None:
+        return None
+    try:
+        return float(value) / 1000.
+    except ValueError:
+        raise SeldonMicroserviceException("Invalid {} header {}".format(TIMEOUT_HEADER, value))
+
+
+def request_deadline(headers, received_at=None):
+    """
+    The time.time() by which a REST request must be answered, from the time it was received
+    (now by default) and its headers, or None.
+    """
+    timeout = request_timeout(headers)
+    if timeout is None:
+        return None
+    return (time.time() if received_at is None else received_at) + timeout
+
+
+def record_arrival(app):
+    """
+    Keep the time each request of a Flask app is received in g.received_at, set before any
+    other before_request hook runs, e.g. one waiting for admission.
+    """
+    from flask import g
+    if "seldon_arrival" in app.extensions:
+        return
+
+    def received():
+        g.received_at = time.time()
+
+    app.before_request_funcs.setdefault(None, []).insert(0, received)
+    app.extensions["seldon_arrival"] = True
+
+
+def add_admission_control(app, controller):
+    """Admit the requests of a Flask app through controller."""
+    from flask import g, request
+    record_arrival(app)
+
+    @app.before_request
+    def admit_request():
+        if request.path in EXEMPT_PATHS:
+            return
+        deadline = request_deadline(request.headers, g.get("received_at"))
+        g.admitted_at = controller.acquire(None if deadline is None else deadline - time.time())
+
+    @app.teardown_request
+    def release_request(exception):
+        admitted_at = g.pop("admitted_at", None)
+        if admitted_at is not None:
+            controller.release(admitted_at)
+
+
+def grpc_server_limits(controller):
+    """
+    The get_grpc_server arguments of a server admitting its calls through controller: a worker
+    for each call processed or waiting for a slot, and no more calls than that accepted, the
+    others being rejected with RESOURCE_EXHAUSTED by gRPC itself. Otherwise calls beyond the
+    workers wait in the unbounded queue of the executor, unseen by the controller.
+    """
+    limit = controller.max_in_flight + controller.max_queue
+    return {"max_workers": limit, "maximum_concurrent_rpcs": limit}
+
+
+def get_grpc_interceptor(controller):
+    """A gRPC server interceptor admitting the unary calls through controller."""
+    import grpc
+
+    class AdmissionInterceptor(grpc.ServerInterceptor):
+
+        def intercept_service(self, continuation, handler_call_details):
+            handler = continuation(handler_call_details)
+            if handler is None or handler.unary_unary is None:
+                return handler
+            behavior = handler.unary_unary
+
+            def admitted(request, context):
+                try:
+                    admitted_at = controller.acquire(context.time_remaining())
+                except MicroserviceOverloaded as e:
+                    context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "{}: {}".format(e.reason, e.message))
+                try:
+                    return behavior(request, context)
+                finally:
+                    controller.release(admitted_at)
+
+            return grpc.unary_unary_rpc_method_handler(
+                admitted,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer)
+
+    return AdmissionInterceptor()
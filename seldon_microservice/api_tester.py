@@ -1,293 +1,234 @@
 import argparse
-import requests
-from requests.auth import HTTPBasicAuth
-import numpy as np
 import json
-import requests
-import urllib
-from google.protobuf import json_format
-from google.protobuf.struct_pb2 import ListValue
-import grpc
 import sys
-
-from .proto import prediction_pb2
-from .proto import prediction_pb2_grpc
-
-
-def array_to_list_value(array, lv=None):
-    if lv is None:
-        lv = ListValue()
-    if len(array.shape) == 1:
-        lv.extend(array)
-    else:
-        for sub_array in array:
-            sub_lv = lv.add_list()
-            array_to_list_value(sub_array, sub_lv)
-    return lv
-
-
-def gen_continuous(range, n):
-    if range[0] == "inf" and range[1] == "inf":
-        return np.random.normal(size=n)
-    if range[0] == "inf":
-        return range[1] - np.random.lognormal(size=n)
-    if range[1] == "inf":
-        return range[0] + np.random.lognormal(size=n)
-    return np.random.uniform(range[0], range[1], size=n)
-
-
-def reconciliate_cont_type(feature, dtype):
-    if dtype == "FLOAT":
-        return feature
-    if dtype == "INT":
-        return (feature + 0.5).astype(int).astype(float)
-
-
-def gen_categorical(values, n):
-    vals = np.random.randint(len(values), size=n)
-    return np.array(values)[vals].astype(float)
-
-
-def generate_batch(contract, n, field):
-    feature_batches = []
-    for feature_def in contract[field]:
-        if feature_def["ftype"] == "continuous":
-            if "range" in feature_def:
-                range = feature_def["range"]
-            else:
-                range = ["inf", "inf"]
-            if "shape" in feature_def:
-                shape = [n] + feature_def["shape"]
-            else:
-                shape = [n, 1]
-            batch = gen_continuous(range, shape)
-            batch = reconciliate_cont_type(batch, feature_def["dtype"])
-        elif feature_def["ftype"] == "categorical":
-            batch = gen_categorical(feature_def["values"], [n, 1])
-        feature_batches.append(batch)
-    return np.concatenate(feature_batches, axis=1)
-
-
-def gen_REST_request(batch, features, tensor=True):
-    if tensor:
-        datadef = {
-            "names": features,
-            "tensor": {
-                "shape": batch.shape,
-                "values": batch.ravel().tolist()
-            }
-        }
-    else:
-        datadef = {
-            "names": features,
-            "ndarray": batch.tolist()
-        }
-
-    request = {
-        "meta": {},
-        "data": datadef
-    }
-
-    return request
-
-
-def gen_GRPC_request(batch, features, tensor=True):
-    if tensor:
-        datadef = prediction_pb2.DefaultData(
-            names=features,
-            tensor=prediction_pb2.Tensor(
-                shape=batch.shape,
-                values=batch.ravel().tolist()
-            )
-        )
+import threading
+import time
+
+from .contract import compile_contract, make_rng
+from .tester import gen_REST_request, gen_GRPC_request, print_exchange, print_error, \
+    print_interval, read_contract
+from .loadgen import run_load, RESTClient, GRPCClient
+
+# API gateway endpoints of the tester endpoints
+REST_ENDPOINTS = {
+    "predict": "/api/v0.1/predictions",
+    "send-feedback": "/api/v0.1/feedback",
+}
+GRPC_METHODS = {
+    "predict": "Predict",
+    "send-feedback": "SendFeedback",
+}
+# tokens are refreshed this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 30
+
+
+def fetch_token(url, key, secret):
+    """Request a client credentials token, return it with its lifetime in seconds (or None)."""
+    import requests
+    from requests.auth import HTTPBasicAuth
+    response = requests.post(url, auth=HTTPBasicAuth(key, secret),
+                             data={'grant_type': 'client_credentials'})
+    response.raise_for_status()
+    token = response.json()
+    return token["access_token"], token.get("expires_in")
+
+
+def get_token_url(args):
+    if "oauth_port" in args and not args.oauth_port is None:
+        port = args.oauth_port
     else:
-        datadef = prediction_pb2.DefaultData(
-            names=features,
-            ndarray=array_to_list_value(batch)
-        )
-    request = prediction_pb2.SeldonMessage(
-        data=datadef
-    )
-    return request
-
-
-def unfold_contract(contract):
-    unfolded_contract = {}
-    unfolded_contract["targets"] = []
-    unfolded_contract["features"] = []
-
-    for feature in contract["features"]:
-        if feature.get("repeat") is not None:
-            for i in range(feature.get("repeat")):
-                new_feature = {}
-                new_feature.update(feature)
-                new_feature["name"] = feature["name"] + str(i + 1)
-                del new_feature["repeat"]
-                unfolded_contract["features"].append(new_feature)
+        port = args.port
+    return "http://" + args.host + ":" + str(port) + "/oauth/token"
+
+
+class TokenCache(object):
+    """
+    Shares an OAuth token between the workers of a run. The token is fetched once and
+    refreshed refresh_margin seconds before it expires, or after invalidate is called when
+    the gateway rejected it. last_token is the token last handed out to the calling thread,
+    i.e. the one its failed request was sent with.
+    """
+
+    def __init__(self, url, key, secret, refresh_margin=TOKEN_REFRESH_MARGIN, fetch=fetch_token):
+        self.url = url
+        self.key = key
+        self.secret = secret
+        self.refresh_margin = refresh_margin
+        self.fetch = fetch
+        self.fetches = 0
+        self._token = None
+        self._expires_at = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def token(self):
+        with self._lock:
+            if self._token is None or \
+                    (self._expires_at is not None and time.time() >= self._expires_at - self.refresh_margin):
+                token, expires_in = self.fetch(self.url, self.key, self.secret)
+                self.fetches += 1
+                self._token = token
+                self._expires_at = None if expires_in is None else time.time() + float(expires_in)
+            self._local.token = self._token
+            return self._token
+
+    def last_token(self):
+        return getattr(self._local, "token", None)
+
+    def invalidate(self, token=None):
+        """Drop the token, unless it was already replaced since token was handed out."""
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+
+    def rest_headers(self):
+        return {'Authorization': 'Bearer ' + self.token()}
+
+    def grpc_metadata(self):
+        return [('oauth_token', self.token())]
+
+
+def is_unauthorized(e):
+    response = getattr(e, "response", None)
+    if response is not None and getattr(response, "status_code", None) == 401:
+        return True
+    code = getattr(e, "code", None)
+    return callable(code) and getattr(code(), "name", None) == "UNAUTHENTICATED"
+
+
+def get_clients(args, endpoints, tokens=None):
+    clients = {}
+    for endpoint in endpoints:
+        if args.grpc:
+            from .proto import prediction_pb2_grpc
+            clients[endpoint] = GRPCClient(args.host, args.port, prediction_pb2_grpc.SeldonStub,
+                                           GRPC_METHODS[endpoint],
+                                           auth=tokens.grpc_metadata if tokens else None)
         else:
-            unfolded_contract["features"].append(feature)
-
-    for target in contract["targets"]:
-        if target.get("repeat") is not None:
-            for i in range(target.get("repeat")):
-                new_target = {}
-                new_target.update(target)
-                new_target["name"] = target["name"] + str(i + 1)
-                del new_target["repeat"]
-                unfolded_contract["targets"].append(new_target)
+            # requests through the OAuth gateway do not go through the ambassador path
+            prefix = "" if tokens else (args.ambassador_path or "")
+            url = "http://" + args.host + ":" + str(args.port) + prefix + REST_ENDPOINTS[endpoint]
+            clients[endpoint] = RESTClient(url, form=False,
+                                           auth=tokens.rest_headers if tokens else None)
+    return clients
+
+
+def get_request_generator(args):
+    """Return request(endpoint, i), building the message of request i of endpoint."""
+    contract = read_contract(args.contract)
+    features = compile_contract(contract, 'features')
+    targets = compile_contract(contract, 'targets') if contract.get("targets") else None
+
+    def request(endpoint, i):
+        rng = None if args.seed is None else make_rng([args.seed, i])
+        batch = features.generate(args.batch_size, rng=rng)
+        if args.grpc:
+            from .proto import prediction_pb2
+            message = gen_GRPC_request(batch, features=features.names, tensor=args.tensor)
         else:
-            unfolded_contract["targets"].append(target)
+            message = gen_REST_request(batch, features=features.names, tensor=args.tensor)
+        if endpoint == "predict":
+            return message
+        response = targets.generate(args.batch_size, rng=rng)
+        if args.grpc:
+            return prediction_pb2.Feedback(
+                request=message,
+                response=gen_GRPC_request(response, features=targets.names, tensor=args.tensor),
+                reward=1.0)
+        return {
+            "request": message,
+            "response": gen_REST_request(response, features=targets.names, tensor=args.tensor),
+            "reward": 1.0,
+        }
 
-    return unfolded_contract
+    return request
 
 
-def get_token(args):
-    payload = {'grant_type': 'client_credentials'}
-    if "oauth_port" in args and not args.oauth_port is None:
-        port = args.oauth_port
+def get_mix(args):
+    """The endpoints of the run and the fraction of the requests sent to each."""
+    if args.mix:
+        mix = dict((endpoint, float(weight)) for endpoint, weight in args.mix.items())
     else:
-        port = args.port
-    url = "http://" + args.host + ":" + str(port) + "/oauth/token"
-    print("Getting token from " + url)
-    response = requests.post(
-        url,
-        auth=HTTPBasicAuth('oauth-key', 'oauth-secret'),
-        data=payload)
-    print(response.text)
-    token = response.json()["access_token"]
-    return token
+        mix = {args.endpoint: 1.0}
+    unknown = set(mix) - set(REST_ENDPOINTS)
+    if unknown:
+        raise ValueError("Unknown endpoints in the mix: {}".format(", ".join(sorted(unknown))))
+    total = sum(mix.values())
+    return dict((endpoint, weight / total) for endpoint, weight in mix.items() if weight > 0)
+
+
+def run_scenario(args):
+    """
+    Send args.n_requests requests spread over the endpoints of the mix from
+    args.concurrency workers, and report the latencies overall and per endpoint.
+    """
+    mix = get_mix(args)
+    endpoints = sorted(mix)
+    schedule = make_rng(args.seed).choice(len(endpoints), size=args.n_requests,
+                                          p=[mix[endpoint] for endpoint in endpoints])
+    tokens = None
+    if args.oauth_key:
+        tokens = TokenCache(get_token_url(args), args.oauth_key, args.oauth_secret or 'oauth-secret')
+    clients = get_clients(args, endpoints, tokens)
+    make_request = get_request_generator(args)
+
+    def next_request(i):
+        endpoint = endpoints[schedule[i]]
+        return endpoint, make_request(endpoint, i)
+
+    def send(request):
+        endpoint, message = request
+        return clients[endpoint](message)
+
+    def on_error(i, request, e):
+        # on_error runs in the worker that sent the request: a late 401 for a token that
+        # was already replaced does not drop the new one
+        if tokens is not None and is_unauthorized(e):
+            tokens.invalidate(tokens.last_token())
+        print_error(i, request[0], e)
+
+    result = run_load(send, next_request, args.n_requests,
+                      concurrency=args.concurrency, rate=args.rate,
+                      on_response=(lambda i, request, response: print_exchange(i, request[1], response))
+                      if args.prnt else None,
+                      on_error=on_error,
+                      interval=args.interval, on_interval=print_interval,
+                      label=lambda i, request: request[0])
+    print(result.report())
+    if tokens is not None:
+        print("OAuth tokens fetched: {}".format(tokens.fetches))
+    if args.output:
+        result.write(args.output)
+    return result
 
 
 def run_send_feedback(args):
-    contract = json.load(open(args.contract, 'r'))
-    contract = unfold_contract(contract)
-    feature_names = [feature["name"] for feature in contract["features"]]
-    response_names = [feature["name"] for feature in contract["targets"]]
-
-    REST_url = "http://" + args.host + ":" + str(args.port) + "/send-feedback"
-
-    for i in range(args.n_requests):
-        batch = generate_batch(contract, args.batch_size, 'features')
-        response = generate_batch(contract, args.batch_size, 'targets')
-        if args.prnt:
-            print('-' * 40)
-            print("SENDING NEW REQUEST:")
-
-        if not args.grpc:
-            REST_request = gen_REST_request(batch, features=feature_names, tensor=args.tensor)
-            REST_response = gen_REST_request(response, features=response_names, tensor=args.tensor)
-            reward = 1.0
-            REST_feedback = {"request": REST_request, "response": REST_response, "reward": reward}
-            if args.prnt:
-                print(REST_feedback)
-
-            if args.oauth_key:
-                token = get_token(args)
-                headers = {'Authorization': 'Bearer ' + token}
-                response = requests.post(
-                    "http://" + args.host + ":" + str(args.port) + "/api/v0.1/feedback",
-                    json=REST_feedback,
-                    headers=headers
-                )
-            else:
-                response = requests.post(
-                    "http://" + args.host + ":" + str(
-                        args.port) + args.ambassador_path + "/api/v0.1/feedback",
-                    json=REST_feedback,
-                    headers=headers
-                )
-
-            if args.prnt:
-                print(response)
-
-        elif args.grpc:
-            GRPC_request = gen_GRPC_request(batch, features=feature_names, tensor=args.tensor)
-            GRPC_response = gen_GRPC_request(response, features=response_names, tensor=args.tensor)
-            reward = 1.0
-            GRPC_feedback = prediction_pb2.Feedback(
-                request=GRPC_request,
-                response=GRPC_response,
-                reward=reward
-            )
-
-            if args.prnt:
-                print(GRPC_feedback)
-
-            channel = grpc.insecure_channel('{}:{}'.format(args.host, args.port))
-            stub = prediction_pb2_grpc.SeldonStub(channel)
-
-            if args.oauth_key:
-                token = get_token(args)
-                metadata = [('oauth_token', token)]
-                response = stub.SendFeedback(request=GRPC_feedback, metadata=metadata)
-            else:
-                response = stub.SendFeedback(request=GRPC_feedback)
-
-            if args.prnt:
-                print("RECEIVED RESPONSE:")
-                print()
+    args.mix = {"send-feedback": 1}
+    return run_scenario(args)
 
 
 def run_predict(args):
-    contract = json.load(open(args.contract, 'r'))
-    contract = unfold_contract(contract)
-    feature_names = [feature["name"] for feature in contract["features"]]
-
-    REST_url = "http://" + args.host + ":" + str(args.port) + "/predict"
-
-    for i in range(args.n_requests):
-        batch = generate_batch(contract, args.batch_size, 'features')
-        if args.prnt:
-            print('-' * 40)
-            print("SENDING NEW REQUEST:")
-
-        if not args.grpc:
-            headers = {}
-            REST_request = gen_REST_request(batch, features=feature_names, tensor=args.tensor)
-            if args.prnt:
-                print(REST_request)
-
-            if args.oauth_key:
-                token = get_token(args)
-                headers = {'Authorization': 'Bearer ' + token}
-                response = requests.post(
-                    "http://" + args.host + ":" + str(args.port) + "/api/v0.1/predictions",
-                    json=REST_request,
-                    headers=headers
-                )
-            else:
-                response = requests.post(
-                    "http://" + args.host + ":" + str(
-                        args.port) + args.ambassador_path + "/api/v0.1/predictions",
-                    json=REST_request,
-                    headers=headers
-                )
-
-            jresp = response.json()
-
-            if args.prnt:
-                print("RECEIVED RESPONSE:")
-                print(jresp)
-                print()
-        else:
-            GRPC_request = gen_GRPC_request(batch, features=feature_names, tensor=args.tensor)
-            if args.prnt:
-                print(GRPC_request)
+    args.mix = {"predict": 1}
+    return run_scenario(args)
+
 
-            channel = grpc.insecure_channel('{}:{}'.format(args.host, args.port))
-            stub = prediction_pb2_grpc.SeldonStub(channel)
+# scenario file keys and the options they set
+SCENARIO_OPTIONS = ("mix", "n_requests", "concurrency", "rate", "batch_size", "tensor", "grpc",
+                    "interval", "output", "seed", "ambassador_path")
 
-            if args.oauth_key:
-                token = get_token(args)
-                metadata = [('oauth_token', token)]
-                response = stub.Predict(request=GRPC_request, metadata=metadata)
-            else:
-                response = stub.Predict(request=GRPC_request)
 
-            if args.prnt:
-                print("RECEIVED RESPONSE:")
-                print(response)
-                print()
+def load_scenario(filename):
+    """
+    A scenario is a JSON file holding a "mix" of endpoints with their relative weights,
+    e.g. {"predict": 9, "send-feedback": 1}, and optionally any of the other
+    SCENARIO_OPTIONS. Command line options override the scenario.
+    """
+    with open(filename, "r") as f:
+        scenario = json.load(f)
+    unknown = set(scenario) - set(SCENARIO_OPTIONS)
+    if unknown:
+        raise ValueError("Unknown scenario options: {}".format(", ".join(sorted(unknown))))
+    return scenario
 
 
 def main():
@@ -297,22 +238,38 @@ def main():
     parser.add_argument("port", type=int)
     parser.add_argument("--endpoint", type=str, choices=["predict", "send-feedback"],
                         default="predict")
+    parser.add_argument("--scenario", type=str,
+                        help="JSON scenario mixing predict and send-feedback requests at set ratios")
     parser.add_argument("-b", "--batch-size", type=int, default=1)
     parser.add_argument("-n", "--n-requests", type=int, default=1)
     parser.add_argument("--grpc", action="store_true")
     parser.add_argument("-t", "--tensor", action="store_true")
     parser.add_argument("-p", "--prnt", action="store_true", help="Prints requests and responses")
+    parser.add_argument("-c", "--concurrency", type=int, default=1,
+                        help="Number of concurrent workers sending requests")
+    parser.add_argument("-r", "--rate", type=float,
+                        help="Target request rate (req/s) for an open-loop run")
+    parser.add_argument("-i", "--interval", type=float,
+                        help="Print a latency report every INTERVAL seconds")
+    parser.add_argument("-o", "--output", type=str,
+                        help="Write the latency report to a .json or .csv file")
+    parser.add_argument("-s", "--seed", type=int,
+                        help="Seed the generated data and the endpoint mix")
     parser.add_argument("--oauth-port", type=int)
     parser.add_argument("--oauth-key")
     parser.add_argument("--oauth-secret")
     parser.add_argument("--ambassador-path")
+    parser.set_defaults(mix=None)
 
+    args, _ = parser.parse_known_args()
+    if args.scenario:
+        # the scenario replaces the defaults, options given on the command line still win
+        parser.set_defaults(**load_scenario(args.scenario))
     args = parser.parse_args()
 
-    if args.endpoint == "predict":
-        run_predict(args)
-    elif args.endpoint == "send-feedback":
-        run_send_feedback(args)
+    result = run_scenario(args)
+    if result.errors:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+"""
+Memory-mapped model artifacts.
+
+Weights read into memory with pickle or np.load are copied into every worker process that
+loads them. Saved with save_artifacts, each array is an .npy file in a directory, and
+load_artifacts opens them as read-only memory maps: loading takes no time whatever their
+size, pages are read from disk when first used, and all the processes of a host that map
+the same files share their pages through the page cache.
+
+    # when building the model
+    save_artifacts("/mnt/models/my-model", weights=weights, bias=bias)
+
+    # in the user class
+    class MyModel(object):
+        def __init__(self, model_path="/mnt/models/my-model"):
+            self.artifacts = load_artifacts(model_path)
+
+        def predict(self, X, feature_names):
+            return X.dot(self.artifacts["weights"]) + self.artifacts["bias"]
+
+The arrays loaded are read-only; copy one before modifying it.
+"""
+from __future__ import absolute_import, division, print_function
+import json
+import os
+
+import numpy as np
+
+from .atomic_file import write_atomically
+
+MANIFEST_FILE = "artifacts.json"
+
+
+def artifact_file(path, name):
+    return os.path.join(path, "{}.npy".format(name))
+
+
+def save_artifacts(path, **arrays):
+    """
+    Save arrays as .npy files in directory path, with a manifest of their shapes and dtypes.
+    Each file, the manifest included, is written atomically, so loaders never see a partial
+    one.
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    manifest = {}
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        if array.dtype.hasobject:
+            raise ValueError("Artifact {} holds python objects and cannot be memory-mapped".format(name))
+        # C order keeps rows contiguous in the file; np.ascontiguousarray would turn scalars
+        # into arrays of shape (1,)
+        write_atomically(artifact_file(path, name),
+                         lambda f: np.save(f, np.require(array, requirements="C"), allow_pickle=False))
+        manifest[name] = {"shape": list(array.shape), "dtype": array.dtype.str}
+    previous = read_manifest(path)
+    previous.update(manifest)
+    write_atomically(os.path.join(path, MANIFEST_FILE),
+                     lambda f: f.write(json.dumps(previous, indent=2, sort_keys=True).encode("utf-8")))
+    return previous
+
+
+def read_manifest(path):
+    filename = os.path.join(path, MANIFEST_FILE)
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def artifact_shape(filename):
+    """The shape of the array of an .npy file, read from its header."""
+    with open(filename, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, _ = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, _ = np.lib.format.read_array_header_2_0(f)
+    return shape
+
+
+def load_artifact(path, name, mmap=True):
+    """
+    One array of directory path, memory-mapped read-only unless mmap is False. Scalars and
+    empty arrays, which np.load cannot map as they are, are read into memory.
+    """
+    filename = artifact_file(path, name)
+    if not mmap:
+        return np.load(filename, allow_pickle=False)
+    shape = artifact_shape(filename)
+    if len(shape) > 0 and all(shape):
+        return np.load(filename, mmap_mode="r", allow_pickle=False)
+    array = np.load(filename, allow_pickle=False)
+    array.flags.writeable = False
+    return array
+
+
+def load_artifacts(path, names=None, mmap=True):
+    """
+    The arrays of directory path as a dict, memory-mapped read-only unless mmap is False.
+    names restricts the arrays loaded; by default all those of the manifest are.
+    """
+    manifest = read_manifest(path)
+    if names is None:
+        names = sorted(manifest)
+    artifacts = {}
+    for name in names:
+        array = load_artifact(path, name, mmap)
+        expected = manifest.get(name)
+        if expected is not None and (list(array.shape) != expected["shape"] or array.dtype.str != expected["dtype"]):
+            raise ValueError("Artifact {} does not match its manifest entry {}".format(name, expected))
+        artifacts[name] = array
+    return artifacts
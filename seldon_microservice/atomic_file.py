@@ -0,0 +1,46 @@
+"""
+Atomic file writes, shared by the persistence file backend and the model artifacts.
+
+write_atomically writes a file through a temporary file in the same directory, synced to
+disk and then renamed over the target, and syncs the directory so that the rename itself
+survives a crash: readers, and a restarted process, see the previous file or the new one,
+never a partial or empty one.
+"""
+from __future__ import absolute_import, division, print_function
+import os
+import tempfile
+
+
+def write_atomically(filename, write):
+    """Write filename with write(f), f a binary file, creating its directory if needed."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    sync_directory(directory)
+
+
+def sync_directory(directory):
+    """Sync the entries of directory, where the platform allows opening it."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # directories cannot be opened on windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # nor synced on some filesystems, where the rename is durable once done
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,224 @@
+"""
+Multi-armed bandit routers.
+
+The gRPC router server calls route and send_feedback from up to 10 threads on the same
+user object. Guarding the counters of a bandit with one lock serializes every call, and
+updating them without one loses updates. BanditCounters gives each thread its own shard of
+the counters: a thread only ever writes its own shard, so updates take no lock, and reads
+add the shards up. The shards of finished threads, e.g. the thread per request of the
+Flask server, are folded into the base counters when a new shard is made.
+
+EpsilonGreedyRouter and ThompsonSamplingRouter are ready-made routers on top of it:
+
+    from seldon_microservice.bandit import ThompsonSamplingRouter
+
+    class MyRouter(ThompsonSamplingRouter):
+        def __init__(self, n_branches=2):
+            super(MyRouter, self).__init__(n_branches)
+
+Rewards are expected in [0, 1]. The routers implement get_state_delta and
+apply_state_delta, so with persistence enabled only the counters are pushed between
+snapshots.
+"""
+from __future__ import absolute_import, division, print_function
+import threading
+
+import numpy as np
+
+from .contract import make_rng, random_integers, random_uniform
+
+
+class BanditCounters(object):
+    """
+    Number of pulls and sum of rewards of n_arms arms, sharded per thread. The totals are
+    read without stopping the writers: a total can miss the updates in flight, but none is
+    ever lost.
+    """
+
+    def __init__(self, n_arms):
+        self.n_arms = n_arms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (thread, (pulls, rewards)) of each live thread that updated the counters
+        self._shards = []
+        self._base = self._new_shard()
+
+    def _new_shard(self):
+        return np.zeros(self.n_arms, dtype=np.int64), np.zeros(self.n_arms, dtype=np.float64)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = self._new_shard()
+            with self._lock:
+                self._fold_finished_threads()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_finished_threads(self):
+        """Add the shards of the threads that ended to the base counters. Called locked."""
+        finished = [shard for thread, shard in self._shards if not thread.is_alive()]
+        if not finished:
+            return
+        # a new base rather than an update in place, totals may be reading the old one
+        pulls, rewards = self._base[0].copy(), self._base[1].copy()
+        for shard_pulls, shard_rewards in finished:
+            pulls += shard_pulls
+            rewards += shard_rewards
+        self._base = pulls, rewards
+        self._shards = [(thread, shard) for thread, shard in self._shards if thread.is_alive()]
+
+    def update(self, arm, reward):
+        pulls, rewards = self._shard()
+        pulls[arm] += 1
+        rewards[arm] += reward
+
+    def update_many(self, arms, rewards):
+        """Add the rewards of many pulls at once, arms and rewards being sequences."""
+        shard_pulls, shard_rewards = self._shard()
+        arms = np.asarray(arms, dtype=np.intp)
+        shard_pulls += np.bincount(arms, minlength=self.n_arms)
+        shard_rewards += np.bincount(arms, weights=np.asarray(rewards, dtype=np.float64),
+                                     minlength=self.n_arms)
+
+    def totals(self):
+        """The (pulls, rewards) arrays summed over the shards."""
+        with self._lock:
+            base = self._base
+            shards = [shard for _, shard in self._shards]
+        pulls = base[0].copy()
+        rewards = base[1].copy()
+        for shard_pulls, shard_rewards in shards:
+            pulls += shard_pulls
+            rewards += shard_rewards
+        return pulls, rewards
+
+    def reset(self, pulls, rewards):
+        """Replace the counters, e.g. with saved totals. Not safe against concurrent updates."""
+        with self._lock:
+            self._base = (np.array(pulls, dtype=np.int64), np.array(rewards, dtype=np.float64))
+            for _, (shard_pulls, shard_rewards) in self._shards:
+                shard_pulls[:] = 0
+                shard_rewards[:] = 0
+
+    def __getstate__(self):
+        pulls, rewards = self.totals()
+        return {"n_arms": self.n_arms, "pulls": pulls, "rewards": rewards}
+
+    def __setstate__(self, state):
+        self.__init__(state["n_arms"])
+        self.reset(state["pulls"], state["rewards"])
+
+
+class BanditRouter(object):
+    """
+    Base of the bandit routers. Subclasses implement choose(pulls, rewards, rng, n), returning
+    n arms as an integer array, given the current totals.
+    """
+
+    def __init__(self, n_branches, seed=None):
+        self.n_branches = n_branches
+        self.seed = seed
+        self.counters = BanditCounters(n_branches)
+        self._local = threading.local()
+        self._next_stream = 0
+        self._lock = threading.Lock()
+        self._saved_pulls = 0
+
+    def _rng(self):
+        # numpy generators are not thread safe: each thread draws from its own stream
+        rng = getattr(self._local, "rng", None)
+        if rng is None:
+            with self._lock:
+                stream = self._next_stream
+                self._next_stream += 1
+            rng = self._local.rng = make_rng(None if self.seed is None else [self.seed, stream])
+        return rng
+
+    def choose(self, pulls, rewards, rng, n):
+        raise NotImplementedError
+
+    def select(self, n=None):
+        """One arm, or an array of n arms."""
+        pulls, rewards = self.counters.totals()
+        arms = self.choose(pulls, rewards, self._rng(), 1 if n is None else n)
+        return int(arms[0]) if n is None else arms
+
+    def route(self, features, feature_names):
+        return self.select()
+
+    def send_feedback(self, features, feature_names, routing, reward, truth):
+        if routing is None or reward is None:
+            return
+        self.counters.update(int(routing), reward)
+
+    def send_feedback_batch(self, feedbacks):
+        arms = []
+        rewards = []
+        for features, feature_names, routing, reward, truth in feedbacks:
+            if routing is not None and reward is not None:
+                arms.append(int(routing))
+                rewards.append(reward)
+        if arms:
+            self.counters.update_many(arms, rewards)
+
+    def get_state_delta(self):
+        # the totals themselves: idempotent, and as small as the counters
+        pulls, rewards = self.counters.totals()
+        total_pulls = int(pulls.sum())
+        if total_pulls == self._saved_pulls:
+            return None
+        self._saved_pulls = total_pulls
+        return {"pulls": pulls, "rewards": rewards}
+
+    def apply_state_delta(self, delta):
+        self.counters.reset(delta["pulls"], delta["rewards"])
+        self._saved_pulls = int(np.sum(delta["pulls"]))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("_local", "_lock"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+
+# np.random.Generator and the RandomState fallback of make_rng name this differently
+class EpsilonGreedyRouter(BanditRouter):
+    """
+    Routes to the branch with the best mean reward, or to a random branch with probability
+    epsilon. Branches without feedback yet are tried first.
+    """
+
+    def __init__(self, n_branches, epsilon=0.1, seed=None):
+        super(EpsilonGreedyRouter, self).__init__(n_branches, seed)
+        self.epsilon = epsilon
+
+    def choose(self, pulls, rewards, rng, n):
+        means = np.where(pulls > 0, rewards / np.maximum(pulls, 1), np.inf)
+        arms = np.full(n, np.argmax(means), dtype=np.intp)
+        explore = random_uniform(rng, n) < self.epsilon
+        arms[explore] = random_integers(rng, self.n_branches, int(explore.sum()))
+        return arms
+
+
+class ThompsonSamplingRouter(BanditRouter):
+    """
+    Routes to the branch with the highest draw from the Beta posterior of its success rate,
+    starting from a Beta(prior_alpha, prior_beta) prior.
+    """
+
+    def __init__(self, n_branches, prior_alpha=1.0, prior_beta=1.0, seed=None):
+        super(ThompsonSamplingRouter, self).__init__(n_branches, seed)
+        self.prior_alpha = prior_alpha
+        self.prior_beta = prior_beta
+
+    def choose(self, pulls, rewards, rng, n):
+        alpha = self.prior_alpha + np.maximum(rewards, 0)
+        beta = self.prior_beta + np.maximum(pulls - rewards, 0)
+        draws = rng.beta(alpha, beta, size=(n, self.n_branches))
+        return np.argmax(draws, axis=1)
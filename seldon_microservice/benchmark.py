@@ -0,0 +1,388 @@
+"""
+End-to-end benchmark of the microservice transports.
+
+Starts the template apps of tests/ (or any app directory laid out the same way) as
+microservices of each service type over each transport, sends them requests of increasing
+batch size and width and reports throughput, latency and the server CPU time spent per
+request. Combiners are sent COMBINER_MESSAGES messages of each shape per request. Results are written as JSON and can be compared against the results of another
+version to detect regressions:
+
+    seldon-microservice-benchmark --apps-dir tests -o new.json --compare old.json
+
+Requests are serialized before each run (see corpus.py) so that the tester does not limit
+the throughput measured. The servers started are allowed gRPC messages of up to
+GRPC_MAX_MESSAGE_SIZE bytes, above the default 4MB limit, so that the large shapes can be
+sent over gRPC too. The largest shape, LARGE_SHAPES, needs requests of hundreds of MB and
+several GB of memory in the tester and the server; it is only run with --large.
+"""
+from __future__ import absolute_import, division, print_function
+import argparse
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from . import __version__
+from .contract import make_rng
+from .corpus import RequestCorpus
+from .loadgen import run_load, RESTClient, GRPCClient, FBSClient
+
+# service type: (user class, app directory, REST endpoint, gRPC stub, gRPC method)
+SERVICES = {
+    "MODEL": ("MyModel", "model-template-app", "predict", "ModelStub", "Predict"),
+    "ROUTER": ("MyRouter", "router-template-app", "route", "RouterStub", "Route"),
+    "TRANSFORMER": ("MyTransformer", "transformer-template-app", "transform-input",
+                    "TransformerStub", "TransformInput"),
+    "COMBINER": ("MyCombiner", "combiner-template-app", "aggregate", "CombinerStub", "Aggregate"),
+    "OUTLIER_DETECTOR": ("MyOutlierDetector", "outlier-detector-template-app", "transform-input",
+                         "TransformerStub", "TransformInput"),
+}
+TRANSPORTS = ("REST", "GRPC", "FBS")
+# only models can be served over flatbuffers
+FBS_SERVICES = ("MODEL",)
+DEFAULT_SHAPES = "1x10,10x100,100x1000"
+LARGE_SHAPES = "1000x10000"
+# messages aggregated by each combiner request
+COMBINER_MESSAGES = 2
+DEFAULT_THRESHOLD = 0.1
+STARTUP_TIMEOUT = 60
+GRPC_MAX_MESSAGE_SIZE = 2 ** 30
+GRPC_CLIENT_OPTIONS = [('grpc.max_receive_message_length', -1), ('grpc.max_send_message_length', -1)]
+
+
+def parse_shapes(shapes):
+    """Parse "1x10,10x100" into [(1, 10), (10, 100)]."""
+    parsed = []
+    for shape in shapes.split(","):
+        rows, cols = shape.lower().split("x")
+        parsed.append((int(rows), int(cols)))
+    return parsed
+
+
+def free_port():
+    s = socket.socket()
+    try:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+    finally:
+        s.close()
+
+
+def process_group_cpu_time(pgid):
+    """
+    User and system CPU seconds used by the processes of group pgid, None when they cannot
+    be read. The microservice serves from a child process, so its own CPU time alone
+    would miss the requests.
+    """
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        total = 0.0
+        for process in psutil.process_iter():
+            try:
+                if os.getpgid(process.pid) == pgid:
+                    times = process.cpu_times()
+                    total += times.user + times.system
+            except (psutil.Error, OSError):
+                pass
+        return total
+    if not os.path.isdir("/proc"):
+        return None
+    total = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(pid)) as f:
+                # the process name can hold spaces, the fields after it cannot
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (IOError, OSError):
+            continue
+        if int(fields[2]) == pgid:
+            total += int(fields[11]) + int(fields[12])
+    return total / os.sysconf("SC_CLK_TCK")
+
+
+class MicroserviceProcess(object):
+    """A microservice started from app_dir in a subprocess, used as a context manager."""
+
+    def __init__(self, service_type, api_type, apps_dir, port=None):
+        self.service_type = service_type
+        self.api_type = api_type
+        self.user_class, app_dir, _, _, _ = SERVICES[service_type]
+        self.app_dir = os.path.join(apps_dir, app_dir)
+        self.port = port or free_port()
+        self.process = None
+
+    def __enter__(self):
+        env = dict(os.environ)
+        env["PREDICTIVE_UNIT_SERVICE_PORT"] = str(self.port)
+        env["SELDON_GRPC_MAX_MESSAGE_SIZE"] = str(GRPC_MAX_MESSAGE_SIZE)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+            [path for path in [env.get("PYTHONPATH")] if path])
+        with open(os.devnull, "w") as devnull:
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "seldon_microservice.microservice", self.user_class,
+                 self.api_type, "--service-type", self.service_type],
+                cwd=self.app_dir, env=env, stdout=devnull, stderr=devnull,
+                # in its own process group, with the server processes it starts
+                preexec_fn=os.setsid)
+        try:
+            self.wait_ready()
+        except Exception:
+            self.__exit__()
+            raise
+        return self
+
+    def wait_ready(self, timeout=STARTUP_TIMEOUT):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("{} {} microservice exited with code {}".format(
+                    self.service_type, self.api_type, self.process.returncode))
+            try:
+                if self.api_type == "REST":
+                    import requests
+                    if requests.get("http://127.0.0.1:{}/ready".format(self.port)).status_code == 200:
+                        return
+                else:
+                    socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                    return
+            except (IOError, OSError):
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("{} {} microservice not ready after {}s".format(
+            self.service_type, self.api_type, timeout))
+
+    def cpu_time(self):
+        return process_group_cpu_time(self.process.pid)
+
+    def __exit__(self, *exc_info):
+        if self.process is None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+        except OSError:
+            pass
+        deadline = time.time() + 10
+        while self.process.poll() is None and time.time() < deadline:
+            time.sleep(0.1)
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.process.wait()
+
+
+def make_client(service_type, api_type, port):
+    _, _, endpoint, stub, method = SERVICES[service_type]
+    if api_type == "REST":
+        return RESTClient("http://127.0.0.1:{}/{}".format(port, endpoint))
+    elif api_type == "GRPC":
+        from .proto import prediction_pb2_grpc
+        return GRPCClient("127.0.0.1", port, getattr(prediction_pb2_grpc, stub), method, raw=True,
+                          options=GRPC_CLIENT_OPTIONS)
+    return FBSClient("127.0.0.1", port)
+
+
+def make_corpus(api_type, rows, cols, size, tensor=False, seed=0, service_type="MODEL"):
+    """size different requests of a rows x cols batch, serialized for api_type."""
+    from .tester import gen_REST_request, gen_GRPC_request
+    from .tester_flatbuffers import NumpyArrayToSeldonRPC
+    names = ["f{}".format(i) for i in range(cols)]
+
+    def next_message(rng):
+        batch = rng.uniform(size=(rows, cols))
+        if api_type == "REST":
+            return gen_REST_request(batch, features=names, tensor=tensor)
+        elif api_type == "GRPC":
+            return gen_GRPC_request(batch, features=names, tensor=tensor)
+        return NumpyArrayToSeldonRPC(batch, names)
+
+    def next_request(i):
+        rng = make_rng([seed, i])
+        if service_type != "COMBINER":
+            return next_message(rng)
+        messages = [next_message(rng) for _ in range(COMBINER_MESSAGES)]
+        if api_type == "REST":
+            return {"seldonMessages": messages}
+        from .proto import prediction_pb2
+        return prediction_pb2.SeldonMessageList(seldonMessages=messages)
+
+    return RequestCorpus.generate(next_request, size, api_type.lower())
+
+
+def requests_for_shape(rows, cols, n_requests, max_values, min_requests=10):
+    """Fewer requests for large payloads: at most max_values values are sent per case."""
+    return max(min_requests, min(n_requests, max_values // (rows * cols)))
+
+
+def run_case(server, rows, cols, n_requests, concurrency=1, corpus_size=8, tensor=False):
+    corpus = make_corpus(server.api_type, rows, cols, corpus_size, tensor=tensor,
+                         service_type=server.service_type)
+    client = make_client(server.service_type, server.api_type, server.port)
+    # one untimed request per worker opens the connections
+    run_load(client, corpus.__getitem__, concurrency, concurrency=concurrency)
+    cpu_start = server.cpu_time()
+    result = run_load(client, corpus.__getitem__, n_requests, concurrency=concurrency)
+    cpu_end = server.cpu_time()
+    if hasattr(client, "close"):
+        client.close()
+    summary = result.summary()
+    summary.update(service_type=server.service_type, transport=server.api_type,
+                   rows=rows, cols=cols, request_bytes=len(corpus[0]))
+    if cpu_start is not None and cpu_end is not None and result.completed:
+        summary["server_cpu_ms_per_request"] = (cpu_end - cpu_start) * 1000. / result.completed
+    return summary
+
+
+def run_benchmark(apps_dir, services=tuple(SERVICES), transports=TRANSPORTS,
+                  shapes=parse_shapes(DEFAULT_SHAPES), n_requests=1000, max_values=10 ** 8,
+                  concurrency=1, corpus_size=8, tensor=False, on_result=None):
+    """Run every service type over every transport for every shape and return the results."""
+    results = []
+    for service_type in services:
+        for api_type in transports:
+            if api_type == "FBS" and service_type not in FBS_SERVICES:
+                continue
+            with MicroserviceProcess(service_type, api_type, apps_dir) as server:
+                for rows, cols in shapes:
+                    n = requests_for_shape(rows, cols, n_requests, max_values)
+                    result = run_case(server, rows, cols, n, concurrency, corpus_size, tensor)
+                    results.append(result)
+                    if on_result is not None:
+                        on_result(result)
+    return results
+
+
+def case_key(result):
+    return result["service_type"], result["transport"], result["rows"], result["cols"]
+
+
+def format_result(result):
+    latency = result.get("latency_ms", {})
+    cpu = result.get("server_cpu_ms_per_request")
+    return "{:<12} {:<5} {:>11} {:>9.1f} {:>9} {:>9} {:>9} {:>7}".format(
+        result["service_type"], result["transport"], "{}x{}".format(result["rows"], result["cols"]),
+        result["throughput_rps"],
+        "{:.3f}".format(latency["p50"]) if "p50" in latency else "-",
+        "{:.3f}".format(latency["p99"]) if "p99" in latency else "-",
+        "-" if cpu is None else "{:.3f}".format(cpu),
+        result["errors"])
+
+
+REPORT_HEADER = "{:<12} {:<5} {:>11} {:>9} {:>9} {:>9} {:>9} {:>7}".format(
+    "service", "api", "shape", "req/s", "p50 ms", "p99 ms", "cpu ms", "errors")
+
+
+def format_report(results):
+    """A table of the results, the transports of each service type and shape side by side."""
+    lines = [REPORT_HEADER]
+    for result in sorted(results, key=lambda r: (r["service_type"], r["rows"] * r["cols"], r["rows"],
+                                                 TRANSPORTS.index(r["transport"]))):
+        lines.append(format_result(result))
+    return "\n".join(lines)
+
+
+def compare_results(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results with the results of a baseline run and return a description of each
+    regression: a throughput more than threshold (relative) lower, or a p99 latency or
+    server CPU time per request more than threshold higher. Cases missing from either run
+    are not compared.
+    """
+    baseline = dict((case_key(result), result) for result in baseline)
+    regressions = []
+    for result in results:
+        old = baseline.get(case_key(result))
+        if old is None:
+            continue
+        name = "{} {} {}x{}".format(*case_key(result))
+        checks = [
+            ("throughput", old["throughput_rps"], result["throughput_rps"], -1),
+            ("p99 latency", old.get("latency_ms", {}).get("p99"), result.get("latency_ms", {}).get("p99"), 1),
+            ("server CPU per request", old.get("server_cpu_ms_per_request"),
+             result.get("server_cpu_ms_per_request"), 1),
+        ]
+        for metric, before, after, direction in checks:
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change * direction > threshold:
+                regressions.append("{}: {} {:+.1%} ({:.3f} -> {:.3f})".format(
+                    name, metric, change, before, after))
+        if result["errors"] > old["errors"]:
+            regressions.append("{}: {} errors, {} before".format(name, result["errors"], old["errors"]))
+    return regressions
+
+
+def write_results(filename, results):
+    with open(filename, "w") as f:
+        json.dump({
+            "version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+
+
+def read_results(filename):
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the microservice transports end to end")
+    parser.add_argument("--apps-dir", type=str, default="tests",
+                        help="Directory holding the model, router and transformer template apps")
+    parser.add_argument("--services", type=str, default=",".join(sorted(SERVICES)))
+    parser.add_argument("--transports", type=str, default=",".join(TRANSPORTS))
+    parser.add_argument("--shapes", type=str, default=DEFAULT_SHAPES,
+                        help="Comma separated ROWSxCOLS payload shapes")
+    parser.add_argument("--large", action="store_true",
+                        help="Also run the {} shapes, which need several GB of memory".format(LARGE_SHAPES))
+    parser.add_argument("-n", "--n-requests", type=int, default=1000,
+                        help="Requests per case, fewer for large payloads (see --max-values)")
+    parser.add_argument("--max-values", type=int, default=10 ** 8,
+                        help="Maximum number of values sent in a case")
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("-k", "--corpus-size", type=int, default=8,
+                        help="Number of different requests replayed in each case")
+    parser.add_argument("-t", "--tensor", action="store_true")
+    parser.add_argument("-o", "--output", type=str, help="Write the results to a JSON file")
+    parser.add_argument("--compare", type=str,
+                        help="JSON results of a baseline run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change reported as a regression")
+    args = parser.parse_args()
+
+    shapes = args.shapes + ("," + LARGE_SHAPES if args.large else "")
+    print(REPORT_HEADER)
+    results = run_benchmark(args.apps_dir, args.services.split(","), args.transports.split(","),
+                            parse_shapes(shapes), args.n_requests, args.max_values,
+                            args.concurrency, args.corpus_size, args.tensor,
+                            on_result=lambda result: print(format_result(result)))
+    print()
+    print(format_report(results))
+    if args.output:
+        write_results(args.output, results)
+    if args.compare:
+        baseline = read_results(args.compare)
+        regressions = compare_results(baseline["results"], results, args.threshold)
+        print()
+        print("Compared with version {}: {} regression(s)".format(baseline["version"], len(regressions)))
+        for regression in regressions:
+            print("  " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
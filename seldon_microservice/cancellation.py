@@ -0,0 +1,116 @@
+"""
+Deadlines and cancellation of requests.
+
+A request whose client has given up, because its gRPC deadline passed, it cancelled the
+call, or the Seldon-Timeout-Ms of a REST request elapsed, is not worth finishing: the
+response is never read, and the time spent on it is taken from requests that can still
+succeed. Predictions check the CancellationToken of their request before decoding,
+predicting and encoding, and stop with RequestCancelled (504 for REST, DEADLINE_EXCEEDED
+or CANCELLED for gRPC) once it is cancelled.
+
+User code running long predictions can check the token of the current request itself:
+
+    from seldon_microservice.cancellation import current_token
+
+    def predict(self, X, feature_names):
+        token = current_token()
+        for chunk in chunks:
+            token.check()
+            ...
+
+current_token returns a token that is never cancelled outside of a request.
+"""
+from __future__ import absolute_import, division, print_function
+import contextlib
+import threading
+import time
+
+from .common import SeldonMicroserviceException
+from .admission import request_deadline
+
+
+class RequestCancelled(SeldonMicroserviceException):
+    status_code = 504
+    reason = "MICROSERVICE_DEADLINE_EXCEEDED"
+
+    def __init__(self, message, grpc_code="DEADLINE_EXCEEDED"):
+        super(RequestCancelled, self).__init__(message)
+        self.grpc_code = grpc_code
+
+
+class CancellationToken(object):
+    """
+    Cancelled once time.time() reaches deadline, or is_active() returns False. Either can
+    be None.
+    """
+
+    def __init__(self, deadline=None, is_active=None):
+        self.deadline = deadline
+        self.is_active = is_active
+
+    @classmethod
+    def from_timeout(cls, timeout, is_active=None):
+        return cls(None if timeout is None else time.time() + timeout, is_active)
+
+    def time_remaining(self):
+        """Seconds left before the deadline, None without one."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0.)
+
+    @property
+    def cancelled(self):
+        return (self.is_active is not None and not self.is_active()) or \
+            (self.deadline is not None and time.time() >= self.deadline)
+
+    def check(self):
+        """Raise RequestCancelled if the request was cancelled."""
+        if self.is_active is not None and not self.is_active():
+            raise RequestCancelled("Request cancelled by the client", grpc_code="CANCELLED")
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise RequestCancelled("Request deadline exceeded")
+
+
+NO_CANCELLATION = CancellationToken()
+_local = threading.local()
+
+
+def current_token():
+    """The token of the request handled by the current thread."""
+    return getattr(_local, "token", NO_CANCELLATION)
+
+
+def check_cancelled():
+    current_token().check()
+
+
+@contextlib.contextmanager
+def cancellation_scope(token):
+    """Make token the current token of the thread until the block exits."""
+    previous = getattr(_local, "token", NO_CANCELLATION)
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def grpc_token(context):
+    """The token of a gRPC call, from its deadline and whether it is still active."""
+    if context is None:
+        return NO_CANCELLATION
+    return CancellationToken.from_timeout(context.time_remaining(), context.is_active)
+
+
+def rest_token(headers, received_at=None):
+    """
+    The token of a REST request, from its Seldon-Timeout-Ms header counted from the time it
+    was received (now by default).
+    """
+    return CancellationToken(request_deadline(headers, received_at))
+
+
+def abort_grpc(context, error):
+    """End a gRPC call with the grpc_code of error, e.g. RequestCancelled or FeedbackQueueFull."""
+    import grpc
+    context.abort(getattr(grpc.StatusCode, error.grpc_code), error.message)
@@ -0,0 +1,284 @@
+"""
+Microbenchmarks of the payload converters.
+
+Times the conversions between numpy arrays and the REST, gRPC and flatbuffers payloads
+(common.py and seldon_flatbuffers.py) on the tensor and ndarray encodings, for several
+shapes and dtypes, and tracks the memory each conversion allocates with tracemalloc.
+Results can be stored as a baseline and later runs compared with it, so that the effect
+of a change to the converters can be measured:
+
+    seldon-microservice-codec-benchmark --save before
+    (change the converters)
+    seldon-microservice-codec-benchmark --compare before
+
+Baselines are JSON files in --storage (.benchmarks by default); they only compare well
+when taken on the same machine.
+
+A reference baseline of the default cases is committed as benchmarks/codecs-reference.json
+and compared with by `make codec_benchmark`. Its memory figures hold on any machine with
+the same numpy and protobuf versions, its times only on a machine like the one noted in
+the file. It is regenerated with `make codec_baseline` when the converters change on
+purpose, and committed with the change.
+"""
+from __future__ import absolute_import, division, print_function
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from . import __version__
+from . import common
+
+DEFAULT_SHAPES = "1x10,10x100,100x1000"
+DEFAULT_DTYPES = "float64,float32,int64"
+DEFAULT_STORAGE = ".benchmarks"
+DEFAULT_THRESHOLD = 0.2
+MIN_TIME = 0.2
+REPEAT = 5
+
+
+# ----------------------------
+# Cases
+# ----------------------------
+
+def _rest_payload(array, encoding):
+    # the converters see the payload as parsed from JSON
+    return json.loads(json.dumps(common.array_to_rest_datadef(array, [], {encoding: True})))
+
+
+def _grpc_payload(array, encoding):
+    return common.array_to_grpc_datadef(array, [], encoding)
+
+
+def _fbs_payload(array, encoding):
+    from .tester_flatbuffers import NumpyArrayToSeldonRPC
+    # a request without its size prefix, as read by the server
+    return bytes(NumpyArrayToSeldonRPC(array, []))[4:]
+
+
+def _fbs_to_array(data):
+    from . import seldon_flatbuffers
+    return seldon_flatbuffers.SeldonRPCToNumpyArray(data)
+
+
+def _array_to_fbs(array):
+    from . import seldon_flatbuffers
+    return seldon_flatbuffers.NumpyArrayToSeldonRPC(array, [])
+
+
+# name: (encodings, make the argument from an array and an encoding, converter)
+CODECS = {
+    "rest_datadef_to_array": (("tensor", "ndarray"), _rest_payload, common.rest_datadef_to_array),
+    "array_to_rest_datadef": (("tensor", "ndarray"), lambda array, encoding: (array, [], {encoding: True}),
+                              common.array_to_rest_datadef),
+    "grpc_datadef_to_array": (("tensor", "ndarray"), _grpc_payload, common.grpc_datadef_to_array),
+    "array_to_grpc_datadef": (("tensor", "ndarray"), lambda array, encoding: (array, [], encoding),
+                              common.array_to_grpc_datadef),
+    "array_to_list_value": (("ndarray",), lambda array, encoding: array, common.array_to_list_value),
+    "fbs_to_array": (("tensor",), _fbs_payload, _fbs_to_array),
+    "array_to_fbs": (("tensor",), lambda array, encoding: array, _array_to_fbs),
+}
+# converters taking several arguments
+MULTI_ARGUMENT_CODECS = ("array_to_rest_datadef", "array_to_grpc_datadef")
+
+
+def parse_shapes(shapes):
+    return [tuple(int(dim) for dim in shape.lower().split("x")) for shape in shapes.split(",")]
+
+
+def make_array(shape, dtype, seed=0):
+    rng = np.random.RandomState(seed)
+    if np.dtype(dtype).kind in "iu":
+        return rng.randint(0, 1000, size=shape).astype(dtype)
+    return rng.uniform(size=shape).astype(dtype)
+
+
+def iter_cases(codecs=tuple(sorted(CODECS)), shapes=parse_shapes(DEFAULT_SHAPES),
+               dtypes=DEFAULT_DTYPES.split(",")):
+    """Yield (name, call) for every converter, encoding, shape and dtype."""
+    for codec in codecs:
+        encodings, make_argument, converter = CODECS[codec]
+        for encoding in encodings:
+            for shape in shapes:
+                for dtype in dtypes:
+                    argument = make_argument(make_array(shape, dtype), encoding)
+                    if codec in MULTI_ARGUMENT_CODECS:
+                        call = (lambda converter, argument: lambda: converter(*argument))(converter, argument)
+                    else:
+                        call = (lambda converter, argument: lambda: converter(argument))(converter, argument)
+                    name = "{}[{}-{}-{}]".format(codec, encoding, "x".join(str(dim) for dim in shape), dtype)
+                    yield name, call
+
+
+# ----------------------------
+# Measurement
+# ----------------------------
+
+def measure_time(call, min_time=MIN_TIME, repeat=REPEAT):
+    """
+    Time call in repeat rounds of as many calls as fit in min_time / repeat, as timeit does.
+    Returns the min, median and max time per call in seconds, and the number of calls.
+    """
+    call()
+    loops = 1
+    round_time = min_time / repeat
+    while True:
+        t1 = time.perf_counter()
+        for _ in range(loops):
+            call()
+        elapsed = time.perf_counter() - t1
+        if elapsed >= round_time:
+            break
+        loops = max(loops * 2, int(loops * round_time / max(elapsed, 1e-9)))
+    times = [elapsed / loops]
+    for _ in range(repeat - 1):
+        t1 = time.perf_counter()
+        for _ in range(loops):
+            call()
+        times.append((time.perf_counter() - t1) / loops)
+    return {"min": min(times), "median": float(np.median(times)), "max": max(times),
+            "calls": loops * repeat}
+
+
+def measure_memory(call):
+    """Peak memory allocated during one call, and the memory still allocated after it."""
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.clear_traces()
+        start, _ = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        result = call()
+        current, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return {"peak_bytes": peak - start, "retained_bytes": current - start}
+
+
+def run_codec_benchmark(cases, min_time=MIN_TIME, repeat=REPEAT, on_result=None):
+    results = []
+    for name, call in cases:
+        result = {"name": name}
+        result.update(measure_time(call, min_time, repeat))
+        result.update(measure_memory(call))
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    return results
+
+
+# ----------------------------
+# Reporting and baselines
+# ----------------------------
+
+REPORT_HEADER = "{:<52} {:>12} {:>12} {:>12} {:>12}".format(
+    "case", "min us", "median us", "ops/s", "peak KiB")
+
+
+def format_result(result):
+    return "{:<52} {:>12.2f} {:>12.2f} {:>12.0f} {:>12.1f}".format(
+        result["name"], result["min"] * 1e6, result["median"] * 1e6, 1. / result["median"],
+        result["peak_bytes"] / 1024.)
+
+
+def compare_results(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """
+    Return (name, metric, before, after, change) for each case of results whose median
+    time or peak memory changed by more than threshold (relative) from baseline, faster
+    or slower.
+    """
+    baseline = dict((result["name"], result) for result in baseline)
+    changes = []
+    for result in results:
+        old = baseline.get(result["name"])
+        if old is None:
+            continue
+        for metric in ("median", "peak_bytes"):
+            before, after = old[metric], result[metric]
+            if before <= 0:
+                continue
+            change = (after - before) / before
+            if abs(change) > threshold:
+                changes.append((result["name"], metric, before, after, change))
+    return changes
+
+
+def baseline_path(name, storage=DEFAULT_STORAGE):
+    if name.endswith(".json"):
+        return name
+    return os.path.join(storage, "codecs-{}.json".format(name))
+
+
+def save_baseline(filename, results):
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(filename, "w") as f:
+        json.dump({
+            "version": __version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+
+
+def load_baseline(filename):
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the payload converters")
+    parser.add_argument("--codecs", type=str, default=",".join(sorted(CODECS)))
+    parser.add_argument("--shapes", type=str, default=DEFAULT_SHAPES)
+    parser.add_argument("--dtypes", type=str, default=DEFAULT_DTYPES)
+    parser.add_argument("-k", "--filter", type=str, help="Only run the cases whose name contains FILTER")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME,
+                        help="Seconds spent timing each case")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--storage", type=str, default=DEFAULT_STORAGE,
+                        help="Directory of the stored baselines")
+    parser.add_argument("--save", type=str, help="Store the results as baseline SAVE")
+    parser.add_argument("--compare", type=str,
+                        help="Compare with a stored baseline (a name or a .json file)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change reported by --compare")
+    args = parser.parse_args()
+
+    cases = iter_cases(args.codecs.split(","), parse_shapes(args.shapes), args.dtypes.split(","))
+    if args.filter:
+        cases = ((name, call) for name, call in cases if args.filter in name)
+    print(REPORT_HEADER)
+    results = run_codec_benchmark(cases, args.min_time, args.repeat,
+                                  on_result=lambda result: print(format_result(result)))
+    if args.save:
+        filename = baseline_path(args.save, args.storage)
+        save_baseline(filename, results)
+        print("Saved baseline {}".format(filename))
+    if args.compare:
+        baseline = load_baseline(baseline_path(args.compare, args.storage))
+        changes = compare_results(baseline["results"], results, args.threshold)
+        print()
+        print("Compared with {} (version {}): {} change(s) beyond {:.0%}".format(
+            args.compare, baseline["version"], len(changes), args.threshold))
+        for name, metric, before, after, change in changes:
+            scale, unit = (1e6, "us") if metric == "median" else (1 / 1024., "KiB")
+            print("  {:<52} {:<10} {:>12.2f} -> {:>12.2f} {}  {:+.1%}{}".format(
+                name, metric, before * scale, after * scale, unit, change,
+                "  REGRESSION" if change > 0 else ""))
+        if any(change > 0 for _, _, _, _, change in changes):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import numpy as np
+import logging
+import os
+
+from .common import extract_message, extract_message_list, rest_datadef_list_to_array, \
+    array_to_rest_datadef, grpc_datadef_list_to_array, array_to_grpc_datadef, \
+    SeldonMicroserviceException, ANNOTATION_GRPC_MAX_MSG_SIZE
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Interaction with user combiner
+# ---------------------------
+
+def aggregate(user_combiner,features,features_names):
+    """
+    features is the data of all the messages stacked in one array, e.g. of shape
+    (n_messages, batch_size, n_classes) for the outputs of an ensemble of classifiers, and
+    features_names the list of the names of each message.
+    """
+    return user_combiner.aggregate(features,features_names)
+
+def get_class_names(user_combiner,original):
+    if hasattr(user_combiner,"class_names"):
+        return user_combiner.class_names
+    else:
+        return original
+
+
+# ----------------------------
+# REST
+# ----------------------------
+
+def get_rest_microservice(user_combiner,debug=False):
+    from flask import jsonify, Flask, send_from_directory
+    from flask_cors import CORS
+
+    app = Flask(__name__,static_url_path='')
+    CORS(app)
+
+    @app.errorhandler(SeldonMicroserviceException)
+    def handle_invalid_usage(error):
+        response = jsonify(error.to_dict())
+        print("ERROR:")
+        print(error.to_dict())
+        response.status_code = error.status_code
+        return response
+
+    @app.route("/seldon.json",methods=["GET"])
+    def openAPI():
+        return send_from_directory(os.path.dirname(__file__), "seldon.json")
+
+    @app.route("/aggregate",methods=["GET","POST"])
+    def Aggregate():
+        messages = extract_message_list(extract_message())
+
+        if debug:
+            print("SELDON DEBUGGING")
+            print("Aggregating {} messages".format(len(messages)))
+
+        datadefs = [message.get("data") for message in messages]
+        features = rest_datadef_list_to_array(datadefs)
+        features_names = [datadef.get("names") for datadef in datadefs]
+
+        aggregated = np.array(aggregate(user_combiner,features,features_names))
+        class_names = get_class_names(user_combiner,datadefs[0].get("names"))
+
+        data = array_to_rest_datadef(aggregated, class_names, datadefs[0])
+
+        return jsonify({"data":data})
+
+    return app
+
+
+# ----------------------------
+# GRPC
+# ----------------------------
+
+class SeldonCombinerGRPC(object):
+    def __init__(self,user_model):
+        self.user_model = user_model
+        # imported once here rather than in every call
+        from .proto import prediction_pb2
+        self.prediction_pb2 = prediction_pb2
+
+    def Aggregate(self,request,context):
+        if not request.seldonMessages:
+            raise SeldonMicroserviceException("Request must contain a non empty list of seldonMessages")
+        datadefs = [message.data for message in request.seldonMessages]
+        features = grpc_datadef_list_to_array(datadefs)
+        features_names = [list(datadef.names) for datadef in datadefs]
+
+        aggregated = np.array(aggregate(self.user_model,features,features_names))
+        class_names = get_class_names(self.user_model,features_names[0])
+
+        data = array_to_grpc_datadef(aggregated, class_names, datadefs[0].WhichOneof("data_oneof"))
+        return self.prediction_pb2.SeldonMessage(data=data)
+
+def get_grpc_server(user_model,debug=False,annotations={},interceptors=(),max_workers=10,maximum_concurrent_rpcs=None):
+    import grpc
+    from concurrent import futures
+    from .proto import prediction_pb2_grpc
+
+    seldon_combiner = SeldonCombinerGRPC(user_model)
+    options = []
+    if ANNOTATION_GRPC_MAX_MSG_SIZE in annotations:
+        max_msg = int(annotations[ANNOTATION_GRPC_MAX_MSG_SIZE])
+        logger.info("Setting grpc max message and receive length to %d",max_msg)
+        options.append(('grpc.max_message_length', max_msg ))
+        options.append(('grpc.max_receive_message_length', max_msg))
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),options=options,interceptors=interceptors,
+                         maximum_concurrent_rpcs=maximum_concurrent_rpcs)
+    prediction_pb2_grpc.add_CombinerServicer_to_server(seldon_combiner, server)
+
+    return server
@@ -2,16 +2,34 @@
 from __future__ import absolute_import, division, print_function
 import json
 
-from google.protobuf.struct_pb2 import ListValue
-
-from flask import Flask, Blueprint, request
 import numpy as np
 
-from .proto import prediction_pb2
+# Transport libraries (flask, protobuf) are imported inside the functions that need them so
+# that a microservice only loads the dependencies of the api type it serves.
+
+ANNOTATION_GRPC_MAX_MSG_SIZE = 'seldon.io/grpc-max-message-size'
+
+# the protobuf modules, imported by the first gRPC conversion rather than by every one
+_proto = {}
+
+
+def _prediction_pb2():
+    if "prediction_pb2" not in _proto:
+        from .proto import prediction_pb2
+        _proto["prediction_pb2"] = prediction_pb2
+    return _proto["prediction_pb2"]
+
+
+def _list_value():
+    if "ListValue" not in _proto:
+        from google.protobuf.struct_pb2 import ListValue
+        _proto["ListValue"] = ListValue
+    return _proto["ListValue"]
 
 
 class SeldonMicroserviceException(Exception):
     status_code = 400
+    reason = "MICROSERVICE_BAD_DATA"
 
     def __init__(self, message, status_code= None, payload=None):
         Exception.__init__(self)
@@ -21,7 +39,7 @@ class SeldonMicroserviceException(Exception):
         self.payload = payload
 
     def to_dict(self):
-        rv = {"status":{"status":1,"info":self.message,"code":-1,"reason":"MICROSERVICE_BAD_DATA"}}
+        rv = {"status":{"status":1,"info":self.message,"code":-1,"reason":self.reason}}
         return rv
 
 
@@ -39,6 +57,7 @@ def sanity_check_request(req):
 
 
 def extract_message():
+    from flask import request
     jStr = request.form.get("json")
     if jStr:
         message = json.loads(jStr)
@@ -53,11 +72,35 @@ def extract_message():
     return message
 
 
+def extract_feedback_list(message):
+    """The feedbacks of a batch, sent as a JSON list or as a FeedbackList message."""
+    if type(message) == dict:
+        message = message.get("feedbacks")
+    if not type(message) == list:
+        raise SeldonMicroserviceException("Feedback batch must be a list of feedbacks")
+    for feedback in message:
+        if not type(feedback) == dict:
+            raise SeldonMicroserviceException("Each feedback of a batch must be a dictionary")
+    return message
+
+
+def extract_message_list(message):
+    """The messages of a SeldonMessageList, each checked as a request."""
+    if type(message) == dict:
+        message = message.get("seldonMessages")
+    if not type(message) == list or not message:
+        raise SeldonMicroserviceException("Request must contain a non empty list of seldonMessages")
+    for seldon_message in message:
+        sanity_check_request(seldon_message)
+    return message
+
+
 def array_to_list_value(array,lv=None):
     if lv is None:
-        lv = ListValue()
+        lv = _list_value()()
     if len(array.shape) == 1:
-        lv.extend(array)
+        # tolist gives python numbers, ListValue rejects numpy integers
+        lv.extend(array.tolist())
     else:
         for sub_array in array:
             sub_lv = lv.add_list()
@@ -75,6 +118,28 @@ def rest_datadef_to_array(datadef):
     return features
 
 
+def rest_datadef_list_to_array(datadefs):
+    """
+    Stack the data of several messages along a new first axis. Tensors are stacked with one
+    numpy conversion of all their values, ndarrays with one conversion of all the lists.
+    """
+    try:
+        tensors = [datadef.get("tensor") for datadef in datadefs]
+        if all(tensor is not None for tensor in tensors):
+            shape = list(tensors[0].get("shape"))
+            if any(list(tensor.get("shape")) != shape for tensor in tensors):
+                raise SeldonMicroserviceException("All the messages must have the same shape")
+            return np.array([tensor.get("values") for tensor in tensors]).reshape([len(tensors)]+shape)
+        if all(datadef.get("ndarray") is not None for datadef in datadefs):
+            stacked = np.array([datadef.get("ndarray") for datadef in datadefs])
+            if stacked.dtype == object and any(isinstance(row,list) for row in stacked.ravel()):
+                raise ValueError("ragged ndarrays")
+            return stacked
+        return np.stack([rest_datadef_to_array(datadef) for datadef in datadefs])
+    except ValueError:
+        raise SeldonMicroserviceException("All the messages must have the same shape")
+
+
 def array_to_rest_datadef(array,names,original_datadef):
     datadef = {"names":names}
     if original_datadef.get("tensor") is not None:
@@ -100,7 +165,29 @@ def grpc_datadef_to_array(datadef):
     return features
 
 
+def grpc_datadef_list_to_array(datadefs):
+    """
+    Stack the data of several messages along a new first axis. The values of tensors are
+    read straight into the stacked array.
+    """
+    import itertools
+    if all(datadef.WhichOneof("data_oneof") == "tensor" for datadef in datadefs):
+        shape = list(datadefs[0].tensor.shape)
+        if any(list(datadef.tensor.shape) != shape for datadef in datadefs):
+            raise SeldonMicroserviceException("All the messages must have the same shape")
+        size = int(np.prod(shape))
+        if any(len(datadef.tensor.values) != size for datadef in datadefs):
+            raise SeldonMicroserviceException("Tensor values do not match their shape")
+        values = itertools.chain.from_iterable(datadef.tensor.values for datadef in datadefs)
+        return np.fromiter(values,dtype=np.float64,count=size*len(datadefs)).reshape([len(datadefs)]+shape)
+    try:
+        return np.stack([grpc_datadef_to_array(datadef) for datadef in datadefs])
+    except ValueError:
+        raise SeldonMicroserviceException("All the messages must have the same shape")
+
+
 def array_to_grpc_datadef(array,names,data_type):
+    prediction_pb2 = _prediction_pb2()
     if data_type == "tensor":
         datadef = prediction_pb2.DefaultData(
             names = names,
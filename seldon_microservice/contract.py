@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Random data generation from a contract.json data contract, shared by the testers and the
+microservice warm-up.
+
+compile_contract turns the feature (or target) definitions into a CompiledContract once.
+Features that share their type and range are grouped, however many there are and whether
+they come from "repeat" or not, so that generating a batch takes one vectorized draw per
+group into a preallocated array instead of one draw and one concatenation per feature.
+"""
+from __future__ import absolute_import, division, print_function
+import json
+
+import numpy as np
+
+
+def gen_continuous(range, n):
+    if range[0] == "inf" and range[1] == "inf":
+        return np.random.normal(size=n)
+    if range[0] == "inf":
+        return range[1] - np.random.lognormal(size=n)
+    if range[1] == "inf":
+        return range[0] + np.random.lognormal(size=n)
+    return np.random.uniform(range[0], range[1], size=n)
+
+
+def reconciliate_cont_type(feature, dtype):
+    if dtype == "FLOAT":
+        return feature
+    if dtype == "INT":
+        return (feature + 0.5).astype(int).astype(float)
+
+
+def gen_categorical(values, n):
+    vals = np.random.randint(len(values), size=n)
+    return np.array(values)[vals]
+
+
+def generate_batch(contract, n, field):
+    return compile_contract(contract, field).generate(n)
+
+
+class FeatureGroup(object):
+    """Columns of a batch that are drawn from the same distribution."""
+
+    def __init__(self, ftype, dtype=None, range=None, values=None):
+        self.ftype = ftype
+        self.dtype = dtype
+        self.range = range
+        self.width = 0
+        self.values = None if values is None else np.array(values)
+        self.columns = []
+
+    def finalize(self):
+        columns = np.array(self.columns, dtype=np.intp)
+        if len(columns) and np.all(np.diff(columns) == 1):
+            # contiguous columns are written through a view rather than a fancy index
+            self.columns = slice(int(columns[0]), int(columns[-1]) + 1)
+        else:
+            self.columns = columns
+        self.width = len(columns)
+
+    def draw(self, rng, n):
+        size = (n, self.width)
+        if self.ftype == "categorical":
+            return self.values[random_integers(rng, len(self.values), size)]
+        low, high = self.range
+        if low == "inf" and high == "inf":
+            batch = rng.normal(size=size)
+        elif low == "inf":
+            batch = high - rng.lognormal(size=size)
+        elif high == "inf":
+            batch = low + rng.lognormal(size=size)
+        else:
+            batch = rng.uniform(low, high, size=size)
+        np.around(batch, decimals=3, out=batch)
+        if self.dtype == "INT":
+            np.floor(batch + 0.5, out=batch)
+        return batch
+
+
+def random_integers(rng, high, size):
+    """Integers in [0, high) from a generator returned by make_rng."""
+    if hasattr(rng, "integers"):
+        return rng.integers(high, size=size)
+    return rng.randint(high, size=size)
+
+
+def _feature_width(feature_def):
+    if feature_def["ftype"] == "continuous" and "shape" in feature_def:
+        return int(np.prod(feature_def["shape"]))
+    return 1
+
+
+class CompiledContract(object):
+    """
+    The features (or targets) of a contract compiled for fast batch generation.
+
+    names: the unfolded names, as given by unfold_contract
+    groups: the FeatureGroups, each generated with one draw per batch
+    """
+
+    def __init__(self, feature_defs, seed=None, target=False):
+        groups = {}
+        self.names = []
+        column = 0
+        for feature_def in feature_defs:
+            repeat = feature_def.get("repeat")
+            if repeat is None:
+                self.names.append(feature_def["name"])
+            elif target:
+                self.names.extend(feature_def["name"] + ":" + str(i) for i in range(repeat))
+            else:
+                self.names.extend(feature_def["name"] + str(i + 1) for i in range(repeat))
+            if feature_def["ftype"] == "categorical":
+                key = ("categorical", tuple(feature_def["values"]))
+            else:
+                key = ("continuous", feature_def.get("dtype"), tuple(feature_def.get("range", ("inf", "inf"))))
+            group = groups.get(key)
+            if group is None:
+                if key[0] == "categorical":
+                    group = FeatureGroup("categorical", values=feature_def["values"])
+                else:
+                    group = FeatureGroup("continuous", dtype=key[1], range=key[2])
+                groups[key] = group
+            width = _feature_width(feature_def) * (repeat or 1)
+            group.columns.extend(range(column, column + width))
+            column += width
+        self.width = column
+        self.groups = list(groups.values())
+        for group in self.groups:
+            group.finalize()
+
+        categorical = [group.values for group in self.groups if group.ftype == "categorical"]
+        continuous = len(categorical) < len(self.groups)
+        if not categorical:
+            self.dtype = np.float64
+        elif all(values.dtype.kind in "iuf" for values in categorical):
+            self.dtype = np.result_type(np.float64 if continuous else categorical[0].dtype, *categorical)
+        elif continuous:
+            self.dtype = object
+        else:
+            self.dtype = np.result_type(*categorical)
+        self.rng = make_rng(seed)
+
+    def seed(self, seed):
+        self.rng = make_rng(seed)
+
+    def generate(self, n, out=None, rng=None):
+        """
+        Generate a batch of n rows, into out when given. rng overrides the generator of
+        the contract, e.g. to make each request of a concurrent run reproducible.
+        """
+        if out is None:
+            out = np.empty((n, self.width), dtype=self.dtype)
+        rng = self.rng if rng is None else rng
+        for group in self.groups:
+            out[:, group.columns] = group.draw(rng, n)
+        return out
+
+
+def make_rng(seed):
+    """A numpy random generator; seed can be an int or a sequence of ints."""
+    if hasattr(np.random, "default_rng"):
+        return np.random.default_rng(seed)
+    return np.random.RandomState(seed)
+
+
+def random_uniform(rng, size):
+    """Uniform draws in [0, 1) from a generator returned by make_rng."""
+    if hasattr(rng, "random"):
+        return rng.random(size)
+    return rng.random_sample(size)
+
+
+def compile_contract(contract, field="features", seed=None):
+    """
+    Compile contract[field]; the contract can be as read from contract.json or already
+    unfolded. Without a seed the generated data is not reproducible.
+    """
+    return CompiledContract(contract[field], seed=seed, target=field == "targets")
+
+
+def unfold_contract(contract):
+    unfolded_contract = {}
+    unfolded_contract["targets"] = []
+    unfolded_contract["features"] = []
+
+    for feature in contract["features"]:
+        if feature.get("repeat") is not None:
+            for i in range(feature.get("repeat")):
+                new_feature = {}
+                new_feature.update(feature)
+                new_feature["name"] = feature["name"] + str(i + 1)
+                del new_feature["repeat"]
+                unfolded_contract["features"].append(new_feature)
+        else:
+            unfolded_contract["features"].append(feature)
+
+    for target in contract["targets"]:
+        if target.get("repeat") is not None:
+            for i in range(target.get("repeat")):
+                new_target = {}
+                new_target.update(target)
+                new_target["name"] = target["name"] + ":" + str(i)
+                del new_target["repeat"]
+                unfolded_contract["targets"].append(new_target)
+        else:
+            unfolded_contract["targets"].append(target)
+
+    return unfolded_contract
+
+
+def load_contract(contract_file):
+    with open(contract_file, 'r') as f:
+        return unfold_contract(json.load(f))
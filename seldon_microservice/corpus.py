@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-serialized request corpora for the testers.
+
+Generating random data and serializing a request costs the tester as much as a request
+costs a small model, so under load the client becomes the bottleneck. A RequestCorpus holds
+K requests serialized once, ahead of the run, in a single buffer that is replayed in
+rotation. Corpora can be saved to disk and memory-mapped back, or built from a captured log
+of production requests.
+
+Formats: "rest" (JSON SeldonMessage or Feedback), "grpc" (serialized protobuf message) and
+"fbs" (size-prefixed SeldonRPC flatbuffer).
+"""
+from __future__ import absolute_import, division, print_function
+import json
+import mmap
+import struct
+
+import numpy as np
+
+FORMATS = ("rest", "grpc", "fbs")
+
+CORPUS_MAGIC = b"SLDNCRP1"
+# magic, length of the JSON metadata
+CORPUS_HEADER = struct.Struct("<8sI")
+
+
+def serialize_request(message, fmt):
+    if fmt == "rest":
+        return json.dumps(message).encode("utf-8")
+    elif fmt == "grpc":
+        return message.SerializeToString()
+    elif fmt == "fbs":
+        return bytes(message)
+    raise ValueError("Unknown corpus format {}".format(fmt))
+
+
+class RequestCorpus(object):
+    """
+    K serialized requests stored back to back in data, request i being
+    data[offsets[i]:offsets[i + 1]]. Indexing wraps around, so corpus[i] can be used
+    for the i-th request of a run of any length.
+    """
+
+    def __init__(self, data, offsets, fmt):
+        if fmt not in FORMATS:
+            raise ValueError("Unknown corpus format {}".format(fmt))
+        self.data = memoryview(data)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.format = fmt
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        i %= len(self)
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    @classmethod
+    def from_requests(cls, requests, fmt):
+        """Build a corpus from already serialized requests."""
+        requests = list(requests)
+        if not requests:
+            raise ValueError("A corpus needs at least one request")
+        offsets = np.zeros(len(requests) + 1, dtype=np.int64)
+        np.cumsum([len(request) for request in requests], out=offsets[1:])
+        return cls(b"".join(requests), offsets, fmt)
+
+    @classmethod
+    def generate(cls, next_request, size, fmt):
+        """Call next_request(i) for i in range(size) and serialize the messages."""
+        return cls.from_requests((serialize_request(next_request(i), fmt) for i in range(size)), fmt)
+
+    def save(self, filename):
+        metadata = json.dumps({"format": self.format, "count": len(self)}).encode("utf-8")
+        with open(filename, "wb") as f:
+            f.write(CORPUS_HEADER.pack(CORPUS_MAGIC, len(metadata)))
+            f.write(metadata)
+            f.write(self.offsets.astype("<i8").tobytes())
+            f.write(self.data)
+
+    @classmethod
+    def load(cls, filename):
+        """Memory-map a corpus written by save; requests are only read when replayed."""
+        with open(filename, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, metadata_length = CORPUS_HEADER.unpack_from(mapped, 0)
+        if magic != CORPUS_MAGIC:
+            raise ValueError("{} is not a request corpus".format(filename))
+        start = CORPUS_HEADER.size
+        metadata = json.loads(mapped[start:start + metadata_length].decode("utf-8"))
+        start += metadata_length
+        offsets = np.frombuffer(mapped, dtype="<i8", count=metadata["count"] + 1, offset=start)
+        start += offsets.nbytes
+        return cls(memoryview(mapped)[start:], offsets, metadata["format"])
+
+    @classmethod
+    def from_log(cls, filename, fmt, kind="predict"):
+        """
+        Build a corpus from a request log with one JSON SeldonMessage per line (a JSON
+        Feedback per line when kind is "feedback"), e.g. captured from production traffic.
+        """
+        messages = []
+        with open(filename, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    messages.append(json.loads(line))
+        return cls.from_requests((serialize_request(convert_rest_message(message, fmt, kind), fmt)
+                                  for message in messages), fmt)
+
+
+def convert_rest_message(message, fmt, kind="predict"):
+    """Convert a JSON (REST) message to the message type sent with fmt."""
+    if fmt == "rest":
+        return message
+    elif fmt == "grpc":
+        from google.protobuf import json_format
+        from .proto import prediction_pb2
+        message_class = prediction_pb2.Feedback if kind == "feedback" else prediction_pb2.SeldonMessage
+        return json_format.ParseDict(message, message_class())
+    elif fmt == "fbs":
+        if kind == "feedback":
+            raise ValueError("Flatbuffers corpora only hold predict requests")
+        from .common import rest_datadef_to_array
+        from .tester_flatbuffers import NumpyArrayToSeldonRPC
+        datadef = message["data"]
+        return NumpyArrayToSeldonRPC(rest_datadef_to_array(datadef).astype(float),
+                                     datadef.get("names") or [])
+    raise ValueError("Unknown corpus format {}".format(fmt))
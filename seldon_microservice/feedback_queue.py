@@ -0,0 +1,254 @@
+"""
+Asynchronous feedback.
+
+By default send_feedback runs on the request thread, so a slow model update holds the
+caller and a server worker until it is done. With a feedback queue the microservice
+acknowledges feedback as soon as it is queued, and a background worker hands it to the
+user object in micro-batches: one send_feedback_batch call per batch when the user class
+defines it, one send_feedback call per feedback otherwise.
+
+The queue is bounded. When it is full, the "block" policy makes callers wait for room up to
+a timeout and then rejects the feedback with a 503 (backpressure), while "drop-newest" and
+"drop-oldest" accept the feedback and shed a queued one instead. Queue depth, drops and lag
+are reported by FeedbackQueue.metrics, served on /feedback-metrics by REST microservices.
+"""
+from __future__ import absolute_import, division, print_function
+import collections
+import logging
+import threading
+import time
+
+from .common import SeldonMicroserviceException
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_QUEUE_SIZE_ENV_NAME = "FEEDBACK_QUEUE_SIZE"
+FEEDBACK_BATCH_SIZE_ENV_NAME = "FEEDBACK_BATCH_SIZE"
+FEEDBACK_QUEUE_POLICY_ENV_NAME = "FEEDBACK_QUEUE_POLICY"
+FEEDBACK_QUEUE_TIMEOUT_ENV_NAME = "FEEDBACK_QUEUE_TIMEOUT"
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_TIMEOUT = 1.0
+POLICIES = ("block", "drop-newest", "drop-oldest")
+# at most one warning about dropped feedback every this many seconds
+DROP_WARNING_INTERVAL = 10
+
+
+class FeedbackQueueFull(SeldonMicroserviceException):
+    status_code = 503
+    reason = "MICROSERVICE_OVERLOADED"
+    grpc_code = "RESOURCE_EXHAUSTED"
+
+
+class FeedbackQueue(object):
+    """
+    A bounded queue of feedbacks drained by a worker thread. handle_batch(items) is called
+    with up to batch_size items at a time, in the order they were put.
+    """
+
+    def __init__(self, handle_batch, maxsize, batch_size=DEFAULT_BATCH_SIZE, policy="block",
+                 timeout=DEFAULT_TIMEOUT):
+        if maxsize <= 0:
+            raise ValueError("The feedback queue needs a positive size")
+        if policy not in POLICIES:
+            raise ValueError("Unknown feedback queue policy {}".format(policy))
+        self.handle_batch = handle_batch
+        self.maxsize = maxsize
+        self.batch_size = max(1, batch_size)
+        self.policy = policy
+        self.timeout = timeout
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._busy = False
+        self._stopped = False
+        self._last_drop_warning = 0
+        self.counts = collections.Counter()
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="feedback-queue")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def put(self, item):
+        """Queue item; raises FeedbackQueueFull when the block policy times out."""
+        return self.put_many([item])[0]
+
+    def put_many(self, items):
+        """
+        Queue items, returning for each whether it was queued rather than dropped. With the
+        block policy they are queued all together once there is room for all of them, or
+        none is and FeedbackQueueFull is raised: a client retrying a rejected batch does not
+        send any feedback twice.
+        """
+        with self._lock:
+            if self.policy == "block":
+                self._wait_for_room(len(items))
+            queued = []
+            for item in items:
+                if len(self._items) >= self.maxsize:
+                    if self.policy == "drop-newest":
+                        self._dropped()
+                        queued.append(False)
+                        continue
+                    self._items.popleft()
+                    self._dropped()
+                self._items.append((time.time(), item))
+                self.counts["queued"] += 1
+                queued.append(True)
+            self._not_empty.notify()
+        return queued
+
+    def _wait_for_room(self, n):
+        """Wait until n more items fit in the queue. Called locked."""
+        if n > self.maxsize:
+            self._reject(n, "Feedback batch of {} is larger than the queue".format(n))
+        deadline = time.time() + self.timeout
+        while len(self._items) + n > self.maxsize:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self._reject(n, "Feedback queue is full")
+            self._not_full.wait(remaining)
+
+    def _reject(self, n, message):
+        self.counts["rejected"] += n
+        raise FeedbackQueueFull(message)
+
+    def _dropped(self):
+        self.counts["dropped"] += 1
+        now = time.time()
+        if now - self._last_drop_warning > DROP_WARNING_INTERVAL:
+            self._last_drop_warning = now
+            logger.warning("Feedback queue full, %d feedbacks dropped so far", self.counts["dropped"])
+
+    def _next_batch(self):
+        with self._lock:
+            while not self._items and not self._stopped:
+                self._not_empty.wait()
+            batch = [self._items.popleft()[1]
+                     for _ in range(min(self.batch_size, len(self._items)))]
+            self._busy = bool(batch)
+            self._not_full.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            t1 = time.time()
+            try:
+                self.handle_batch(batch)
+                outcome = "processed"
+            except Exception:
+                logger.exception("Feedback batch of %d failed", len(batch))
+                outcome = "failed"
+            with self._lock:
+                self.counts[outcome] += len(batch)
+                self.counts["batches"] += 1
+                self.last_batch_size = len(batch)
+                self.last_batch_seconds = time.time() - t1
+                self._busy = False
+                self._idle.notify_all()
+
+    def join(self, timeout=None):
+        """Wait until every queued feedback has been handled."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while self._items or self._busy:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stop(self, drain=True):
+        if drain:
+            self.join()
+        with self._lock:
+            self._stopped = True
+            if not drain:
+                self._items.clear()
+            self._not_empty.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def metrics(self):
+        with self._lock:
+            lag = time.time() - self._items[0][0] if self._items else 0.0
+            return {
+                "depth": len(self._items),
+                "capacity": self.maxsize,
+                "policy": self.policy,
+                "queued": self.counts["queued"],
+                "processed": self.counts["processed"],
+                "failed": self.counts["failed"],
+                "dropped": self.counts["dropped"],
+                "rejected": self.counts["rejected"],
+                "batches": self.counts["batches"],
+                "lag_seconds": lag,
+                "last_batch_size": self.last_batch_size,
+                "last_batch_seconds": self.last_batch_seconds,
+            }
+
+
+def deliver_feedback_batch(user_object, feedbacks):
+    """Hand a list of send_feedback argument tuples to user_object."""
+    if hasattr(user_object, "send_feedback_batch"):
+        user_object.send_feedback_batch(feedbacks)
+    else:
+        for args in feedbacks:
+            user_object.send_feedback(*args)
+
+
+class AsyncFeedback(object):
+    """
+    Wraps a user object so that its send_feedback and send_feedback_batch calls are queued
+    and return at once. Every other attribute is the user object's own.
+    """
+
+    def __init__(self, user_object, queue):
+        self._user_object = user_object
+        self.feedback_queue = queue
+
+    def __getattr__(self, name):
+        return getattr(self._user_object, name)
+
+    def send_feedback(self, *args):
+        self.feedback_queue.put(args)
+
+    def send_feedback_batch(self, feedbacks):
+        self.feedback_queue.put_many([tuple(args) for args in feedbacks])
+
+
+def with_feedback_queue(user_object, maxsize, batch_size=DEFAULT_BATCH_SIZE, policy="block",
+                        timeout=DEFAULT_TIMEOUT):
+    """
+    Return user_object wrapped with a started feedback queue, or user_object itself when it
+    takes no feedback or maxsize is 0.
+    """
+    if maxsize <= 0 or not hasattr(user_object, "send_feedback"):
+        return user_object
+    queue = FeedbackQueue(lambda feedbacks: deliver_feedback_batch(user_object, feedbacks),
+                          maxsize, batch_size, policy, timeout).start()
+    logger.info("Feedback queue of %d with batches of up to %d, %s when full",
+                maxsize, batch_size, policy)
+    return AsyncFeedback(user_object, queue)
+
+
+def add_feedback_metrics_endpoint(app, user_object):
+    """Serve the feedback queue metrics on /feedback-metrics if user_object has a queue."""
+    queue = getattr(user_object, "feedback_queue", None)
+    if queue is None:
+        return
+
+    @app.route("/feedback-metrics", methods=["GET"])
+    def FeedbackMetrics():
+        from flask import jsonify
+        return jsonify(queue.metrics())
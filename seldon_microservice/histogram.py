@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+A numpy HDR (high dynamic range) histogram for latency recording.
+
+Values are integers (the testers record microseconds) stored in log-linear buckets: every
+power of two range is split into 2 ** sub_bucket_half_count_magnitude linear sub-buckets, so
+any recorded value is reported within a relative error of 10 ** -significant_figures while the
+memory used is fixed, whatever the number of samples. This is the layout of HdrHistogram:
+percentiles stay within that precision over any number of samples, and histograms from
+several workers or intervals can be added together.
+"""
+from __future__ import absolute_import, division, print_function
+import math
+
+import numpy as np
+
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram(object):
+
+    def __init__(self, highest_trackable_value=3600 * 1000 * 1000, significant_figures=3):
+        if not 1 <= significant_figures <= 5:
+            raise ValueError("significant_figures must be between 1 and 5")
+        self.highest_trackable_value = int(highest_trackable_value)
+        self.significant_figures = significant_figures
+        largest_single_unit = 2 * 10 ** significant_figures
+        self.sub_bucket_half_count_magnitude = int(math.ceil(math.log(largest_single_unit, 2))) - 1
+        self.sub_bucket_half_count = 1 << self.sub_bucket_half_count_magnitude
+        self.sub_bucket_count = 2 * self.sub_bucket_half_count
+        bucket_count = 1
+        smallest_untrackable = self.sub_bucket_count
+        while smallest_untrackable <= self.highest_trackable_value:
+            smallest_untrackable <<= 1
+            bucket_count += 1
+        self.counts = np.zeros((bucket_count + 1) * self.sub_bucket_half_count, dtype=np.int64)
+        self.total_count = 0
+        self.min_value = None
+        self.max_value = None
+
+    def _counts_index(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        # bucket 0 holds [0, sub_bucket_count) at unit resolution, bucket b the values
+        # [sub_bucket_count << (b - 1), sub_bucket_count << b) with a resolution of 2 ** b
+        bit_length = np.zeros(values.shape, dtype=np.int64)
+        positive = values > 0
+        bit_length[positive] = np.floor(np.log2(values[positive])).astype(np.int64) + 1
+        bucket = np.maximum(bit_length - self.sub_bucket_half_count_magnitude - 1, 0)
+        sub_bucket = values >> bucket
+        return (bucket + 1) * self.sub_bucket_half_count + sub_bucket - self.sub_bucket_half_count
+
+    def _value_at_index(self, index):
+        index = np.asarray(index, dtype=np.int64)
+        bucket = np.maximum(index // self.sub_bucket_half_count - 1, 0)
+        sub_bucket = np.where(index < self.sub_bucket_count, index,
+                              index % self.sub_bucket_half_count + self.sub_bucket_half_count)
+        lowest = sub_bucket << bucket
+        # report the middle of the range of values sharing the bucket
+        return lowest + ((1 << bucket) >> 1)
+
+    def record(self, value, count=1):
+        self.record_values(np.full(count, value, dtype=np.int64) if count > 1 else [value])
+
+    def record_values(self, values):
+        values = np.clip(np.asarray(values, dtype=np.int64).ravel(), 0, self.highest_trackable_value)
+        if not len(values):
+            return
+        np.add.at(self.counts, self._counts_index(values), 1)
+        self.total_count += len(values)
+        low, high = int(values.min()), int(values.max())
+        self.min_value = low if self.min_value is None else min(self.min_value, low)
+        self.max_value = high if self.max_value is None else max(self.max_value, high)
+
+    def add(self, other):
+        if len(other.counts) != len(self.counts) or \
+                other.sub_bucket_half_count != self.sub_bucket_half_count:
+            raise ValueError("Histograms have different layouts")
+        self.counts += other.counts
+        self.total_count += other.total_count
+        for attr, pick in (("min_value", min), ("max_value", max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+        return self
+
+    def copy(self):
+        histogram = LatencyHistogram(self.highest_trackable_value, self.significant_figures)
+        return histogram.add(self)
+
+    def reset(self):
+        self.counts[:] = 0
+        self.total_count = 0
+        self.min_value = None
+        self.max_value = None
+
+    def percentiles(self, percentiles=DEFAULT_PERCENTILES):
+        """Map each percentile to the recorded value at that percentile."""
+        if not self.total_count:
+            return dict((p, None) for p in percentiles)
+        cumulative = np.cumsum(self.counts)
+        targets = np.maximum(np.ceil(np.asarray(percentiles, dtype=float) / 100. * self.total_count), 1)
+        values = self._value_at_index(np.searchsorted(cumulative, targets))
+        values = np.clip(values, self.min_value, self.max_value)
+        return dict(zip(percentiles, (int(v) for v in values)))
+
+    def value_at_percentile(self, percentile):
+        return self.percentiles((percentile,))[percentile]
+
+    def mean(self):
+        if not self.total_count:
+            return None
+        nonzero = np.nonzero(self.counts)[0]
+        return float(np.dot(self._value_at_index(nonzero), self.counts[nonzero])) / self.total_count
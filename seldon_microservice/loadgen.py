@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+"""
+Load generation for the testers.
+
+run_load drives a send function from several worker threads, either closed-loop (each
+worker sends its next request as soon as the previous one returns) or open-loop at a
+target rate, and records the latency of every request in HDR histograms. The clients below reuse their
+connections across requests so that the measurements reflect the server rather than
+connection setup in the tester.
+"""
+from __future__ import absolute_import, division, print_function
+import collections
+import json
+import socket
+import struct
+import threading
+import time
+
+from .histogram import LatencyHistogram
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# schedules and latencies are measured on a monotonic clock: the wall clock can be stepped
+# or slewed during a run
+clock = getattr(time, "perf_counter", time.time)
+
+
+# ----------------------------
+# Clients
+# ----------------------------
+
+class RESTClient(object):
+    """
+    Posts requests to url with one requests.Session, and so one pool of keep-alive
+    connections, per worker thread. With form=True the message is sent as the json form
+    field expected by the microservices, otherwise as a JSON body. Messages that are
+    already serialized (bytes or str) are sent as they are. auth() returns headers added
+    to each request, e.g. the Authorization header of a TokenCache.
+    """
+
+    def __init__(self, url, form=True, headers=None, auth=None):
+        self.url = url
+        self.form = form
+        self.headers = headers or {}
+        self.auth = auth
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+            session = self._local.session = requests.Session()
+        return session
+
+    def __call__(self, message):
+        if not isinstance(message, (bytes, str)):
+            message = json.dumps(message)
+        headers = self.headers
+        if self.auth is not None:
+            headers = dict(headers)
+            headers.update(self.auth())
+        if self.form:
+            response = self.session.post(self.url, data={"json": message}, headers=headers)
+        else:
+            headers = dict(headers)
+            headers["Content-Type"] = "application/json"
+            response = self.session.post(self.url, data=message, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+
+class GRPCClient(object):
+    """
+    Calls method on a stub built once over a single channel; grpc channels are thread
+    safe and multiplex concurrent calls. With raw=True the client sends messages that are
+    already serialized, e.g. from a RequestCorpus. options are passed to the channel, e.g.
+    to raise the maximum message sizes. auth() returns metadata added to each call.
+    """
+
+    def __init__(self, host, port, stub_class, method, metadata=None, raw=False, options=None,
+                 auth=None):
+        import grpc
+        self.channel = grpc.insecure_channel('{}:{}'.format(host, port), options=options)
+        if raw:
+            from .proto import prediction_pb2
+            service = stub_class.__name__[:-len("Stub")]
+            self.call = self.channel.unary_unary(
+                "/seldon.protos.{}/{}".format(service, method),
+                request_serializer=None,
+                response_deserializer=prediction_pb2.SeldonMessage.FromString)
+        else:
+            self.call = getattr(stub_class(self.channel), method)
+        self.metadata = metadata
+        self.auth = auth
+
+    def __call__(self, message):
+        metadata = self.metadata
+        if self.auth is not None:
+            metadata = list(metadata or []) + list(self.auth())
+        if metadata:
+            return self.call(message, metadata=metadata)
+        return self.call(message)
+
+
+def recv_exactly(sock, n):
+    """Read n bytes from sock, however many reads that takes."""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    pos = 0
+    while pos < n:
+        received = sock.recv_into(view[pos:], n - pos)
+        if not received:
+            raise IOError("Connection closed by the server")
+        pos += received
+    return buf
+
+
+def recv_frame(sock):
+    """Read one size-prefixed flatbuffer, without its size prefix."""
+    size, = struct.unpack('<i', recv_exactly(sock, 4))
+    return recv_exactly(sock, size)
+
+
+class _Reply(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.frame = None
+        self.error = None
+
+    def set(self, frame=None, error=None):
+        self.frame = frame
+        self.error = error
+        self.event.set()
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.frame
+
+
+class FBSConnection(object):
+    """
+    A persistent connection to a flatbuffers microservice. The server answers the
+    requests of a connection in order, so with pipelined=True several threads can have a
+    request in flight on the connection: requests are written under a lock and a reader
+    thread hands the replies back in the order the requests were sent.
+    """
+
+    def __init__(self, address, pipelined=False):
+        self.sock = socket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.error = None
+        self.pipelined = pipelined
+        if pipelined:
+            self.lock = threading.Lock()
+            self.pending = collections.deque()
+            self.reader = threading.Thread(target=self._read_replies)
+            self.reader.daemon = True
+            self.reader.start()
+
+    def request(self, data):
+        """Send a size-prefixed request and return the reply flatbuffer."""
+        if self.error is not None:
+            raise self.error
+        if not self.pipelined:
+            try:
+                self.sock.sendall(data)
+                return recv_frame(self.sock)
+            except Exception as e:
+                self.close(e)
+                raise
+        reply = _Reply()
+        error = None
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            self.pending.append(reply)
+            try:
+                self.sock.sendall(data)
+            except Exception as e:
+                error = e
+        if error is not None:
+            self.close(error)
+        return reply.wait()
+
+    def _read_replies(self):
+        try:
+            while True:
+                frame = recv_frame(self.sock)
+                self.pending.popleft().set(frame)
+        except Exception as e:
+            self.close(e)
+
+    def close(self, error=None):
+        if self.error is None:
+            self.error = error or IOError("Connection closed")
+        try:
+            # shutdown wakes up a reader or writer blocked on the socket
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.sock.close()
+        if self.pipelined:
+            with self.lock:
+                while self.pending:
+                    self.pending.popleft().set(error=self.error)
+
+
+class FBSClient(object):
+    """
+    Sends size-prefixed SeldonRPC flatbuffers over persistent connections and decodes the
+    size-prefixed replies. With pipeline=1 each worker thread has its own connection; with
+    pipeline=k worker threads share connections k at a time, so that up to k requests are
+    in flight on each connection. Broken connections are reopened on the next request.
+    """
+
+    def __init__(self, host, port, pipeline=1):
+        self.address = (host, port)
+        self.pipeline = max(1, pipeline)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._workers = 0
+        self._connections = []
+
+    def connection(self):
+        slot = getattr(self._local, "slot", None)
+        with self._lock:
+            if slot is None:
+                slot = self._local.slot = self._workers // self.pipeline
+                self._workers += 1
+            while len(self._connections) <= slot:
+                self._connections.append(None)
+            connection = self._connections[slot]
+            if connection is None or connection.error is not None:
+                connection = self._connections[slot] = \
+                    FBSConnection(self.address, pipelined=self.pipeline > 1)
+            return connection
+
+    def __call__(self, data):
+        from .tester_flatbuffers import SeldonRPCToNumpyArray
+        return SeldonRPCToNumpyArray(self.connection().request(data))
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                if connection is not None:
+                    connection.close()
+            self._connections = []
+
+
+# ----------------------------
+# Load generation
+# ----------------------------
+
+def _to_ms(value):
+    return None if value is None else value / 1000.
+
+
+def histogram_summary(histogram):
+    percentiles = histogram.percentiles(PERCENTILES)
+    summary = dict(("p{:g}".format(p), _to_ms(v)) for p, v in percentiles.items())
+    summary["mean"] = _to_ms(histogram.mean())
+    summary["max"] = _to_ms(histogram.max_value)
+    return summary
+
+
+class LoadResult(object):
+    """
+    Outcome of run_load. Latencies are recorded in microseconds in HDR histograms:
+
+    response_histogram: from the time each request was scheduled to be sent to the time
+        its response arrived. In open-loop runs this includes the time a request waited
+        for a free worker, which corrects for coordinated omission.
+    service_histogram: from the time each request was actually sent.
+    intervals: per-interval summaries when run_load was given an interval.
+    labels: when run_load was given a label function, the response histogram and the
+        errors of the requests of each label, e.g. of each endpoint of a mixed run.
+    """
+
+    def __init__(self, response_histogram, service_histogram, errors, duration, concurrency,
+                 rate=None, intervals=None, labels=None):
+        self.response_histogram = response_histogram
+        self.service_histogram = service_histogram
+        self.errors = errors
+        self.duration = duration
+        self.concurrency = concurrency
+        self.rate = rate
+        self.intervals = intervals or []
+        self.labels = labels or {}
+
+    @property
+    def completed(self):
+        return self.response_histogram.total_count
+
+    @property
+    def n_requests(self):
+        return self.completed + self.errors
+
+    @property
+    def throughput(self):
+        return self.completed / self.duration if self.duration > 0 else 0.0
+
+    def percentiles(self):
+        """Response time percentiles in seconds."""
+        return dict((p, None if v is None else v / 1e6)
+                    for p, v in self.response_histogram.percentiles(PERCENTILES).items())
+
+    def summary(self):
+        summary = {
+            "requests": self.n_requests,
+            "errors": self.errors,
+            "concurrency": self.concurrency,
+            "target_rate": self.rate,
+            "coordinated_omission_corrected": bool(self.rate),
+            "duration_s": self.duration,
+            "throughput_rps": self.throughput,
+        }
+        if self.completed:
+            summary["latency_ms"] = histogram_summary(self.response_histogram)
+            summary["service_time_ms"] = histogram_summary(self.service_histogram)
+        if self.labels:
+            summary["labels"] = dict((label, self.label_summary(label)) for label in self.labels)
+        return summary
+
+    def label_summary(self, label):
+        histogram = self.labels[label]["histogram"]
+        errors = self.labels[label]["errors"]
+        summary = {
+            "requests": histogram.total_count + errors,
+            "errors": errors,
+            "throughput_rps": histogram.total_count / self.duration if self.duration > 0 else 0.0,
+        }
+        if histogram.total_count:
+            summary["latency_ms"] = histogram_summary(histogram)
+        return summary
+
+    def report(self):
+        lines = [
+            "Requests: {} (errors: {}), concurrency: {}{}".format(
+                self.n_requests, self.errors, self.concurrency,
+                ", target rate: {:g} req/s".format(self.rate) if self.rate else ""),
+            "Duration: {:.3f}s, throughput: {:.1f} req/s".format(self.duration, self.throughput),
+        ]
+        if self.completed:
+            summary = self.summary()
+            for title, key in (("Latency", "latency_ms"), ("Service time", "service_time_ms")):
+                if key == "service_time_ms" and not self.rate:
+                    # closed-loop: both histograms hold the same values
+                    continue
+                latency = summary[key]
+                lines.append("{} (ms): mean {:.3f}, {}, max {:.3f}".format(
+                    title, latency["mean"],
+                    ", ".join("p{:g} {:.3f}".format(p, latency["p{:g}".format(p)]) for p in PERCENTILES),
+                    latency["max"]))
+            if not self.rate:
+                lines.append("Closed-loop run: latencies are not corrected for coordinated omission, "
+                             "use a target rate for that")
+        for label in sorted(self.labels):
+            summary = self.label_summary(label)
+            latency = summary.get("latency_ms")
+            lines.append("  {}: {} requests (errors: {}), {:.1f} req/s{}".format(
+                label, summary["requests"], summary["errors"], summary["throughput_rps"],
+                "" if latency is None else ", latency (ms): " + ", ".join(
+                    "{} {:.3f}".format(key, latency[key]) for key in ("p50", "p99", "max"))))
+        return "\n".join(lines)
+
+    def write(self, filename):
+        """
+        Write the summary and the interval reports as JSON, or as CSV with one row per
+        interval and a final total row, depending on the extension of filename.
+        """
+        if filename.endswith(".csv"):
+            import csv
+            columns = ["interval", "start_s", "end_s", "requests", "errors", "throughput_rps"] + \
+                ["{}_ms".format(key) for key in ["p{:g}".format(p) for p in PERCENTILES] + ["mean", "max"]]
+            total = dict(interval="total", start_s=0.0, end_s=self.duration,
+                         requests=self.n_requests, errors=self.errors, throughput_rps=self.throughput)
+            total.update(("{}_ms".format(k), v) for k, v in self.summary().get("latency_ms", {}).items())
+            with open(filename, "w") as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                for interval in self.intervals:
+                    row = dict((k, v) for k, v in interval.items() if k != "latency_ms")
+                    row.update(("{}_ms".format(k), v) for k, v in interval.get("latency_ms", {}).items())
+                    writer.writerow(row)
+                writer.writerow(total)
+        else:
+            summary = self.summary()
+            summary["intervals"] = self.intervals
+            with open(filename, "w") as f:
+                json.dump(summary, f, indent=2, sort_keys=True)
+
+
+def run_load(send, next_request, n_requests, concurrency=1, rate=None, on_response=None,
+             on_error=None, interval=None, on_interval=None, label=None):
+    """
+    Send n_requests requests from concurrency worker threads.
+
+    next_request(i) builds request i; it is called by the worker outside of the timed
+    section. send(request) performs it and returns the response. With rate (requests per
+    second) request i is scheduled at start + i / rate and its latency is measured from
+    that time, otherwise workers send back to back. on_response(i, request, response) and
+    on_error(i, request, exception) are optional callbacks. With interval (seconds) a
+    summary of each interval is passed to on_interval(summary) and kept in the result.
+    With label(i, request) the requests are also reported per label.
+    """
+    counter = iter(range(n_requests))
+    lock = threading.Lock()
+    response_histogram = LatencyHistogram()
+    service_histogram = LatencyHistogram()
+    interval_state = {"histogram": LatencyHistogram(), "errors": 0}
+    intervals = []
+    labels = {}
+    errors = [0]
+    done = threading.Event()
+    start = clock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            request = next_request(i)
+            key = None if label is None else label(i, request)
+            if key is not None:
+                with lock:
+                    if key not in labels:
+                        labels[key] = {"histogram": LatencyHistogram(), "errors": 0}
+            if rate:
+                scheduled = start + i / rate
+                delay = scheduled - clock()
+                if delay > 0:
+                    time.sleep(delay)
+            t1 = clock()
+            if not rate:
+                scheduled = t1
+            try:
+                response = send(request)
+            except Exception as e:
+                with lock:
+                    errors[0] += 1
+                    interval_state["errors"] += 1
+                    if key is not None:
+                        labels[key]["errors"] += 1
+                if on_error is not None:
+                    on_error(i, request, e)
+                continue
+            t2 = clock()
+            response_time = int((t2 - scheduled) * 1e6)
+            with lock:
+                response_histogram.record(response_time)
+                service_histogram.record(int((t2 - t1) * 1e6))
+                interval_state["histogram"].record(response_time)
+                if key is not None:
+                    labels[key]["histogram"].record(response_time)
+            if on_response is not None:
+                on_response(i, request, response)
+
+    def close_interval(interval_start, interval_end):
+        with lock:
+            histogram = interval_state["histogram"]
+            interval_errors = interval_state["errors"]
+            interval_state["histogram"] = LatencyHistogram()
+            interval_state["errors"] = 0
+        summary = {
+            "interval": len(intervals),
+            "start_s": interval_start - start,
+            "end_s": interval_end - start,
+            "requests": histogram.total_count + interval_errors,
+            "errors": interval_errors,
+            "throughput_rps": histogram.total_count / max(interval_end - interval_start, 1e-9),
+        }
+        if histogram.total_count:
+            summary["latency_ms"] = histogram_summary(histogram)
+        intervals.append(summary)
+        if on_interval is not None:
+            on_interval(summary)
+
+    def reporter():
+        interval_start = start
+        while not done.wait(max(0, interval_start + interval - clock())):
+            interval_end = clock()
+            close_interval(interval_start, interval_end)
+            interval_start = interval_end
+        close_interval(interval_start, clock())
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    if interval:
+        reporter_thread = threading.Thread(target=reporter)
+        reporter_thread.daemon = True
+        reporter_thread.start()
+    for thread in threads:
+        thread.join()
+    duration = clock() - start
+    if interval:
+        done.set()
+        reporter_thread.join()
+    return LoadResult(response_histogram, service_histogram, errors[0], duration, concurrency,
+                      rate, intervals, labels)
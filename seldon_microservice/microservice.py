@@ -4,9 +4,19 @@ import importlib
 import json
 import time
 import logging
+import threading
 import multiprocessing as mp
 
 from . import __version__
+from .common import ANNOTATION_GRPC_MAX_MSG_SIZE
+from .warmup import warmup, warmup_in_background, needs_warmup, add_health_endpoints, \
+    DEFAULT_CONTRACT_FILE
+from .object_cache import OBJECT_CACHE_ENV_NAME
+from .admission import get_admission_controller, add_admission_control, get_grpc_interceptor, \
+    grpc_server_limits, MAX_IN_FLIGHT_ENV_NAME, MAX_QUEUE_ENV_NAME, MAX_QUEUE_TIME_ENV_NAME
+from .feedback_queue import with_feedback_queue, add_feedback_metrics_endpoint, \
+    FEEDBACK_QUEUE_SIZE_ENV_NAME, FEEDBACK_BATCH_SIZE_ENV_NAME, FEEDBACK_QUEUE_POLICY_ENV_NAME, \
+    FEEDBACK_QUEUE_TIMEOUT_ENV_NAME, DEFAULT_BATCH_SIZE, DEFAULT_TIMEOUT, POLICIES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,7 +27,11 @@ DEFAULT_PORT = 5000
 
 DEBUG_PARAMETER = "SELDON_DEBUG"
 
+WARMUP_REQUESTS_ENV_NAME = "SELDON_WARMUP_REQUESTS"
+WARMUP_BATCH_SIZES_ENV_NAME = "SELDON_WARMUP_BATCH_SIZES"
+
 ANNOTATIONS_FILE = "/etc/podinfo/annotations"
+GRPC_MAX_MSG_SIZE_ENV_NAME = "SELDON_GRPC_MAX_MESSAGE_SIZE"
 
 
 def startServers(target1, target2):
@@ -67,6 +81,9 @@ def load_annotations():
                         logger.info("bad annotation [%s]",line)
     except:
         logger.error("Failed to open annotations file %s",ANNOTATIONS_FILE)
+    # outside of a pod, e.g. in benchmarks, the max message size can be set from the environment
+    if GRPC_MAX_MSG_SIZE_ENV_NAME in os.environ and ANNOTATION_GRPC_MAX_MSG_SIZE not in annotations:
+        annotations[ANNOTATION_GRPC_MAX_MSG_SIZE] = os.environ[GRPC_MAX_MSG_SIZE_ENV_NAME]
     return annotations
 
 
@@ -76,9 +93,34 @@ def main():
     parser.add_argument("interface_name",type=str,help="Name of the user interface.")
     parser.add_argument("api_type",type=str,choices=["REST","GRPC","FBS"])
 
-    parser.add_argument("--service-type",type=str,choices=["MODEL","ROUTER","TRANSFORMER","COMBINER","OUTLIER_DETECTOR"],default="MODEL")
+    parser.add_argument("--service-type",type=str,choices=["MODEL","ROUTER","TRANSFORMER","COMBINER","OUTLIER_DETECTOR","PIPELINE"],default="MODEL")
     parser.add_argument("--persistence",nargs='?',default=0,const=1,type=int)
     parser.add_argument("--parameters",type=str,default=os.environ.get(PARAMETERS_ENV_NAME,"[]"))
+    parser.add_argument("--warmup-requests",type=int,default=int(os.environ.get(WARMUP_REQUESTS_ENV_NAME,0)),
+                        help="Number of warm-up calls per batch size made before the microservice reports ready.")
+    parser.add_argument("--warmup-batch-sizes",type=str,default=os.environ.get(WARMUP_BATCH_SIZES_ENV_NAME,"1"),
+                        help="Comma separated batch sizes used for warm-up.")
+    parser.add_argument("--warmup-contract",type=str,default=DEFAULT_CONTRACT_FILE,
+                        help="Data contract used to generate warm-up requests.")
+    parser.add_argument("--feedback-queue-size",type=int,default=int(os.environ.get(FEEDBACK_QUEUE_SIZE_ENV_NAME,0)),
+                        help="Queue up to this many feedbacks and send them to the user object in the background. "
+                             "0 sends feedback synchronously.")
+    parser.add_argument("--feedback-batch-size",type=int,default=int(os.environ.get(FEEDBACK_BATCH_SIZE_ENV_NAME,DEFAULT_BATCH_SIZE)),
+                        help="Maximum number of queued feedbacks handed to the user object at once.")
+    parser.add_argument("--feedback-queue-policy",type=str,choices=POLICIES,default=os.environ.get(FEEDBACK_QUEUE_POLICY_ENV_NAME,"block"),
+                        help="What to do when the feedback queue is full.")
+    parser.add_argument("--feedback-queue-timeout",type=float,default=float(os.environ.get(FEEDBACK_QUEUE_TIMEOUT_ENV_NAME,DEFAULT_TIMEOUT)),
+                        help="Seconds a feedback waits for room in a full queue before it is rejected, with the block policy.")
+    parser.add_argument("--object-cache",type=str,default=os.environ.get(OBJECT_CACHE_ENV_NAME),
+                        help="Directory where the constructed user object is cached, so that later starts with the "
+                             "same parameters and code load it instead of constructing it.")
+    parser.add_argument("--max-in-flight",type=int,default=int(os.environ.get(MAX_IN_FLIGHT_ENV_NAME,0)),
+                        help="Process at most this many requests at once and reject the excess with a 503/RESOURCE_EXHAUSTED. "
+                             "0 admits every request.")
+    parser.add_argument("--max-queue",type=int,default=int(os.environ.get(MAX_QUEUE_ENV_NAME,0)),
+                        help="Number of requests allowed to wait for a slot when --max-in-flight are being processed.")
+    parser.add_argument("--max-queue-time",type=float,default=os.environ.get(MAX_QUEUE_TIME_ENV_NAME),
+                        help="Seconds a request waits for a slot at most, in addition to its own deadline.")
     args = parser.parse_args()
 
     parameters = parse_parameters(json.loads(args.parameters))
@@ -91,38 +133,85 @@ def main():
     annotations = load_annotations()
     logger.info("Annotations %s",annotations)
 
-    interface_file = importlib.import_module(args.interface_name)
-    user_class = getattr(interface_file,args.interface_name)
-
-    if args.persistence:
-        from .persistence import persist, restore
-        user_object = restore(user_class,parameters,debug=DEBUG)
-        persist(user_object,parameters.get("push_frequency"))
+    if args.service_type == "PIPELINE":
+        # interface_name is a comma separated list of the user classes of the pipeline
+        from .pipeline import load_pipeline
+        if args.persistence:
+            logger.warning("Persistence is not supported by pipelines and is disabled")
+        user_object = load_pipeline(args.interface_name,parameters,cache_dir=args.object_cache)
     else:
-        user_object = user_class(**parameters)
+        interface_file = importlib.import_module(args.interface_name)
+        user_class = getattr(interface_file,args.interface_name)
+
+        def construct_user_object(**parameters):
+            from .object_cache import construct
+            return construct(user_class,parameters,args.object_cache,interface_file)
+
+        if args.persistence:
+            from .persistence import persist, restore
+            user_object = restore(construct_user_object,parameters,debug=DEBUG)
+            persist(user_object,parameters.get("push_frequency"),parameters.get("compaction_frequency"))
+        else:
+            user_object = construct_user_object(**parameters)
 
-    if args.service_type == "MODEL":
+    if args.service_type in ("MODEL","PIPELINE"):
         from . import model_microservice as seldon_microservice
     elif args.service_type == "ROUTER":
         from . import router_microservice as seldon_microservice
     elif args.service_type == "TRANSFORMER":
         from . import transformer_microservice as seldon_microservice
+    elif args.service_type == "COMBINER":
+        from . import combiner_microservice as seldon_microservice
     elif args.service_type == "OUTLIER_DETECTOR":
         from . import outlier_detector_microservice as seldon_microservice
 
     port = int(os.environ.get(SERVICE_PORT_ENV_NAME,DEFAULT_PORT))
 
+    warmup_args = (user_object,args.service_type,args.warmup_requests,
+                   [int(size) for size in args.warmup_batch_sizes.split(",")],args.warmup_contract)
+    do_warmup = needs_warmup(user_object,args.warmup_requests)
+
+    # The queue worker is a thread, so it is started in the server process
+    def serve_with_feedback_queue():
+        return with_feedback_queue(user_object,args.feedback_queue_size,args.feedback_batch_size,
+                                   args.feedback_queue_policy,args.feedback_queue_timeout)
+
+    def get_admission():
+        max_queue_time = None if args.max_queue_time is None else float(args.max_queue_time)
+        return get_admission_controller(args.max_in_flight,args.max_queue,max_queue_time)
+
     if args.api_type == "REST":
         def rest_prediction_server():
             print("Starting REST prediction server")
-            app = seldon_microservice.get_rest_microservice(user_object,debug=DEBUG)
+            served_object = serve_with_feedback_queue()
+            app = seldon_microservice.get_rest_microservice(served_object,debug=DEBUG)
+            add_feedback_metrics_endpoint(app,served_object)
+            admission = get_admission()
+            if admission is not None:
+                add_admission_control(app,admission)
+            # The port opens right away so /live answers, /ready waits for the warm-up
+            ready = threading.Event()
+            add_health_endpoints(app,ready)
+            if do_warmup:
+                warmup_in_background(ready,*warmup_args)
+            else:
+                ready.set()
             app.run(host=os.environ.get("APP_HOST", "0.0.0.0"), port=port)
 
         server1_func=rest_prediction_server
 
     elif args.api_type=="GRPC":
         def grpc_prediction_server():
-            server = seldon_microservice.get_grpc_server(user_object,debug=DEBUG,annotations=annotations)
+            # No traffic can reach the model before the port is opened
+            if do_warmup:
+                warmup(*warmup_args)
+            admission = get_admission()
+            if admission is None:
+                admission_args = {}
+            else:
+                admission_args = dict(grpc_server_limits(admission),interceptors=[get_grpc_interceptor(admission)])
+            server = seldon_microservice.get_grpc_server(serve_with_feedback_queue(),debug=DEBUG,annotations=annotations,
+                                                         **admission_args)
             server.add_insecure_port("0.0.0.0:{}".format(port))
             server.start()
 
@@ -134,6 +223,8 @@ def main():
 
     elif args.api_type=="FBS":
         def fbs_prediction_server():
+            if do_warmup:
+                warmup(*warmup_args)
             seldon_microservice.run_flatbuffers_server(user_object,port)
 
         server1_func=fbs_prediction_server
@@ -1,26 +1,20 @@
-import grpc
-from concurrent import futures
-
-from flask import jsonify, Flask, send_from_directory
-from flask_cors import CORS
 import numpy as np
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from tornado.tcpserver import TCPServer
-from tornado.iostream import StreamClosedError
-from tornado import gen
-import tornado.ioloop
-import struct
-import traceback
 import os
 
-from .proto import prediction_pb2, prediction_pb2_grpc
 from .common import extract_message, sanity_check_request, rest_datadef_to_array, \
     array_to_rest_datadef, grpc_datadef_to_array, array_to_grpc_datadef, \
-    SeldonMicroserviceException
-from .seldon_flatbuffers import SeldonRPCToNumpyArray,NumpyArrayToSeldonRPC,CreateErrorMsg
+    SeldonMicroserviceException, ANNOTATION_GRPC_MAX_MSG_SIZE, extract_feedback_list
+from .cancellation import RequestCancelled, cancellation_scope, rest_token, grpc_token, abort_grpc
+from .admission import record_arrival
+from .feedback_queue import FeedbackQueueFull
+
+# The dependencies of each transport (flask, grpc, tornado/flatbuffers) are only imported
+# once that transport is started, see get_rest_microservice, get_grpc_server and
+# run_flatbuffers_server.
 
 
 PRED_UNIT_ID = os.environ.get("PREDICTIVE_UNIT_ID")
@@ -36,6 +30,25 @@ def send_feedback(user_model,features,feature_names,reward,truth):
     if hasattr(user_model,"send_feedback"):
         user_model.send_feedback(features,feature_names,reward,truth)
 
+def send_feedback_batch(user_model,feedbacks):
+    """
+    feedbacks is a list of (features,feature_names,reward,truth) tuples. Models can handle
+    them at once with send_feedback_batch, otherwise send_feedback is called for each.
+    """
+    if hasattr(user_model,"send_feedback_batch"):
+        user_model.send_feedback_batch(feedbacks)
+    else:
+        for features,feature_names,reward,truth in feedbacks:
+            send_feedback(user_model,features,feature_names,reward,truth)
+
+def get_tags(user_model):
+    """Meta tags of the last prediction, for user models defining tags()."""
+    # a tags attribute that is not a method is not about the prediction
+    if callable(getattr(user_model,"tags",None)):
+        return user_model.tags()
+    else:
+        return {}
+
 def get_class_names(user_model,n_targets):
     if hasattr(user_model,"class_names"):
         return user_model.class_names
@@ -47,17 +60,27 @@ def get_class_names(user_model,n_targets):
 # REST
 # ----------------------------
 
+def rest_feedback_to_args(feedback):
+    datadef_request = feedback.get("request",{}).get("data",{})
+    features = rest_datadef_to_array(datadef_request)
+    truth = rest_datadef_to_array(feedback.get("truth",{}))
+    return features,datadef_request.get("names"),feedback.get("reward"),truth
+
 def get_rest_microservice(user_model,debug=False):
+    from flask import jsonify, Flask, send_from_directory, request as http_request, g
+    from flask_cors import CORS
 
     app = Flask(__name__,static_url_path='')
     CORS(app)
+    # deadlines count from the arrival of the request, before any wait for admission
+    record_arrival(app)
     
     @app.errorhandler(SeldonMicroserviceException)
     def handle_invalid_usage(error):
         response = jsonify(error.to_dict())
         print("ERROR:")
         print(error.to_dict())
-        response.status_code = 400
+        response.status_code = error.status_code
         return response
 
     @app.route("/seldon.json",methods=["GET"])
@@ -66,33 +89,43 @@ def get_rest_microservice(user_model,debug=False):
 
     @app.route("/predict",methods=["GET","POST"])
     def Predict():
+        token = rest_token(http_request.headers,g.get("received_at"))
         request = extract_message()
         sanity_check_request(request)
         
-        datadef = request.get("data")
-        features = rest_datadef_to_array(datadef)
-
-        predictions = np.array(predict(user_model,features,datadef.get("names")))
-        if len(predictions.shape)>1:
-            class_names = get_class_names(user_model, predictions.shape[1])
-        else:
-            class_names = []
-            
-        data = array_to_rest_datadef(predictions, class_names, datadef)
-
-        return jsonify({"data":data})
+        with cancellation_scope(token):
+            token.check()
+            datadef = request.get("data")
+            features = rest_datadef_to_array(datadef)
+
+            token.check()
+            predictions = np.array(predict(user_model,features,datadef.get("names")))
+            if len(predictions.shape)>1:
+                class_names = get_class_names(user_model, predictions.shape[1])
+            else:
+                class_names = []
+
+            token.check()
+            data = array_to_rest_datadef(predictions, class_names, datadef)
+            response = {"data":data}
+            tags = get_tags(user_model)
+            if tags:
+                response["meta"] = {"tags":tags}
+
+        return jsonify(response)
 
     @app.route("/send-feedback",methods=["GET","POST"])
     def SendFeedback():
         feedback = extract_message()
 
-        datadef_request = feedback.get("request",{}).get("data",{})
-        features = rest_datadef_to_array(datadef_request)
-        
-        truth = rest_datadef_to_array(feedback.get("truth",{}))
-        reward = feedback.get("reward")
+        send_feedback(user_model,*rest_feedback_to_args(feedback))
+        return jsonify({})
 
-        send_feedback(user_model,features,datadef_request.get("names"),reward,truth)        
+    @app.route("/send-feedback-batch",methods=["GET","POST"])
+    def SendFeedbackBatch():
+        feedbacks = extract_feedback_list(extract_message())
+
+        send_feedback_batch(user_model,[rest_feedback_to_args(feedback) for feedback in feedbacks])
         return jsonify({})
 
     return app
@@ -106,34 +139,69 @@ def get_rest_microservice(user_model,debug=False):
 class SeldonModelGRPC(object):
     def __init__(self,user_model):
         self.user_model = user_model
+        # imported once here rather than in every call
+        from .proto import prediction_pb2
+        from google.protobuf import json_format
+        self.prediction_pb2 = prediction_pb2
+        self.json_format = json_format
 
     def Predict(self,request,context):
+        # No work is done for calls past their deadline or cancelled by the client
+        token = grpc_token(context)
+        try:
+            with cancellation_scope(token):
+                return self.predict_message(request,token)
+        except RequestCancelled as e:
+            abort_grpc(context,e)
+
+    def predict_message(self,request,token):
+        token.check()
         datadef = request.data
         features = grpc_datadef_to_array(datadef)
 
+        token.check()
         predictions = np.array(predict(self.user_model,features,datadef.names))
         if len(predictions.shape)>1:
             class_names = get_class_names(self.user_model, predictions.shape[1])
         else:
             class_names = []
 
+        token.check()
         data = array_to_grpc_datadef(predictions, class_names, request.data.WhichOneof("data_oneof"))
-        return prediction_pb2.SeldonMessage(data=data)
+        response = self.prediction_pb2.SeldonMessage(data=data)
+        tags = get_tags(self.user_model)
+        if tags:
+            self.json_format.ParseDict({"tags":tags},response.meta)
+        return response
 
     def SendFeedback(self,feedback,context):
-        datadef_request = feedback.request.data
-        features = grpc_datadef_to_array(datadef_request)
-        
-        truth = grpc_datadef_to_array(feedback.truth)
-        reward = feedback.reward
+        try:
+            send_feedback(self.user_model,*grpc_feedback_to_args(feedback))
+        except FeedbackQueueFull as e:
+            abort_grpc(context,e)
 
-        send_feedback(self.user_model,features,datadef_request.names,truth,reward)
+        return self.prediction_pb2.SeldonMessage()
 
-        return prediction_pb2.SeldonMessage()
+    def SendFeedbackBatch(self,feedback_list,context):
+        try:
+            send_feedback_batch(self.user_model,
+                                [grpc_feedback_to_args(feedback) for feedback in feedback_list.feedbacks])
+        except FeedbackQueueFull as e:
+            abort_grpc(context,e)
+
+        return self.prediction_pb2.SeldonMessage()
+
+def grpc_feedback_to_args(feedback):
+    datadef_request = feedback.request.data
+    features = grpc_datadef_to_array(datadef_request)
+    truth = grpc_datadef_to_array(feedback.truth.data)
+    return features,datadef_request.names,feedback.reward,truth
+
+def get_grpc_server(user_model,debug=False,annotations={},interceptors=(),max_workers=10,maximum_concurrent_rpcs=None):
+    import grpc
+    from concurrent import futures
+    from .proto import prediction_pb2_grpc
 
-ANNOTATION_GRPC_MAX_MSG_SIZE = 'seldon.io/grpc-max-message-size'
-    
-def get_grpc_server(user_model,debug=False,annotations={}):
     seldon_model = SeldonModelGRPC(user_model)
     options = []
     if ANNOTATION_GRPC_MAX_MSG_SIZE in annotations:
@@ -142,7 +210,8 @@ def get_grpc_server(user_model,debug=False,annotations={}):
         options.append(('grpc.max_message_length', max_msg ))
         options.append(('grpc.max_receive_message_length', max_msg))
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10),options=options)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),options=options,interceptors=interceptors,
+                         maximum_concurrent_rpcs=maximum_concurrent_rpcs)
     prediction_pb2_grpc.add_ModelServicer_to_server(seldon_model, server)
 
     return server
@@ -152,44 +221,19 @@ def get_grpc_server(user_model,debug=False,annotations={}):
 # Flatbuffers (experimental)
 # ----------------------------
 
-class SeldonFlatbuffersServer(TCPServer):
-    def __init__(self,user_model):
-        super(SeldonFlatbuffersServer, self).__init__()
-        self.user_model = user_model
-
-    @gen.coroutine
-    def handle_stream(self, stream, address):
-        while True:
-            try:
-                data = yield stream.read_bytes(4)
-                obj = struct.unpack('<i',data)
-                len_msg = obj[0]
-                data = yield stream.read_bytes(len_msg)
-                try:
-                    features,names = SeldonRPCToNumpyArray(data)
-                    predictions = np.array(predict(self.user_model,features,names))
-                    if len(predictions.shape)>1:
-                        class_names = get_class_names(self.user_model, predictions.shape[1])
-                    else:
-                        class_names = []
-                    outData = NumpyArrayToSeldonRPC(predictions,class_names)
-                    yield stream.write(outData)
-                except StreamClosedError:
-                    print("Stream closed during processing:",address)
-                    break
-                except Exception:
-                    tb = traceback.format_exc()
-                    print("Caught exception during processing:",address,tb)
-                    outData = CreateErrorMsg(tb)
-                    yield stream.write(outData)
-                    stream.close()
-                    break;
-            except StreamClosedError:
-                print("Stream closed during data inputstream read:",address)
-                break
-        
 def run_flatbuffers_server(user_model,port,debug=False):
-    server = SeldonFlatbuffersServer(user_model)
+    import tornado.ioloop
+    from .seldon_flatbuffers import SeldonFlatbuffersServer
+
+    def predict_flatbuffers(features,names):
+        predictions = np.array(predict(user_model,features,names))
+        if len(predictions.shape)>1:
+            class_names = get_class_names(user_model, predictions.shape[1])
+        else:
+            class_names = []
+        return predictions,class_names
+
+    server = SeldonFlatbuffersServer(predict_flatbuffers)
     server.listen(port)
     print("Tornando Server listening on port",port)
     tornado.ioloop.IOLoop.current().start()
@@ -0,0 +1,114 @@
+"""
+Cache of constructed user objects.
+
+Constructors often load large model files, which every restart and every new replica pays
+again. With --object-cache DIR the user object is written to DIR after it is first
+constructed, in the persistence file format, and later starts load it from there instead of
+calling the constructor: numpy arrays are memory-mapped rather than read.
+
+An entry is only used when the interface name, the parameters, the source of the user
+module, and the versions of python and of this package are those it was built with. Any
+other change (a data file updated under the same name, ...) needs the cache to be cleared.
+Entries built from older code are removed, those of other parameters are kept: the directory
+can be shared by several deployments of the same class.
+"""
+from __future__ import absolute_import, division, print_function
+import glob
+import hashlib
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+from . import __version__
+
+logger = logging.getLogger(__name__)
+
+OBJECT_CACHE_ENV_NAME = "SELDON_OBJECT_CACHE"
+
+
+def code_hash(module):
+    """Hash of the source files of module: the module itself, or all of its package."""
+    digest = hashlib.sha256()
+    filename = getattr(module, "__file__", None)
+    if filename is None:
+        return None
+    if os.path.basename(filename).startswith("__init__."):
+        filenames = sorted(glob.glob(os.path.join(os.path.dirname(filename), "**", "*.py"), recursive=True))
+    else:
+        filenames = [os.path.splitext(filename)[0] + ".py"]
+    for name in filenames:
+        if not os.path.isfile(name):
+            return None
+        digest.update(name.encode("utf-8"))
+        with open(name, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _hash(values):
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def cache_key(interface_name, parameters, module):
+    """
+    "<parameters hash>-<code hash>": the entries of other parameters, e.g. those of other
+    deployments sharing the directory, have another prefix.
+    """
+    source = code_hash(module)
+    if source is None:
+        return None
+    return "{}-{}".format(_hash([interface_name, parameters])[:16],
+                          _hash([source, __version__, platform.python_version()])[:16])
+
+
+def cache_file(cache_dir, interface_name, key):
+    return os.path.join(cache_dir, "{}-{}.object".format(interface_name, key))
+
+
+def construct(user_class, parameters, cache_dir=None, module=None):
+    """
+    user_class(**parameters), loaded from cache_dir when it was built with the same
+    parameters and code, else constructed and added to cache_dir.
+    """
+    if not cache_dir:
+        return user_class(**parameters)
+    from .persistence import dump_file, load_file
+    interface_name = user_class.__name__
+    if module is None:
+        module = sys.modules.get(user_class.__module__)
+    key = cache_key(interface_name, parameters, module)
+    if key is None:
+        logger.warning("No source found for %s, the object cache is not used", interface_name)
+        return user_class(**parameters)
+
+    filename = cache_file(cache_dir, interface_name, key)
+    if os.path.isfile(filename):
+        t1 = time.time()
+        try:
+            user_object = load_file(filename)
+            logger.info("Loaded %s from the object cache in %.3fs", interface_name, time.time() - t1)
+            return user_object
+        except Exception:
+            logger.exception("Failed to load %s from the object cache, constructing it", filename)
+
+    t1 = time.time()
+    user_object = user_class(**parameters)
+    logger.info("Constructed %s in %.3fs", interface_name, time.time() - t1)
+    try:
+        dump_file(user_object, filename)
+    except Exception:
+        logger.exception("Failed to add %s to the object cache", interface_name)
+        return user_object
+    # the entries of the same parameters built from other code are stale. Replicas starting
+    # together may remove the same files.
+    parameters_key = key.split("-")[0]
+    for stale in glob.glob(cache_file(cache_dir, interface_name, parameters_key + "-*")):
+        if stale != filename:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return user_object
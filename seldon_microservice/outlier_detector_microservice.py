@@ -1,14 +1,20 @@
-import grpc
-from concurrent import futures
-
-from flask import jsonify, Flask, send_from_directory
-from flask_cors import CORS
+import base64
 import numpy as np
+import logging
+import os
 
-from .proto import prediction_pb2, prediction_pb2_grpc
 from .common import extract_message, sanity_check_request, rest_datadef_to_array, \
     array_to_rest_datadef, grpc_datadef_to_array, array_to_grpc_datadef, \
-    SeldonMicroserviceException
+    SeldonMicroserviceException, ANNOTATION_GRPC_MAX_MSG_SIZE
+
+logger = logging.getLogger(__name__)
+
+OUTLIER_SCORE_TAG = "outlierScore"
+# "list": the scores as a list of numbers, "packed": a base64 string of the scores as
+# little-endian float64, read back with np.frombuffer(base64.b64decode(tag),"<f8")
+OUTLIER_SCORE_ENCODING = os.environ.get("OUTLIER_SCORE_ENCODING","list")
+# "true": the gRPC TransformInput works on the serialized request, see TransformInputBytes
+OUTLIER_GRPC_PASSTHROUGH = os.environ.get("OUTLIER_GRPC_PASSTHROUGH","false").lower() == "true"
 
 # ---------------------------
 # Interaction with user model
@@ -17,12 +23,31 @@ from .common import extract_message, sanity_check_request, rest_datadef_to_array
 def score(user_model,features,feature_names):
     # Returns a numpy array of floats that corresponds to the outlier scores for each point in the batch
     return user_model.score(features,feature_names)
-    
+
+def encode_scores(outlier_scores,encoding=None):
+    """The scores as the value of the outlier score tag, converted in bulk."""
+    if encoding is None:
+        encoding = OUTLIER_SCORE_ENCODING
+    scores = np.asarray(outlier_scores,dtype=np.float64).ravel()
+    if encoding == "packed":
+        return base64.b64encode(scores.astype("<f8").tobytes()).decode("ascii")
+    elif encoding == "list":
+        return scores.tolist()
+    raise ValueError("Unknown outlier score encoding {}".format(encoding))
+
+def decode_scores(tag):
+    """The scores of an outlier score tag, in either encoding."""
+    if isinstance(tag,str):
+        return np.frombuffer(base64.b64decode(tag),dtype="<f8")
+    return np.asarray(tag,dtype=np.float64)
+
 # ----------------------------
 # REST
 # ----------------------------
 
 def get_rest_microservice(user_model,debug=False):
+    from flask import jsonify, Flask, send_from_directory
+    from flask_cors import CORS
 
     app = Flask(__name__,static_url_path='')
     CORS(app)
@@ -32,7 +57,7 @@ def get_rest_microservice(user_model,debug=False):
         response = jsonify(error.to_dict())
         print("ERROR:")
         print(error.to_dict())
-        response.status_code = 400
+        response.status_code = error.status_code
         return response
 
     @app.route("/seldon.json",methods=["GET"])
@@ -50,8 +75,8 @@ def get_rest_microservice(user_model,debug=False):
         outlier_scores = score(user_model,features,datadef.get("names"))
         # TODO: check that predictions is 2 dimensional
 
-        request["meta"].setdefault("tags",{})
-        request["meta"]["tags"]["outlierScore"] = list(outlier_scores)
+        request.setdefault("meta",{}).setdefault("tags",{})
+        request["meta"]["tags"][OUTLIER_SCORE_TAG] = encode_scores(outlier_scores)
 
         return jsonify(request)
         
@@ -65,6 +90,9 @@ def get_rest_microservice(user_model,debug=False):
 class SeldonTransformerGRPC(object):
     def __init__(self,user_model):
         self.user_model = user_model
+        # imported once here rather than in every call
+        from .proto import prediction_pb2
+        self.prediction_pb2 = prediction_pb2
 
     def TransformInput(self,request,context):
         datadef = request.data
@@ -72,11 +100,41 @@ class SeldonTransformerGRPC(object):
 
         outlier_scores = score(self.user_model,features,datadef.names)
 
-        request.meta.tags["outlierScore"] = list(outlier_scores)
+        set_score_tag(request.meta.tags[OUTLIER_SCORE_TAG],encode_scores(outlier_scores))
 
         return request
-    
-def get_grpc_server(user_model,debug=False,annotations={}):
+
+    def TransformInputBytes(self,request_bytes,context):
+        """
+        TransformInput on the serialized request. The request is forwarded unchanged, followed
+        by a message holding only the score tag: protobuf merges concatenated messages, so the
+        result is the request with the tag added, without serializing the request again.
+        """
+        request = self.prediction_pb2.SeldonMessage.FromString(request_bytes)
+        datadef = request.data
+        features = grpc_datadef_to_array(datadef)
+
+        outlier_scores = score(self.user_model,features,datadef.names)
+
+        patch = self.prediction_pb2.SeldonMessage()
+        set_score_tag(patch.meta.tags[OUTLIER_SCORE_TAG],encode_scores(outlier_scores))
+        return request_bytes + patch.SerializeToString()
+
+def set_score_tag(value,tag):
+    if isinstance(tag,str):
+        value.string_value = tag
+    else:
+        value.list_value.extend(tag)
+
+def get_grpc_server(user_model,debug=False,annotations={},interceptors=(),max_workers=10,maximum_concurrent_rpcs=None,
+                    passthrough=None):
+    import grpc
+    from concurrent import futures
+    from .proto import prediction_pb2_grpc
+
+    if passthrough is None:
+        passthrough = OUTLIER_GRPC_PASSTHROUGH
+
     seldon_model = SeldonTransformerGRPC(user_model)
     options = []
     if ANNOTATION_GRPC_MAX_MSG_SIZE in annotations:
@@ -84,7 +142,15 @@ def get_grpc_server(user_model,debug=False,annotations={}):
         logger.info("Setting grpc max message to %d",max_msg)
         options.append(('grpc.max_message_length', max_msg ))
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10),options=options)
-    prediction_pb2_grpc.add_ModelServicer_to_server(seldon_model, server)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),options=options,interceptors=interceptors,
+                         maximum_concurrent_rpcs=maximum_concurrent_rpcs)
+    if passthrough:
+        # Without (de)serializers the handler works on the request and response bytes
+        handler = grpc.method_handlers_generic_handler("seldon.protos.Transformer",{
+            "TransformInput": grpc.unary_unary_rpc_method_handler(seldon_model.TransformInputBytes)
+        })
+        server.add_generic_rpc_handlers((handler,))
+    else:
+        prediction_pb2_grpc.add_TransformerServicer_to_server(seldon_model, server)
 
     return server
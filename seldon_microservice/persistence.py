@@ -1,58 +1,391 @@
 import threading
 import os
 import time
+import json
+import mmap
+import struct
+import zlib
 try:
     # python 2
     import cPickle as pickle
 except ImportError:
     # python 3
     import pickle
-import redis
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+from .atomic_file import write_atomically
 
 
 PRED_UNIT_ID = os.environ.get("PREDICTIVE_UNIT_ID","0")
 PREDICTOR_ID = os.environ.get("PREDICTOR_ID","0")
 DEPLOYMENT_ID = os.environ.get("SELDON_DEPLOYMENT_ID","0")
 REDIS_KEY = "persistence_{}_{}_{}".format(DEPLOYMENT_ID,PREDICTOR_ID,PRED_UNIT_ID)
+REDIS_DELTAS_KEY = "{}_deltas".format(REDIS_KEY)
+REDIS_MANIFEST_KEY = "{}_manifest".format(REDIS_KEY)
 
 REDIS_HOST = os.environ.get('REDIS_SERVICE_HOST','localhost')
 REDIS_PORT = os.environ.get("REDIS_SERVICE_PORT",6379)
+
+# "redis" or "file"
+PERSISTENCE_BACKEND = os.environ.get("PERSISTENCE_BACKEND","redis")
+# Directory, usually a mounted volume, used by the file backend
+PERSISTENCE_PATH = os.environ.get("PERSISTENCE_PATH","/var/lib/seldon/persistence")
 DEFAULT_PUSH_FREQUENCY = 60
+# Number of delta pushes between two full snapshots of the user object
+DEFAULT_COMPACTION_FREQUENCY = 10
+
+# Snapshots are compressed and split into chunks of CHUNK_SIZE bytes, each stored under
+# its own key, so that no single redis command has to move hundreds of MB.
+CHUNK_SIZE = int(os.environ.get("PERSISTENCE_CHUNK_SIZE",4*1024*1024))
+# Number of chunk commands sent per pipeline round trip
+PIPELINE_SIZE = 16
+if zstandard is not None:
+    DEFAULT_CODEC = "zstd"
+elif lz4_frame is not None:
+    DEFAULT_CODEC = "lz4"
+else:
+    DEFAULT_CODEC = "zlib"
+CODEC = os.environ.get("PERSISTENCE_CODEC",DEFAULT_CODEC)
+
+# Incremental persistence
+# -----------------------
+# A user object can optionally implement:
+#
+#   get_state_delta() -> picklable object with the changes since the previous call, or None
+#   apply_state_delta(delta) -> apply a delta returned by get_state_delta
+#
+# When both are present, only deltas are pushed to the backend between full snapshots.
+# Concurrent updates made while a snapshot is being written can end up both in the
+# snapshot and in the following delta, so deltas should be idempotent (e.g. carry the
+# new values of the changed entries rather than increments).
+
+
+def compress(data,codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    elif codec == "lz4":
+        return lz4_frame.compress(data)
+    elif codec == "zlib":
+        return zlib.compress(data,1)
+    elif codec == "none":
+        return data
+    raise ValueError("Unknown persistence codec {}".format(codec))
+
+def decompress(data,codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Saved state is zstd compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "lz4":
+        if lz4_frame is None:
+            raise RuntimeError("Saved state is lz4 compressed but lz4 is not installed")
+        return lz4_frame.decompress(data)
+    elif codec == "zlib":
+        return zlib.decompress(data)
+    elif codec == "none":
+        return data
+    raise ValueError("Unknown persistence codec {}".format(codec))
+
+def chunk_key(generation,index):
+    return "{}_chunk_{}_{}".format(REDIS_KEY,generation,index)
+
+def read_manifest(redis_client):
+    manifest_binary = redis_client.get(REDIS_MANIFEST_KEY)
+    if manifest_binary is None:
+        return None
+    if isinstance(manifest_binary,bytes):
+        manifest_binary = manifest_binary.decode("utf-8")
+    return json.loads(manifest_binary)
+
+def read_state(redis_client):
+    """
+    Return the pickled user object stored in redis, or None if there is none.
+    Falls back to the single value layout used before chunked storage.
+    """
+    manifest = read_manifest(redis_client)
+    if manifest is None:
+        return redis_client.get(REDIS_KEY)
+    keys = [chunk_key(manifest["generation"],i) for i in range(manifest["chunks"])]
+    chunks = []
+    for start in range(0,len(keys),PIPELINE_SIZE):
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys[start:start+PIPELINE_SIZE]:
+            pipe.get(key)
+        chunks.extend(pipe.execute())
+    if any(chunk is None for chunk in chunks):
+        raise RuntimeError("Saved state generation {} is missing chunks".format(manifest["generation"]))
+    return decompress(b"".join(chunks),manifest["codec"])
+
+def write_state(redis_client,binary_data,codec=None):
+    """
+    Compress and store a pickled user object as a new generation of chunks, then switch
+    the manifest over to it and drop the previous generation and any pending deltas.
+    """
+    if codec is None:
+        codec = CODEC
+    previous = read_manifest(redis_client)
+    payload = memoryview(compress(binary_data,codec))
+    generation = int(time.time()*1000)
+    if previous is not None and previous["generation"] >= generation:
+        generation = previous["generation"] + 1
+    n_chunks = max(1,(len(payload)+CHUNK_SIZE-1)//CHUNK_SIZE)
+    for start in range(0,n_chunks,PIPELINE_SIZE):
+        pipe = redis_client.pipeline(transaction=False)
+        for i in range(start,min(start+PIPELINE_SIZE,n_chunks)):
+            pipe.set(chunk_key(generation,i),payload[i*CHUNK_SIZE:(i+1)*CHUNK_SIZE])
+        pipe.execute()
+    manifest = {
+        "generation":generation,
+        "chunks":n_chunks,
+        "codec":codec,
+        "size":len(binary_data),
+        "compressed_size":len(payload)
+    }
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.set(REDIS_MANIFEST_KEY,json.dumps(manifest))
+    pipe.delete(REDIS_KEY,REDIS_DELTAS_KEY)
+    if previous is not None:
+        pipe.delete(*[chunk_key(previous["generation"],i) for i in range(previous["chunks"])])
+    pipe.execute()
+    return manifest
+
+
+def supports_deltas(user_object):
+    return callable(getattr(user_object,"get_state_delta",None)) and \
+        callable(getattr(user_object,"apply_state_delta",None))
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+#
+# A backend implements:
+#
+#   load_state() -> the saved user object, or None
+#   save_state(user_object) -> store a full snapshot and drop the pending deltas
+#   append_delta(delta) -> store a delta on top of the current snapshot
+#   load_deltas() -> list of the deltas stored since the current snapshot
+
+class RedisBackend(object):
+    def __init__(self,client=None):
+        if client is None:
+            import redis
+            client = redis.StrictRedis(host=REDIS_HOST,port=REDIS_PORT)
+        self.client = client
+
+    def load_state(self):
+        saved_state_binary = read_state(self.client)
+        if saved_state_binary is None:
+            return None
+        return pickle.loads(saved_state_binary)
+
+    def save_state(self,user_object):
+        write_state(self.client,pickle.dumps(user_object,pickle.HIGHEST_PROTOCOL))
+
+    def append_delta(self,delta):
+        self.client.rpush(REDIS_DELTAS_KEY,pickle.dumps(delta))
 
+    def load_deltas(self):
+        return [pickle.loads(delta_binary) for delta_binary in self.client.lrange(REDIS_DELTAS_KEY,0,-1)]
 
-def restore(user_class,parameters,debug=False):
+
+FILE_MAGIC = b"SELDONP1"
+# magic, pickle length, number of out-of-band buffers
+FILE_HEADER = struct.Struct("<8sQQ")
+# offset and length of each out-of-band buffer
+FILE_BUFFER_ENTRY = struct.Struct("<QQ")
+FILE_ALIGNMENT = 64
+DELTA_HEADER = struct.Struct("<Q")
+
+def _padding(offset):
+    return -offset % FILE_ALIGNMENT
+
+class FileBackend(object):
+    """
+    Stores the state in a local file, e.g. on a mounted volume.
+
+    Snapshots are written to a temporary file and renamed over the previous one, so a
+    crash never leaves a partial snapshot behind. With pickle protocol 5 the large
+    buffers (numpy arrays) are written out-of-band, aligned, after the pickle stream and
+    are restored as copy-on-write views of a memory map instead of being unpickled.
+    """
+
+    def __init__(self,path=None):
+        if path is None:
+            path = PERSISTENCE_PATH
+        self.path = path
+        self.state_file = os.path.join(path,"{}.state".format(REDIS_KEY))
+        self.deltas_file = os.path.join(path,"{}.deltas".format(REDIS_KEY))
+
+    def load_state(self):
+        if not os.path.isfile(self.state_file):
+            return None
+        return load_file(self.state_file)
+
+    def save_state(self,user_object):
+        dump_file(user_object,self.state_file)
+        if os.path.isfile(self.deltas_file):
+            os.remove(self.deltas_file)
+
+    def append_delta(self,delta):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        binary_data = pickle.dumps(delta,pickle.HIGHEST_PROTOCOL)
+        with open(self.deltas_file,"ab") as f:
+            f.write(DELTA_HEADER.pack(len(binary_data)))
+            f.write(binary_data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_deltas(self):
+        if not os.path.isfile(self.deltas_file):
+            return []
+        deltas = []
+        with open(self.deltas_file,"rb") as f:
+            while True:
+                header = f.read(DELTA_HEADER.size)
+                if len(header) < DELTA_HEADER.size:
+                    # a trailing partial record is the result of an interrupted write
+                    break
+                length, = DELTA_HEADER.unpack(header)
+                binary_data = f.read(length)
+                if len(binary_data) < length:
+                    break
+                deltas.append(pickle.loads(binary_data))
+        return deltas
+
+def dump_file(obj,filename):
+    """
+    Atomically write obj to filename, with its buffers out-of-band when pickle supports it.
+    """
+    buffers = []
+    if pickle.HIGHEST_PROTOCOL >= 5:
+        binary_data = pickle.dumps(obj,protocol=5,buffer_callback=buffers.append)
+        buffers = [buf.raw() for buf in buffers]
+    else:
+        binary_data = pickle.dumps(obj,pickle.HIGHEST_PROTOCOL)
+
+    offset = FILE_HEADER.size + FILE_BUFFER_ENTRY.size*len(buffers) + len(binary_data)
+    entries = []
+    for buf in buffers:
+        offset += _padding(offset)
+        entries.append((offset,buf.nbytes))
+        offset += buf.nbytes
+
+    def write(f):
+        f.write(FILE_HEADER.pack(FILE_MAGIC,len(binary_data),len(buffers)))
+        for entry in entries:
+            f.write(FILE_BUFFER_ENTRY.pack(*entry))
+        f.write(binary_data)
+        for (buf_offset,_), buf in zip(entries,buffers):
+            f.write(b"\0"*(buf_offset-f.tell()))
+            f.write(buf)
+
+    write_atomically(filename,write)
+
+def load_file(filename):
+    """
+    Load an object written by dump_file. Out-of-band buffers are copy-on-write views of a
+    private memory map of the file, so pages are only read and copied when used or modified.
+    """
+    with open(filename,"rb") as f:
+        mapped = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_COPY)
+    view = memoryview(mapped)
+    magic, pickle_length, n_buffers = FILE_HEADER.unpack_from(mapped,0)
+    if magic != FILE_MAGIC:
+        raise RuntimeError("{} is not a persisted state file".format(filename))
+    position = FILE_HEADER.size
+    buffers = []
+    for _ in range(n_buffers):
+        buf_offset, buf_length = FILE_BUFFER_ENTRY.unpack_from(mapped,position)
+        buffers.append(view[buf_offset:buf_offset+buf_length])
+        position += FILE_BUFFER_ENTRY.size
+    binary_data = view[position:position+pickle_length]
+    if n_buffers:
+        return pickle.loads(binary_data,buffers=buffers)
+    return pickle.loads(binary_data)
+
+def get_backend(name=None):
+    if name is None:
+        name = PERSISTENCE_BACKEND
+    if name == "redis":
+        return RedisBackend()
+    elif name == "file":
+        return FileBackend()
+    raise ValueError("Unknown persistence backend {}".format(name))
+
+
+def restore(user_class,parameters,debug=False,backend=None):
+    if backend is None:
+        backend = get_backend()
     if debug:
-        print("Restoring saved model from redis")
-    redis_client = redis.StrictRedis(host=REDIS_HOST,port=REDIS_PORT)
-    saved_state_binary = redis_client.get(REDIS_KEY)
-    if saved_state_binary is None:
+        print("Restoring saved model from {}".format(type(backend).__name__))
+    user_object = backend.load_state()
+    if user_object is None:
         print("Saved state is empty, restoration aborted")
-        return user_class(**parameters)
-    else:
-        return pickle.loads(saved_state_binary)
+        user_object = user_class(**parameters)
+    if supports_deltas(user_object):
+        deltas = backend.load_deltas()
+        if debug:
+            print("Replaying {} state deltas".format(len(deltas)))
+        for delta in deltas:
+            user_object.apply_state_delta(delta)
+    return user_object
 
-def persist(user_object,push_frequency=None,debug=False):
+def persist(user_object,push_frequency=None,compaction_frequency=None,debug=False,backend=None):
     if push_frequency is None:
         push_frequency = DEFAULT_PUSH_FREQUENCY
+    if compaction_frequency is None:
+        compaction_frequency = DEFAULT_COMPACTION_FREQUENCY
     if debug:
         print("Creating persistence thread, with frequency {}".format(push_frequency))
-    persistence_thread = PersistenceThread(user_object,push_frequency)
+    persistence_thread = PersistenceThread(user_object,push_frequency,compaction_frequency,backend=backend)
     persistence_thread.start()
 
 class PersistenceThread(threading.Thread):
-    def __init__(self,user_object,push_frequency):
+    def __init__(self,user_object,push_frequency,compaction_frequency=DEFAULT_COMPACTION_FREQUENCY,backend=None):
         self.user_object = user_object
         self.push_frequency = push_frequency
+        self.compaction_frequency = compaction_frequency
         self._stopped = False
-        self.redis_client = redis.StrictRedis(host=REDIS_HOST,port=REDIS_PORT)
+        self._pushes_since_compaction = 0
+        if backend is None:
+            backend = get_backend()
+        self.backend = backend
         super(PersistenceThread,self).__init__()
 
     def stop(self):
         print("Stopping Persistence Thread")
         self._stopped = True
 
+    def push_snapshot(self):
+        if supports_deltas(self.user_object):
+            # The snapshot covers every change so far: drop the pending delta
+            self.user_object.get_state_delta()
+        self.backend.save_state(self.user_object)
+        self._pushes_since_compaction = 0
+
+    def push_delta(self):
+        delta = self.user_object.get_state_delta()
+        if delta is not None:
+            self.backend.append_delta(delta)
+        self._pushes_since_compaction += 1
+
+    def push(self):
+        if supports_deltas(self.user_object) and \
+                self._pushes_since_compaction < self.compaction_frequency:
+            self.push_delta()
+        else:
+            self.push_snapshot()
+
     def run(self):
         while not self._stopped:
             time.sleep(self.push_frequency)
-            binary_data = pickle.dumps(self.user_object)
-            self.redis_client.set(REDIS_KEY,binary_data)
+            self.push()
@@ -0,0 +1,119 @@
+"""
+In-process pipelines.
+
+A graph of small transformers around a model pays a network hop and a full serialization
+of the message at every step. With --service-type PIPELINE several user classes are loaded
+in one microservice and chained on numpy arrays, behind the usual model API:
+
+    seldon-microservice MyTransformer,MyModel REST --service-type PIPELINE
+
+The steps are called as if each one was the parent of the next in the graph: on the way in
+every step runs its score (outlier detectors), transform_input and predict methods in turn,
+then on the way out the transform_output methods run from the last step to the first.
+Outlier scores are returned in the outlierScore tag of the response.
+
+Parameters named "<class name>.<parameter>" only go to that step, other parameters go to
+every step.
+"""
+from __future__ import absolute_import, division, print_function
+import importlib
+import threading
+
+import numpy as np
+
+from . import model_microservice, transformer_microservice, outlier_detector_microservice
+from .object_cache import construct
+from .cancellation import check_cancelled
+
+
+class Pipeline(object):
+    """Chains user objects; used as the user model of model_microservice."""
+
+    def __init__(self, steps):
+        self.steps = steps
+        # names and tags of the last prediction made by each thread, read right after
+        # predict by the microservice through class_names and tags()
+        self._local = threading.local()
+
+    def transform_input(self, features, feature_names, until=None):
+        """Run the input side of the steps before step until, without predicting."""
+        for step in self.steps:
+            if step is until:
+                break
+            if hasattr(step, "transform_input"):
+                features = np.array(transformer_microservice.transform_input(step, features, feature_names))
+                feature_names = transformer_microservice.get_feature_names(step, feature_names)
+        return features, feature_names
+
+    def predict(self, features, feature_names):
+        tags = {}
+        for step in self.steps:
+            # a request cancelled midway stops at the next step
+            check_cancelled()
+            if hasattr(step, "score"):
+                scores = outlier_detector_microservice.score(step, features, feature_names)
+                tags[outlier_detector_microservice.OUTLIER_SCORE_TAG] = \
+                    outlier_detector_microservice.encode_scores(scores)
+            if hasattr(step, "transform_input"):
+                features = np.array(transformer_microservice.transform_input(step, features, feature_names))
+                feature_names = transformer_microservice.get_feature_names(step, feature_names)
+            if hasattr(step, "predict"):
+                features = np.array(model_microservice.predict(step, features, feature_names))
+                if len(features.shape) > 1:
+                    feature_names = model_microservice.get_class_names(step, features.shape[1])
+                else:
+                    feature_names = []
+        for step in reversed(self.steps):
+            if hasattr(step, "transform_output"):
+                check_cancelled()
+                features = np.array(transformer_microservice.transform_output(step, features, feature_names))
+                feature_names = transformer_microservice.get_class_names(step, feature_names)
+        self._local.class_names = feature_names
+        self._local.tags = tags
+        return features
+
+    @property
+    def class_names(self):
+        class_names = getattr(self._local, "class_names", None)
+        return [] if class_names is None else class_names
+
+    def tags(self):
+        return getattr(self._local, "tags", {})
+
+    def send_feedback(self, features, feature_names, reward, truth):
+        """Send the feedback to the models of the pipeline, with the features each one saw."""
+        for step in self.steps:
+            if hasattr(step, "predict") and hasattr(step, "send_feedback"):
+                step_features, step_names = self.transform_input(features, feature_names, until=step)
+                model_microservice.send_feedback(step, step_features, step_names, reward, truth)
+
+    def __getstate__(self):
+        return {"steps": self.steps}
+
+    def __setstate__(self, state):
+        self.__init__(state["steps"])
+
+
+def step_parameters(interface_name, parameters):
+    """The parameters of step interface_name, see the module documentation."""
+    step = {}
+    prefix = interface_name + "."
+    for name, value in parameters.items():
+        if name.startswith(prefix):
+            step[name[len(prefix):]] = value
+        elif "." not in name:
+            step[name] = value
+    return step
+
+
+def load_pipeline(interface_names, parameters, cache_dir=None):
+    """
+    Import and create the user classes of a comma separated list of interface names, through
+    the object cache in cache_dir if given.
+    """
+    steps = []
+    for interface_name in interface_names.split(","):
+        interface_file = importlib.import_module(interface_name)
+        user_class = getattr(interface_file, interface_name)
+        steps.append(construct(user_class, step_parameters(interface_name, parameters), cache_dir, interface_file))
+    return Pipeline(steps)
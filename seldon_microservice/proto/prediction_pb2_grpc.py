@@ -140,6 +140,11 @@ class ModelStub(object):
         request_serializer=prediction__pb2.Feedback.SerializeToString,
         response_deserializer=prediction__pb2.SeldonMessage.FromString,
         )
+    self.SendFeedbackBatch = channel.unary_unary(
+        '/seldon.protos.Model/SendFeedbackBatch',
+        request_serializer=prediction__pb2.FeedbackList.SerializeToString,
+        response_deserializer=prediction__pb2.SeldonMessage.FromString,
+        )
 
 
 class ModelServicer(object):
@@ -160,6 +165,13 @@ class ModelServicer(object):
     context.set_details('Method not implemented!')
     raise NotImplementedError('Method not implemented!')
 
+  def SendFeedbackBatch(self, request, context):
+    # missing associated documentation comment in .proto file
+    pass
+    context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+    context.set_details('Method not implemented!')
+    raise NotImplementedError('Method not implemented!')
+
 
 def add_ModelServicer_to_server(servicer, server):
   rpc_method_handlers = {
@@ -173,6 +185,11 @@ def add_ModelServicer_to_server(servicer, server):
           request_deserializer=prediction__pb2.Feedback.FromString,
           response_serializer=prediction__pb2.SeldonMessage.SerializeToString,
       ),
+      'SendFeedbackBatch': grpc.unary_unary_rpc_method_handler(
+          servicer.SendFeedbackBatch,
+          request_deserializer=prediction__pb2.FeedbackList.FromString,
+          response_serializer=prediction__pb2.SeldonMessage.SerializeToString,
+      ),
   }
   generic_handler = grpc.method_handlers_generic_handler(
       'seldon.protos.Model', rpc_method_handlers)
@@ -199,6 +216,11 @@ class RouterStub(object):
         request_serializer=prediction__pb2.Feedback.SerializeToString,
         response_deserializer=prediction__pb2.SeldonMessage.FromString,
         )
+    self.SendFeedbackBatch = channel.unary_unary(
+        '/seldon.protos.Router/SendFeedbackBatch',
+        request_serializer=prediction__pb2.FeedbackList.SerializeToString,
+        response_deserializer=prediction__pb2.SeldonMessage.FromString,
+        )
 
 
 class RouterServicer(object):
@@ -219,6 +241,13 @@ class RouterServicer(object):
     context.set_details('Method not implemented!')
     raise NotImplementedError('Method not implemented!')
 
+  def SendFeedbackBatch(self, request, context):
+    # missing associated documentation comment in .proto file
+    pass
+    context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+    context.set_details('Method not implemented!')
+    raise NotImplementedError('Method not implemented!')
+
 
 def add_RouterServicer_to_server(servicer, server):
   rpc_method_handlers = {
@@ -232,6 +261,11 @@ def add_RouterServicer_to_server(servicer, server):
           request_deserializer=prediction__pb2.Feedback.FromString,
           response_serializer=prediction__pb2.SeldonMessage.SerializeToString,
       ),
+      'SendFeedbackBatch': grpc.unary_unary_rpc_method_handler(
+          servicer.SendFeedbackBatch,
+          request_deserializer=prediction__pb2.FeedbackList.FromString,
+          response_serializer=prediction__pb2.SeldonMessage.SerializeToString,
+      ),
   }
   generic_handler = grpc.method_handlers_generic_handler(
       'seldon.protos.Router', rpc_method_handlers)
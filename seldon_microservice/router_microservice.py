@@ -1,15 +1,14 @@
-import grpc
-from concurrent import futures
-
-from flask import jsonify, Flask, send_from_directory
-from flask_cors import CORS
 import numpy as np
+import logging
 import os
 
-from .proto import prediction_pb2, prediction_pb2_grpc
 from .common import extract_message, sanity_check_request, rest_datadef_to_array, \
     array_to_rest_datadef, grpc_datadef_to_array, array_to_grpc_datadef, \
-    SeldonMicroserviceException
+    SeldonMicroserviceException, ANNOTATION_GRPC_MAX_MSG_SIZE, extract_feedback_list
+from .cancellation import abort_grpc
+from .feedback_queue import FeedbackQueueFull
+
+logger = logging.getLogger(__name__)
 
 PRED_UNIT_ID = os.environ.get("PREDICTIVE_UNIT_ID")
 
@@ -20,14 +19,55 @@ PRED_UNIT_ID = os.environ.get("PREDICTIVE_UNIT_ID")
 def route(user_router,features,feature_names):
     return user_router.route(features,feature_names)
 
+def route_batch(user_router,features,feature_names):
+    """
+    The routing response as a 2-D array. Routers defining route_batch(features,feature_names)
+    return one child index per row of features, sent as a column with one row per request row
+    so that the rows can be scattered to the children; otherwise the single route of the
+    request is sent as [[route]].
+    """
+    if hasattr(user_router,"route_batch"):
+        routing = np.asarray(user_router.route_batch(features,feature_names)).reshape(-1,1)
+        n_rows = features.shape[0] if features.ndim > 0 else 1
+        if routing.shape[0] != n_rows:
+            raise SeldonMicroserviceException(
+                "route_batch returned {} routes for {} rows".format(routing.shape[0],n_rows))
+        return routing
+    return np.array([[route(user_router,features,feature_names)]])
+
 def send_feedback(user_router,features,feature_names,routing,reward,truth):
     return user_router.send_feedback(features,feature_names,routing,reward,truth)
 
+def send_feedback_batch(user_router,feedbacks):
+    """
+    feedbacks is a list of (features,feature_names,routing,reward,truth) tuples. Routers can
+    handle them at once with send_feedback_batch, otherwise send_feedback is called for each.
+    """
+    if hasattr(user_router,"send_feedback_batch"):
+        user_router.send_feedback_batch(feedbacks)
+    else:
+        for features,feature_names,routing,reward,truth in feedbacks:
+            send_feedback(user_router,features,feature_names,routing,reward,truth)
+
 # ----------------------------
 # REST
 # ----------------------------
 
+def rest_feedback_to_args(feedback):
+    datadef_request = feedback.get("request",{}).get("data",{})
+    features = rest_datadef_to_array(datadef_request)
+    truth = rest_datadef_to_array(feedback.get("truth",{}))
+    reward = feedback.get("reward")
+
+    try:
+        routing = feedback.get("response").get("meta").get("routing").get(PRED_UNIT_ID)
+    except AttributeError:
+        raise SeldonMicroserviceException("Router feedback must contain a routing dictionary in the response metadata")
+    return features,datadef_request.get("names"),routing,reward,truth
+
 def get_rest_microservice(user_router,debug=False):
+    from flask import jsonify, Flask, send_from_directory
+    from flask_cors import CORS
 
     app = Flask(__name__,static_url_path='')
     CORS(app)
@@ -35,7 +75,7 @@ def get_rest_microservice(user_router,debug=False):
     @app.errorhandler(SeldonMicroserviceException)
     def handle_invalid_usage(error):
         response = jsonify(error.to_dict())
-        response.status_code = 400
+        response.status_code = error.status_code
         return response
 
     @app.route("/seldon.json",methods=["GET"])
@@ -58,7 +98,7 @@ def get_rest_microservice(user_router,debug=False):
         datadef = request.get("data")
         features = rest_datadef_to_array(datadef)
 
-        routing = np.array([[route(user_router,features,datadef.get("names"))]])
+        routing = route_batch(user_router,features,datadef.get("names"))
         # TODO: check that predictions is 2 dimensional
         class_names = []
 
@@ -76,18 +116,18 @@ def get_rest_microservice(user_router,debug=False):
             print(feedback)
 
         
-        datadef_request = feedback.get("request",{}).get("data",{})
-        features = rest_datadef_to_array(datadef_request)
-        
-        truth = rest_datadef_to_array(feedback.get("truth",{}))
-        reward = feedback.get("reward")
+        send_feedback(user_router,*rest_feedback_to_args(feedback))
+        return jsonify({})
 
-        try:
-            routing = feedback.get("response").get("meta").get("routing").get(PRED_UNIT_ID)
-        except AttributeError:
-            raise SeldonMicroserviceException("Router feedback must contain a routing dictionary in the response metadata")
+    @app.route("/send-feedback-batch",methods=["GET","POST"])
+    def SendFeedbackBatch():
+        feedbacks = extract_feedback_list(extract_message())
 
-        send_feedback(user_router,features,datadef_request.get("names"),routing,reward,truth)
+        if debug:
+            print("SELDON DEBUGGING")
+            print("Feedback batch of {} received".format(len(feedbacks)))
+
+        send_feedback_batch(user_router,[rest_feedback_to_args(feedback) for feedback in feedbacks])
         return jsonify({})
 
     return app
@@ -100,31 +140,50 @@ def get_rest_microservice(user_router,debug=False):
 class SeldonRouterGRPC(object):
     def __init__(self,user_model):
         self.user_model = user_model
+        # imported once here rather than in every call
+        from .proto import prediction_pb2
+        self.prediction_pb2 = prediction_pb2
 
     def Route(self,request,context):
         datadef = request.data
         features = grpc_datadef_to_array(datadef)
 
-        routing = np.array([[route(self.user_model,features,datadef.names)]])
+        routing = route_batch(self.user_model,features,datadef.names)
         #TODO: check that predictions is 2 dimensional
         class_names = []
 
         data = array_to_grpc_datadef(routing, class_names, request.data.WhichOneof("data_oneof"))
-        return prediction_pb2.SeldonMessage(data=data)
+        return self.prediction_pb2.SeldonMessage(data=data)
 
     def SendFeedback(self,feedback,context):
-        datadef_request = feedback.request.data
-        features = grpc_datadef_to_array(datadef_request)
-        
-        truth = grpc_datadef_to_array(feedback.truth)
-        reward = feedback.reward
-        routing = feedback.response.meta.routing.get(PRED_UNIT_ID)
-        
-        send_feedback(self.user_model,features,datadef_request.names,routing,reward,truth)
+        try:
+            send_feedback(self.user_model,*grpc_feedback_to_args(feedback))
+        except FeedbackQueueFull as e:
+            abort_grpc(context,e)
+
+        return self.prediction_pb2.SeldonMessage()
 
-        return prediction_pb2.SeldonMessage()
+    def SendFeedbackBatch(self,feedback_list,context):
+        try:
+            send_feedback_batch(self.user_model,
+                                [grpc_feedback_to_args(feedback) for feedback in feedback_list.feedbacks])
+        except FeedbackQueueFull as e:
+            abort_grpc(context,e)
+
+        return self.prediction_pb2.SeldonMessage()
+
+def grpc_feedback_to_args(feedback):
+    datadef_request = feedback.request.data
+    features = grpc_datadef_to_array(datadef_request)
+    truth = grpc_datadef_to_array(feedback.truth.data)
+    routing = feedback.response.meta.routing.get(PRED_UNIT_ID)
+    return features,datadef_request.names,routing,feedback.reward,truth
     
-def get_grpc_server(user_model,debug=False,annotations={}):
+def get_grpc_server(user_model,debug=False,annotations={},interceptors=(),max_workers=10,maximum_concurrent_rpcs=None):
+    import grpc
+    from concurrent import futures
+    from .proto import prediction_pb2_grpc
+
     seldon_router = SeldonRouterGRPC(user_model)
     options = []
     if ANNOTATION_GRPC_MAX_MSG_SIZE in annotations:
@@ -132,7 +191,8 @@ def get_grpc_server(user_model,debug=False,annotations={}):
         logger.info("Setting grpc max message to %d",max_msg)
         options.append(('grpc.max_message_length', max_msg ))
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10),options=options)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),options=options,interceptors=interceptors,
+                         maximum_concurrent_rpcs=maximum_concurrent_rpcs)
     prediction_pb2_grpc.add_RouterServicer_to_server(seldon_router, server)
 
     return server
@@ -3,9 +3,12 @@ from tornado.iostream import StreamClosedError
 from tornado import gen
 import tornado.ioloop
 
+import flatbuffers
 from flatbuffers.number_types import (UOffsetTFlags, SOffsetTFlags, VOffsetTFlags)
 
 import sys
+import struct
+import traceback
 import numpy as np
 
 from .fbs.SeldonMessage import *
@@ -19,6 +22,42 @@ from .fbs.StatusValue import *
 from .fbs.SeldonProtocolVersion import *
 from .fbs.SeldonRPC import *
 
+class SeldonFlatbuffersServer(TCPServer):
+    """
+    Serves size-prefixed SeldonRPC messages. handler(features,names) returns the
+    (array,names) pair sent back to the client.
+    """
+    def __init__(self,handler):
+        super(SeldonFlatbuffersServer, self).__init__()
+        self.handler = handler
+
+    @gen.coroutine
+    def handle_stream(self, stream, address):
+        while True:
+            try:
+                data = yield stream.read_bytes(4)
+                obj = struct.unpack('<i',data)
+                len_msg = obj[0]
+                data = yield stream.read_bytes(len_msg)
+                try:
+                    features,names = SeldonRPCToNumpyArray(data)
+                    array,out_names = self.handler(features,names)
+                    outData = NumpyArrayToSeldonRPC(array,out_names)
+                    yield stream.write(outData)
+                except StreamClosedError:
+                    print("Stream closed during processing:",address)
+                    break
+                except Exception:
+                    tb = traceback.format_exc()
+                    print("Caught exception during processing:",address,tb)
+                    outData = CreateErrorMsg(tb)
+                    yield stream.write(outData)
+                    stream.close()
+                    break;
+            except StreamClosedError:
+                print("Stream closed during data inputstream read:",address)
+                break
+
 class FlatbuffersInvalidMessage(Exception):
     def __init__(self, msg=None):
         super(FlatbuffersInvalidMessage, self).__init__(msg)
@@ -0,0 +1,302 @@
+"""
+Streaming statistics for outlier detectors.
+
+The score method of an outlier detector sees one batch at a time, while the detector
+usually needs statistics of all the traffic so far: a mean and covariance for Mahalanobis
+distances, a sample of past points, quantiles of past scores. The classes below update
+such statistics batch by batch with numpy, in memory fixed when they are created:
+
+    RunningMoments       mean and (co)variance of all the points, Welford/Chan updates
+    ExponentialMoments   mean and variance over an exponentially decaying window
+    Reservoir            uniform sample of a fixed number of past points
+    TDigest              approximate quantiles, e.g. to turn scores into percentiles
+
+They are thread-safe, as score can be called by several server threads at once, and
+picklable (the lock is recreated when they are loaded), so a detector holding them is saved
+and restored by persistence like any other user object:
+
+    class MyDetector(object):
+        def __init__(self, n_features=4):
+            self.moments = RunningMoments(n_features)
+
+        def score(self, X, feature_names):
+            self.moments.update(X)
+            return self.moments.mahalanobis(X)
+"""
+from __future__ import absolute_import, division, print_function
+import copy
+import threading
+
+import numpy as np
+
+from .contract import make_rng, random_uniform
+
+
+def _as_batch(X, n_features):
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1 and n_features != 1:
+        X = X.reshape(1, -1)
+    return X.reshape(-1, n_features)
+
+
+class _Synchronized(object):
+    """Pickles the state of a statistic without its lock, taken so that no update is half done."""
+
+    def __getstate__(self):
+        with self._lock:
+            return copy.deepcopy({name: value for name, value in self.__dict__.items() if name != "_lock"})
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class RunningMoments(_Synchronized):
+    """
+    Count, mean and covariance of all the points seen. Each batch is reduced with numpy and
+    combined with the totals so far (Chan et al.), which is as stable as Welford's update.
+    With covariance=False only the variance of each feature is kept.
+    """
+
+    def __init__(self, n_features, covariance=True):
+        self.n_features = n_features
+        self.covariance = covariance
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        # sum of the squared deviations from the mean (outer products with covariance)
+        self.m2 = np.zeros((n_features, n_features) if covariance else n_features)
+        self._lock = threading.Lock()
+
+    def update(self, X):
+        X = _as_batch(X, self.n_features)
+        n = X.shape[0]
+        if n == 0:
+            return self
+        mean = X.mean(axis=0)
+        centered = X - mean
+        if self.covariance:
+            m2 = centered.T.dot(centered)
+        else:
+            m2 = (centered * centered).sum(axis=0)
+        with self._lock:
+            self._combine(n, mean, m2)
+        return self
+
+    def merge(self, other):
+        """Add the points of other, e.g. the moments kept by another worker."""
+        with other._lock:
+            n, mean, m2 = other.count, other.mean, other.m2
+        if n:
+            with self._lock:
+                self._combine(n, mean, m2)
+        return self
+
+    def _combine(self, n, mean, m2):
+        """Called locked."""
+        total = self.count + n
+        delta = mean - self.mean
+        if self.covariance:
+            correction = np.outer(delta, delta)
+        else:
+            correction = delta * delta
+        self.m2 = self.m2 + m2 + correction * (self.count * n / total)
+        self.mean = self.mean + delta * (n / total)
+        self.count = total
+
+    @property
+    def variance(self):
+        return np.diag(self._moments()[1])
+
+    @property
+    def covariance_matrix(self):
+        return self._moments()[1]
+
+    def _moments(self):
+        """The mean and covariance matrix, both of the same points."""
+        # the updates replace the arrays rather than change them, so references are a snapshot
+        with self._lock:
+            mean, m2, count = self.mean, self.m2, self.count
+        if not self.covariance:
+            m2 = np.diag(m2)
+        return mean, m2 / max(count - 1, 1)
+
+    def mahalanobis(self, X):
+        """Mahalanobis distance of each row of X to the points seen so far."""
+        mean, covariance_matrix = self._moments()
+        centered = _as_batch(X, self.n_features) - mean
+        precision = np.linalg.pinv(covariance_matrix)
+        return np.sqrt(np.maximum(np.einsum("ij,jk,ik->i", centered, precision, centered), 0))
+
+
+class ExponentialMoments(_Synchronized):
+    """
+    Mean and variance of each feature over an exponentially decaying window, where a point
+    weighs half as much after half_life more points.
+    """
+
+    def __init__(self, n_features, half_life=1000):
+        self.n_features = n_features
+        self.decay = 0.5 ** (1. / half_life)
+        # decayed sums of the weights, the points and their squares
+        self.weight = 0.
+        self.sum = np.zeros(n_features)
+        self.sum_squares = np.zeros(n_features)
+        self._lock = threading.Lock()
+
+    def update(self, X):
+        X = _as_batch(X, self.n_features)
+        n = X.shape[0]
+        if n == 0:
+            return self
+        # the last point of the batch has weight 1, the first decay ** (n - 1)
+        weights = self.decay ** np.arange(n - 1, -1, -1, dtype=np.float64)
+        scale = self.decay ** n
+        sums = weights.sum(), weights.dot(X), weights.dot(X * X)
+        with self._lock:
+            self.weight = self.weight * scale + sums[0]
+            self.sum = self.sum * scale + sums[1]
+            self.sum_squares = self.sum_squares * scale + sums[2]
+        return self
+
+    @property
+    def mean(self):
+        return self._moments()[0]
+
+    @property
+    def variance(self):
+        return self._moments()[1]
+
+    def _moments(self):
+        """The mean and variance, both of the same points."""
+        with self._lock:
+            weight, total, sum_squares = self.weight, self.sum, self.sum_squares
+        if not weight:
+            return np.zeros(self.n_features), np.zeros(self.n_features)
+        mean = total / weight
+        return mean, np.maximum(sum_squares / weight - mean ** 2, 0)
+
+    def zscore(self, X):
+        mean, variance = self._moments()
+        return (_as_batch(X, self.n_features) - mean) / np.sqrt(np.maximum(variance, 1e-12))
+
+
+class Reservoir(_Synchronized):
+    """A uniform sample of up to size of the points seen so far (algorithm R, per batch)."""
+
+    def __init__(self, size, n_features, seed=None):
+        self.size = size
+        self.n_features = n_features
+        self.count = 0
+        self.points = np.zeros((size, n_features))
+        self.rng = make_rng(seed)
+        self._lock = threading.Lock()
+
+    def update(self, X):
+        X = _as_batch(X, self.n_features)
+        with self._lock:
+            self._update(X)
+        return self
+
+    def _update(self, X):
+        filled = min(max(self.size - self.count, 0), X.shape[0])
+        self.points[self.count:self.count + filled] = X[:filled]
+        rest = X[filled:]
+        if rest.shape[0]:
+            # point i of the stream replaces a random slot with probability size / (i + 1)
+            seen = self.count + filled + np.arange(1, rest.shape[0] + 1)
+            slots = np.floor(random_uniform(self.rng, rest.shape[0]) * seen).astype(np.int64)
+            kept = slots < self.size
+            # with repeated slots the last point wins, as in the sequential algorithm
+            self.points[slots[kept]] = rest[kept]
+        self.count += X.shape[0]
+
+    @property
+    def sample(self):
+        # a copy, as the points are replaced in place by the updates
+        with self._lock:
+            return self.points[:min(self.count, self.size)].copy()
+
+
+class TDigest(_Synchronized):
+    """
+    Approximate quantiles of a stream of values with at most about compression / 2
+    centroids (a merging t-digest with the k1 scale function). Values are buffered and
+    merged into the centroids when the buffer is full.
+    """
+
+    def __init__(self, compression=100, buffer_size=None):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.buffer = np.zeros(buffer_size or 5 * compression)
+        self.buffered = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._lock = threading.Lock()
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        with self._lock:
+            self._update(values)
+        return self
+
+    def _update(self, values):
+        if values.size:
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+        while values.size:
+            n = min(values.size, self.buffer.size - self.buffered)
+            self.buffer[self.buffered:self.buffered + n] = values[:n]
+            self.buffered += n
+            values = values[n:]
+            if self.buffered == self.buffer.size:
+                self._merge()
+
+    @property
+    def count(self):
+        with self._lock:
+            return self.weights.sum() + self.buffered
+
+    def _merge(self):
+        """Merge the buffered values into the centroids. Called locked."""
+        if not self.buffered:
+            return
+        means = np.concatenate([self.means, self.buffer[:self.buffered]])
+        weights = np.concatenate([self.weights, np.ones(self.buffered)])
+        self.buffered = 0
+        order = np.argsort(means, kind="mergesort")
+        means = means[order]
+        weights = weights[order]
+        total = weights.sum()
+        # centroids starting within the same unit of k(q) = compression / 2pi asin(2q - 1)
+        # are merged together
+        q_left = (np.cumsum(weights) - weights) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q_left - 1, -1, 1))
+        groups = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def _centroids(self):
+        """Called locked."""
+        self._merge()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.r_[0., centers, self.weights.sum()]
+        values = np.r_[self.min, self.means, self.max]
+        return positions, values
+
+    def quantile(self, q):
+        """The approximate q quantiles, q in [0, 1]."""
+        with self._lock:
+            if not self.weights.size and not self.buffered:
+                return np.full(np.shape(q), np.nan)
+            positions, values = self._centroids()
+        return np.interp(np.asarray(q) * positions[-1], positions, values)
+
+    def cdf(self, x):
+        """The approximate fraction of the values below x."""
+        with self._lock:
+            if not self.weights.size and not self.buffered:
+                return np.full(np.shape(x), np.nan)
+            positions, values = self._centroids()
+        return np.interp(x, values, positions) / positions[-1]
@@ -1,14 +1,16 @@
 import argparse
 import numpy as np
 import json
-import requests
-import urllib
+import sys
 from google.protobuf.struct_pb2 import ListValue
-import grpc
-from time import time
 
 from .proto import prediction_pb2
 from .proto import prediction_pb2_grpc
+from .contract import gen_continuous, reconciliate_cont_type, gen_categorical, generate_batch, \
+    unfold_contract, load_contract, compile_contract, make_rng
+from .loadgen import run_load, RESTClient, GRPCClient, FBSClient
+from .corpus import RequestCorpus
+from .tester_flatbuffers import NumpyArrayToSeldonRPC
 
 
 def array_to_list_value(array, lv=None):
@@ -23,55 +25,6 @@ def array_to_list_value(array, lv=None):
     return lv
 
 
-def gen_continuous(range, n):
-    if range[0] == "inf" and range[1] == "inf":
-        return np.random.normal(size=n)
-    if range[0] == "inf":
-        return range[1] - np.random.lognormal(size=n)
-    if range[1] == "inf":
-        return range[0] + np.random.lognormal(size=n)
-    return np.random.uniform(range[0], range[1], size=n)
-
-
-def reconciliate_cont_type(feature, dtype):
-    if dtype == "FLOAT":
-        return feature
-    if dtype == "INT":
-        return (feature + 0.5).astype(int).astype(float)
-
-
-def gen_categorical(values, n):
-    vals = np.random.randint(len(values), size=n)
-    return np.array(values)[vals]
-
-
-def generate_batch(contract, n, field):
-    feature_batches = []
-    ty_set = set()
-    for feature_def in contract[field]:
-        ty_set.add(feature_def["ftype"])
-        if feature_def["ftype"] == "continuous":
-            if "range" in feature_def:
-                range = feature_def["range"]
-            else:
-                range = ["inf", "inf"]
-            if "shape" in feature_def:
-                shape = [n] + feature_def["shape"]
-            else:
-                shape = [n, 1]
-            batch = gen_continuous(range, shape)
-            batch = np.around(batch, decimals=3)
-            batch = reconciliate_cont_type(batch, feature_def["dtype"])
-        elif feature_def["ftype"] == "categorical":
-            batch = gen_categorical(feature_def["values"], [n, 1])
-        feature_batches.append(batch)
-    if len(ty_set) == 1:
-        return np.concatenate(feature_batches, axis=1)
-    else:
-        out = np.empty((n, len(contract['features'])), dtype=object)
-        return np.concatenate(feature_batches, axis=1, out=out)
-
-
 def gen_REST_request(batch, features, tensor=True):
     if tensor:
         datadef = {
@@ -116,154 +69,140 @@ def gen_GRPC_request(batch, features, tensor=True):
     return request
 
 
-def unfold_contract(contract):
-    unfolded_contract = {}
-    unfolded_contract["targets"] = []
-    unfolded_contract["features"] = []
-
-    for feature in contract["features"]:
-        if feature.get("repeat") is not None:
-            for i in range(feature.get("repeat")):
-                new_feature = {}
-                new_feature.update(feature)
-                new_feature["name"] = feature["name"] + str(i + 1)
-                del new_feature["repeat"]
-                unfolded_contract["features"].append(new_feature)
-        else:
-            unfolded_contract["features"].append(feature)
-
-    for target in contract["targets"]:
-        if target.get("repeat") is not None:
-            for i in range(target.get("repeat")):
-                new_target = {}
-                new_target.update(target)
-                new_target["name"] = target["name"] + ":" + str(i)
-                del new_target["repeat"]
-                unfolded_contract["targets"].append(new_target)
+def print_exchange(i, request, response):
+    print('-' * 40)
+    print("REQUEST {}:".format(i))
+    if isinstance(request, (bytes, bytearray)):
+        print("<{} bytes>".format(len(request)))
+    else:
+        print(request)
+    print("RECEIVED RESPONSE:")
+    print(response)
+    print()
+
+
+def print_error(i, request, e):
+    print("Request {} failed: {!r}".format(i, e))
+
+
+def get_format(args):
+    if args.grpc:
+        return "grpc"
+    elif args.fbs:
+        return "fbs"
+    return "rest"
+
+
+def get_request_source(args, next_request, kind):
+    """
+    Return the function giving request i, and whether it returns serialized requests.
+    With --corpus or --corpus-size the requests come from a RequestCorpus prepared before
+    the run, so that no request is generated or serialized while under load.
+    """
+    fmt = get_format(args)
+    if args.corpus:
+        if args.corpus.endswith(".corpus"):
+            corpus = RequestCorpus.load(args.corpus)
         else:
-            unfolded_contract["targets"].append(target)
+            corpus = RequestCorpus.from_log(args.corpus, fmt, kind)
+        if corpus.format != fmt:
+            raise ValueError("Corpus {} holds {} requests".format(args.corpus, corpus.format))
+    elif args.corpus_size:
+        corpus = RequestCorpus.generate(next_request, args.corpus_size, fmt)
+    else:
+        return next_request, False
+    print("Replaying a corpus of {} requests".format(len(corpus)))
+    if args.save_corpus:
+        corpus.save(args.save_corpus)
+    return corpus.__getitem__, True
+
+
+def get_client(args, endpoint, grpc_method, raw=False):
+    if args.grpc:
+        return GRPCClient(args.host, args.port, prediction_pb2_grpc.ModelStub, grpc_method, raw=raw)
+    elif args.fbs:
+        return FBSClient(args.host, args.port, pipeline=args.pipeline)
+    else:
+        return RESTClient("http://" + args.host + ":" + str(args.port) + "/" + endpoint)
+
+
+def print_interval(summary):
+    latency = summary.get("latency_ms", {})
+    print("[{:7.2f}s] {} requests, {} errors, {:.1f} req/s, {}".format(
+        summary["end_s"], summary["requests"], summary["errors"], summary["throughput_rps"],
+        ", ".join("{} {:.3f}ms".format(key, latency[key]) for key in ("p50", "p99", "max") if key in latency)))
+
 
-    return unfolded_contract
+def run_load_test(args, client, next_request):
+    result = run_load(client, next_request, args.n_requests,
+                      concurrency=args.concurrency, rate=args.rate,
+                      on_response=print_exchange if args.prnt else None,
+                      on_error=print_error,
+                      interval=args.interval, on_interval=print_interval)
+    if hasattr(client, "close"):
+        client.close()
+    print(result.report())
+    if args.output:
+        result.write(args.output)
+    return result
+
+
+def read_contract(contract_file):
+    with open(contract_file, 'r') as f:
+        return json.load(f)
+
+
+def request_rng(args, i):
+    """With --seed, request i gets the same data whichever worker builds it."""
+    if args.seed is None:
+        return None
+    return make_rng([args.seed, i])
 
 
 def run_send_feedback(args):
-    contract = json.load(open(args.contract, 'r'))
-    contract = unfold_contract(contract)
-    feature_names = [feature["name"] for feature in contract["features"]]
-    response_names = [feature["name"] for feature in contract["targets"]]
-
-    REST_url = "http://" + args.host + ":" + str(args.port) + "/send-feedback"
-
-    for i in range(args.n_requests):
-        batch = generate_batch(contract, args.batch_size, 'features')
-        response = generate_batch(contract, args.batch_size, 'targets')
-        if args.prnt:
-            print('-' * 40)
-            print("SENDING NEW REQUEST:")
-
-        if not args.grpc and not args.fbs:
-            REST_request = gen_REST_request(batch, features=feature_names, tensor=args.tensor)
-            REST_response = gen_REST_request(response, features=response_names, tensor=args.tensor)
-            reward = 1.0
-            REST_feedback = {"request": REST_request, "response": REST_response, "reward": reward}
-            if args.prnt:
-                print(REST_feedback)
-
-            t1 = time()
-            response = requests.post(
-                REST_url,
-                data={"json": json.dumps(REST_feedback)})
-            t2 = time()
-
-            if args.prnt:
-                print("Time " + str(t2 - t1))
-                print(response)
-        elif args.grpc:
-            GRPC_request = gen_GRPC_request(batch, features=feature_names, tensor=args.tensor)
-            GRPC_response = gen_GRPC_request(response, features=response_names, tensor=args.tensor)
-            reward = 1.0
-            GRPC_feedback = prediction_pb2.Feedback(
-                request=GRPC_request,
-                response=GRPC_response,
+    contract = read_contract(args.contract)
+    features = compile_contract(contract, 'features')
+    targets = compile_contract(contract, 'targets')
+    feature_names = features.names
+    response_names = targets.names
+    reward = 1.0
+
+    def next_request(i):
+        rng = request_rng(args, i)
+        batch = features.generate(args.batch_size, rng=rng)
+        response = targets.generate(args.batch_size, rng=rng)
+        if args.grpc:
+            return prediction_pb2.Feedback(
+                request=gen_GRPC_request(batch, features=feature_names, tensor=args.tensor),
+                response=gen_GRPC_request(response, features=response_names, tensor=args.tensor),
                 reward=reward
             )
+        else:
+            return {
+                "request": gen_REST_request(batch, features=feature_names, tensor=args.tensor),
+                "response": gen_REST_request(response, features=response_names, tensor=args.tensor),
+                "reward": reward
+            }
 
-            if args.prnt:
-                print(GRPC_feedback)
-
-            channel = grpc.insecure_channel('{}:{}'.format(args.host, args.port))
-            stub = prediction_pb2_grpc.ModelStub(channel)
-            response = stub.SendFeedback(GRPC_feedback)
-
-            if args.prnt:
-                print("RECEIVED RESPONSE:")
-                print()
+    next_request, raw = get_request_source(args, next_request, "feedback")
+    return run_load_test(args, get_client(args, "send-feedback", "SendFeedback", raw), next_request)
 
 
 def run_predict(args):
-    contract = json.load(open(args.contract, 'r'))
-    contract = unfold_contract(contract)
-    feature_names = [feature["name"] for feature in contract["features"]]
-
-    REST_url = "http://" + args.host + ":" + str(args.port) + "/predict"
-
-    for i in range(args.n_requests):
-        batch = generate_batch(contract, args.batch_size, 'features')
-        if args.prnt:
-            print('-' * 40)
-            print("SENDING NEW REQUEST:")
-
-        if not args.grpc and not args.fbs:
-            REST_request = gen_REST_request(batch, features=feature_names, tensor=args.tensor)
-            if args.prnt:
-                print(REST_request)
-
-            t1 = time()
-            response = requests.post(
-                REST_url,
-                data={"json": json.dumps(REST_request), "isDefault": True})
-            t2 = time()
-            jresp = response.json()
-
-            if args.prnt:
-                print("RECEIVED RESPONSE:")
-                print(jresp)
-                print()
-                print("Time " + str(t2 - t1))
-        elif args.grpc:
-            GRPC_request = gen_GRPC_request(batch, features=feature_names, tensor=args.tensor)
-            if args.prnt:
-                print(GRPC_request)
-
-            channel = grpc.insecure_channel('{}:{}'.format(args.host, args.port))
-            stub = prediction_pb2_grpc.ModelStub(channel)
-            response = stub.Predict(GRPC_request)
-
-            if args.prnt:
-                print("RECEIVED RESPONSE:")
-                print(response)
-                print()
+    features = compile_contract(read_contract(args.contract), 'features')
+    feature_names = features.names
+
+    def next_request(i):
+        batch = features.generate(args.batch_size, rng=request_rng(args, i))
+        if args.grpc:
+            return gen_GRPC_request(batch, features=feature_names, tensor=args.tensor)
         elif args.fbs:
-            import socket
-            import struct
-            from .tester_flatbuffers import NumpyArrayToSeldonRPC, SeldonRPCToNumpyArray
-            data = NumpyArrayToSeldonRPC(batch, feature_names)
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((args.host, args.port))
-            totalsent = 0
-            MSGLEN = len(data)
-            print("Will send", MSGLEN, "bytes")
-            while totalsent < MSGLEN:
-                sent = s.send(data[totalsent:])
-                if sent == 0:
-                    raise RuntimeError("socket connection broken")
-                totalsent = totalsent + sent
-            data = s.recv(4)
-            obj = struct.unpack('<i', data)
-            len_msg = obj[0]
-            data = s.recv(len_msg)
-            arr = SeldonRPCToNumpyArray(data)
-            print(arr)
+            return NumpyArrayToSeldonRPC(batch, feature_names)
+        else:
+            return gen_REST_request(batch, features=feature_names, tensor=args.tensor)
+
+    next_request, raw = get_request_source(args, next_request, "predict")
+    return run_load_test(args, get_client(args, "predict", "Predict", raw), next_request)
 
 
 def main():
@@ -279,13 +218,39 @@ def main():
     parser.add_argument("--fbs", action="store_true")
     parser.add_argument("-t", "--tensor", action="store_true")
     parser.add_argument("-p", "--prnt", action="store_true", help="Prints requests and responses")
+    parser.add_argument("-c", "--concurrency", type=int, default=1,
+                        help="Number of concurrent workers sending requests")
+    parser.add_argument("-r", "--rate", type=float,
+                        help="Target request rate (req/s) for an open-loop run. "
+                             "By default workers send requests back to back")
+    parser.add_argument("-i", "--interval", type=float,
+                        help="Print a latency report every INTERVAL seconds")
+    parser.add_argument("-o", "--output", type=str,
+                        help="Write the latency report to a .json or .csv file")
+    parser.add_argument("-k", "--corpus-size", type=int, default=0,
+                        help="Generate and serialize CORPUS_SIZE requests before the run and "
+                             "replay them in rotation")
+    parser.add_argument("--corpus", type=str,
+                        help="Replay the requests of a .corpus file saved with --save-corpus, "
+                             "or of a request log with one JSON message per line")
+    parser.add_argument("--save-corpus", type=str,
+                        help="Save the replayed corpus to a .corpus file")
+    parser.add_argument("--pipeline", type=int, default=1,
+                        help="With --fbs, number of workers sharing each connection, and so of "
+                             "requests in flight on it")
+    parser.add_argument("-s", "--seed", type=int,
+                        help="Seed the generated data so that runs send the same requests")
 
     args = parser.parse_args()
+    if args.fbs and args.endpoint != "predict":
+        parser.error("--fbs only supports the predict endpoint")
 
     if args.endpoint == "predict":
-        run_predict(args)
+        result = run_predict(args)
     elif args.endpoint == "send-feedback":
-        run_send_feedback(args)
+        result = run_send_feedback(args)
+    if result.errors:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -33,7 +33,8 @@ def NumpyArrayToSeldonRPC(arr, names):
 
     DefaultData.DefaultDataStart(builder)
     DefaultData.DefaultDataAddTensor(builder, tensor)
-    DefaultData.DefaultDataAddNames(builder, namesOffset)
+    if len(names) > 0:
+        DefaultData.DefaultDataAddNames(builder, namesOffset)
     defData = DefaultData.DefaultDataEnd(builder)
 
     Status.StatusStart(builder)
@@ -61,6 +62,10 @@ def NumpyArrayToSeldonRPC(arr, names):
 
 def SeldonRPCToNumpyArray(data):
     seldon_msg = SeldonMessage.SeldonMessage.GetRootAsSeldonMessage(data, 0)
+    status = seldon_msg.Status()
+    if status is not None and status.Status() == StatusValue.StatusValue.FAILURE:
+        raise FlatbuffersInvalidMessage(
+            "Request failed with code {}: {}".format(status.Code(), status.Info()))
     if seldon_msg.Protocol() == SeldonProtocolVersion.SeldonProtocolVersion.V1:
         if seldon_msg.DataType() == Data.Data.DefaultData:
             defData = DefaultData.DefaultData()
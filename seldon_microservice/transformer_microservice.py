@@ -1,14 +1,12 @@
-import grpc
-from concurrent import futures
-
-from flask import jsonify, Flask, send_from_directory
-from flask_cors import CORS
 import numpy as np
+import logging
+import os
 
-from .proto import prediction_pb2, prediction_pb2_grpc
 from .common import extract_message, sanity_check_request, rest_datadef_to_array, \
     array_to_rest_datadef, grpc_datadef_to_array, array_to_grpc_datadef, \
-    SeldonMicroserviceException
+    SeldonMicroserviceException, ANNOTATION_GRPC_MAX_MSG_SIZE
+
+logger = logging.getLogger(__name__)
 
 # ---------------------------
 # Interaction with user model
@@ -44,6 +42,8 @@ def get_class_names(user_model,original):
 # ----------------------------
 
 def get_rest_microservice(user_model,debug=False):
+    from flask import jsonify, Flask, send_from_directory
+    from flask_cors import CORS
 
     app = Flask(__name__,static_url_path='')
     CORS(app)
@@ -53,7 +53,7 @@ def get_rest_microservice(user_model,debug=False):
         response = jsonify(error.to_dict())
         print("ERROR:")
         print(error.to_dict())
-        response.status_code = 400
+        response.status_code = error.status_code
         return response
 
     @app.route("/seldon.json",methods=["GET"])
@@ -103,6 +103,9 @@ def get_rest_microservice(user_model,debug=False):
 class SeldonTransformerGRPC(object):
     def __init__(self,user_model):
         self.user_model = user_model
+        # imported once here rather than in every call
+        from .proto import prediction_pb2
+        self.prediction_pb2 = prediction_pb2
 
     def TransformInput(self,request,context):
         datadef = request.data
@@ -113,7 +116,7 @@ class SeldonTransformerGRPC(object):
         feature_names = get_feature_names(self.user_model, datadef.names)
 
         data = array_to_grpc_datadef(transformed, feature_names, request.data.WhichOneof("data_oneof"))
-        return prediction_pb2.SeldonMessage(data=data)
+        return self.prediction_pb2.SeldonMessage(data=data)
 
     def TransformOutput(self,request,context):
         datadef = request.data
@@ -124,9 +127,13 @@ class SeldonTransformerGRPC(object):
         class_names = get_class_names(self.user_model, datadef.names)
 
         data = array_to_grpc_datadef(transformed, class_names, request.data.WhichOneof("data_oneof"))
-        return prediction_pb2.SeldonMessage(data=data)
+        return self.prediction_pb2.SeldonMessage(data=data)
     
-def get_grpc_server(user_model,debug=False,annotations={}):
+def get_grpc_server(user_model,debug=False,annotations={},interceptors=(),max_workers=10,maximum_concurrent_rpcs=None):
+    import grpc
+    from concurrent import futures
+    from .proto import prediction_pb2_grpc
+
     seldon_model = SeldonTransformerGRPC(user_model)
     options = []
     if ANNOTATION_GRPC_MAX_MSG_SIZE in annotations:
@@ -134,7 +141,9 @@ def get_grpc_server(user_model,debug=False,annotations={}):
         logger.info("Setting grpc max message to %d",max_msg)
         options.append(('grpc.max_message_length', max_msg ))
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10),options=options)
-    prediction_pb2_grpc.add_ModelServicer_to_server(seldon_model, server)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),options=options,interceptors=interceptors,
+                         maximum_concurrent_rpcs=maximum_concurrent_rpcs)
+    prediction_pb2_grpc.add_TransformerServicer_to_server(seldon_model, server)
+    prediction_pb2_grpc.add_OutputTransformerServicer_to_server(seldon_model, server)
 
     return server
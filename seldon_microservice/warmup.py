@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Model warm-up and readiness reporting.
+
+Before a microservice takes traffic the user object can be exercised so that lazy
+initialisation (JIT/graph compilation, caches, ...) is not paid by the first real
+requests. The user class can provide its own warmup() method; otherwise batches
+generated from the contract.json of the model are sent through the user methods
+of the service type.
+"""
+from __future__ import absolute_import, division, print_function
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTRACT_FILE = "contract.json"
+
+WARMUP_METHODS = {
+    "MODEL": ("predict",),
+    "ROUTER": ("route",),
+    "TRANSFORMER": ("transform_input", "transform_output"),
+    "OUTLIER_DETECTOR": ("score",),
+    "PIPELINE": ("predict",),
+}
+
+
+def has_warmup_hook(user_object):
+    return callable(getattr(user_object, "warmup", None))
+
+
+def needs_warmup(user_object, n_requests):
+    return has_warmup_hook(user_object) or n_requests > 0
+
+
+def warmup(user_object, service_type, n_requests=1, batch_sizes=(1,),
+           contract_file=DEFAULT_CONTRACT_FILE):
+    """
+    Run the user warmup() hook if there is one, else call the user methods of
+    service_type n_requests times for each batch size with data from contract_file.
+    Returns the number of calls made to the user object.
+    """
+    t1 = time.time()
+    if has_warmup_hook(user_object):
+        user_object.warmup()
+        logger.info("User warmup hook ran in %.3fs", time.time() - t1)
+        return 1
+
+    methods = [getattr(user_object, name) for name in WARMUP_METHODS.get(service_type, ())
+               if callable(getattr(user_object, name, None))]
+    if not methods or n_requests <= 0:
+        return 0
+    if not os.path.isfile(contract_file):
+        logger.warning("No contract file %s, skipping warmup", contract_file)
+        return 0
+
+    from .contract import compile_contract
+    with open(contract_file, "r") as f:
+        contract = compile_contract(json.load(f), "features")
+    feature_names = contract.names
+    calls = 0
+    for batch_size in batch_sizes:
+        features = contract.generate(batch_size)
+        t2 = time.time()
+        for _ in range(n_requests):
+            for method in methods:
+                method(features, feature_names)
+                calls += 1
+        logger.info("Warmup with batch size %d: %d requests in %.3fs",
+                    batch_size, n_requests, time.time() - t2)
+    logger.info("Warmup done in %.3fs", time.time() - t1)
+    return calls
+
+
+def warmup_in_background(ready, *args, **kwargs):
+    """
+    Run warmup in a thread and set the ready event once it is done. A failing warmup
+    is logged and does not keep the microservice from becoming ready.
+    """
+    def run():
+        try:
+            warmup(*args, **kwargs)
+        except Exception:
+            logger.exception("Warmup failed")
+        ready.set()
+
+    thread = threading.Thread(target=run, name="warmup")
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def add_health_endpoints(app, ready):
+    """
+    Add /live and /ready to a REST microservice. /ready answers 503 until the ready
+    event is set so that no traffic is routed to a microservice that is still warming up.
+    """
+    from flask import jsonify
+
+    @app.route("/live", methods=["GET"])
+    def Live():
+        return jsonify({"status": "alive"})
+
+    @app.route("/ready", methods=["GET"])
+    def Ready():
+        if ready.is_set():
+            return jsonify({"status": "ready"})
+        response = jsonify({"status": "warming up"})
+        response.status_code = 503
+        return response
+
+    return app
@@ -25,6 +25,8 @@ setup(
             "seldon-microservice-python = seldon_microservice.microservice:main",
             "seldon-microservice-tester = seldon_microservice.tester:main",
             "seldon-microservice-api-tester = seldon_microservice.api_tester:main",
+            "seldon-microservice-benchmark = seldon_microservice.benchmark:main",
+            "seldon-microservice-codec-benchmark = seldon_microservice.codec_benchmark:main",
         ],
     },
     cmdclass={
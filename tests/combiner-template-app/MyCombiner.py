@@ -0,0 +1,23 @@
+
+class MyCombiner(object):
+    """
+    Combiner template.
+    """
+
+    def __init__(self):
+        """
+        Add any initialization parameters. These will be passed at runtime from the graph definition parameters defined in your seldondeployment kubernetes resource manifest.
+        """
+        print("Initializing")
+
+
+    def aggregate(self,features,features_names):
+        """
+        Aggregate the outputs of the children of the combiner.
+
+        Parameters
+        ----------
+        features : array-like, the data of each message stacked along the first axis
+        features_names : list of the feature names of each message (optional)
+        """
+        return features.mean(axis=0)
@@ -2,7 +2,8 @@
 class MyModel(object):
     """
     Model template. You can load your model parameters in __init__ from a location
-    accessible at runtime
+    accessible at runtime. Weights saved with seldon_microservice.artifacts.save_artifacts
+    can be loaded memory-mapped with load_artifacts, shared by all the worker processes.
     """
     
     def __init__(self):
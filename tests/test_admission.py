@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from seldon_microservice.admission import AdmissionController, MicroserviceOverloaded, TIMEOUT_HEADER, \
+    add_admission_control, get_grpc_interceptor, grpc_server_limits
+
+
+def hold(controller, n):
+    """Take n slots of controller, return the release function."""
+    admitted = [controller.acquire() for _ in range(n)]
+    return lambda: [controller.release(admitted_at) for admitted_at in admitted]
+
+
+def test_rejects_beyond_the_queue():
+    controller = AdmissionController(2, max_queue=0)
+    release = hold(controller, 2)
+    with pytest.raises(MicroserviceOverloaded) as e:
+        controller.acquire()
+    assert e.value.status_code == 503
+    assert e.value.to_dict()["status"]["reason"] == "MICROSERVICE_OVERLOADED"
+    release()
+    controller.release(controller.acquire())
+    assert controller.metrics()["rejected"] == 1 and controller.metrics()["admitted"] == 3
+
+
+def test_queued_request_gets_the_next_slot():
+    controller = AdmissionController(1, max_queue=1)
+    release = hold(controller, 1)
+    threading.Timer(0.05, release).start()
+    t1 = time.time()
+    with controller.admit(timeout=5):
+        assert time.time() - t1 >= 0.04
+        assert controller.metrics()["in_flight"] == 1
+
+
+def test_queue_wait_is_bounded():
+    controller = AdmissionController(1, max_queue=5, max_queue_time=0.05)
+    release = hold(controller, 1)
+    with pytest.raises(MicroserviceOverloaded):
+        controller.acquire()
+    assert controller.metrics()["queued"] == 0
+    release()
+
+
+def test_rejects_early_when_the_deadline_cannot_be_met():
+    controller = AdmissionController(1, max_queue=5)
+    controller.service_time = 1.0
+    release = hold(controller, 1)
+    t1 = time.time()
+    with pytest.raises(MicroserviceOverloaded):
+        controller.acquire(timeout=0.5)
+    assert time.time() - t1 < 0.1
+    release()
+
+
+class SlowModel(object):
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def predict(self, X, feature_names):
+        self.started.set()
+        self.release.wait(5)
+        return X
+
+
+def test_rest_overload_is_a_503():
+    pytest.importorskip("flask")
+    from seldon_microservice import model_microservice
+
+    model = SlowModel()
+    app = model_microservice.get_rest_microservice(model)
+    add_admission_control(app, AdmissionController(1, max_queue=0))
+    request = {"json": json.dumps({"data": {"ndarray": [[1.0]]}})}
+    first = threading.Thread(target=lambda: app.test_client().post("/predict", data=request))
+    first.start()
+    assert model.started.wait(5)
+    rv = app.test_client().post("/predict", data=request, headers={TIMEOUT_HEADER: "100"})
+    model.release.set()
+    first.join()
+    assert rv.status_code == 503
+    assert json.loads(rv.data.decode("utf-8"))["status"]["reason"] == "MICROSERVICE_OVERLOADED"
+    assert app.test_client().post("/predict", data=request).status_code == 200
+
+
+def test_grpc_overload_is_resource_exhausted():
+    grpc = pytest.importorskip("grpc")
+    from seldon_microservice import model_microservice
+    from seldon_microservice.benchmark import free_port
+    from seldon_microservice.common import array_to_grpc_datadef
+    from seldon_microservice.proto import prediction_pb2, prediction_pb2_grpc
+
+    model = SlowModel()
+    server = model_microservice.get_grpc_server(
+        model, interceptors=[get_grpc_interceptor(AdmissionController(1, max_queue=0))])
+    port = free_port()
+    server.add_insecure_port("127.0.0.1:{}".format(port))
+    server.start()
+    channel = grpc.insecure_channel("127.0.0.1:{}".format(port))
+    try:
+        stub = prediction_pb2_grpc.ModelStub(channel)
+        request = prediction_pb2.SeldonMessage(data=array_to_grpc_datadef(np.ones((1, 1)), [], "tensor"))
+        first = stub.Predict.future(request, timeout=10)
+        assert model.started.wait(5)
+        with pytest.raises(grpc.RpcError) as e:
+            stub.Predict(request, timeout=10)
+        assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        assert "MICROSERVICE_OVERLOADED" in e.value.details()
+        model.release.set()
+        assert first.result().data.tensor.values[0] == 1.0
+    finally:
+        model.release.set()
+        channel.close()
+        server.stop(0)
+
+
+def test_grpc_server_sized_for_the_queue():
+    grpc = pytest.importorskip("grpc")
+    from seldon_microservice import model_microservice
+    from seldon_microservice.benchmark import free_port
+    from seldon_microservice.common import array_to_grpc_datadef
+    from seldon_microservice.proto import prediction_pb2, prediction_pb2_grpc
+
+    model = SlowModel()
+    # more calls processed or queued than the 10 default workers
+    controller = AdmissionController(1, max_queue=11)
+    server = model_microservice.get_grpc_server(
+        model, interceptors=[get_grpc_interceptor(controller)], **grpc_server_limits(controller))
+    port = free_port()
+    server.add_insecure_port("127.0.0.1:{}".format(port))
+    server.start()
+    channel = grpc.insecure_channel("127.0.0.1:{}".format(port))
+    try:
+        stub = prediction_pb2_grpc.ModelStub(channel)
+        request = prediction_pb2.SeldonMessage(data=array_to_grpc_datadef(np.ones((1, 1)), [], "tensor"))
+        calls = [stub.Predict.future(request, timeout=10) for _ in range(12)]
+        assert model.started.wait(5)
+        deadline = time.time() + 5
+        while controller.metrics()["queued"] < 11 and time.time() < deadline:
+            time.sleep(0.01)
+        # every call is counted by the controller, none waits unseen in the executor
+        assert controller.metrics()["queued"] == 11
+        with pytest.raises(grpc.RpcError) as e:
+            stub.Predict(request, timeout=10)
+        assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        model.release.set()
+        assert all(call.result().data.tensor.values[0] == 1.0 for call in calls)
+    finally:
+        model.release.set()
+        channel.close()
+        server.stop(0)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import threading
+
+import pytest
+
+from seldon_microservice.api_tester import TokenCache, run_scenario
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+except ImportError:
+    ThreadingHTTPServer = None
+
+CONTRACT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model-template-app", "contract.json")
+
+
+def test_token_is_cached_until_it_nearly_expires():
+    now = [1000.0]
+    fetched = []
+
+    def fetch(url, key, secret):
+        fetched.append(now[0])
+        return "token{}".format(len(fetched)), 60
+
+    import seldon_microservice.api_tester as api_tester
+    tokens = TokenCache("http://gateway/oauth/token", "key", "secret", refresh_margin=10, fetch=fetch)
+    original_time = api_tester.time.time
+    api_tester.time.time = lambda: now[0]
+    try:
+        assert tokens.token() == "token1"
+        now[0] += 45
+        assert tokens.token() == "token1"
+        now[0] += 10
+        assert tokens.token() == "token2"
+        tokens.invalidate("token1")
+        assert tokens.token() == "token2"
+        tokens.invalidate("token2")
+        assert tokens.rest_headers() == {"Authorization": "Bearer token3"}
+    finally:
+        api_tester.time.time = original_time
+    assert tokens.fetches == 3
+
+
+def test_late_rejection_of_an_old_token_keeps_the_new_one():
+    fetched = []
+
+    def fetch(url, key, secret):
+        fetched.append(1)
+        return "token{}".format(len(fetched)), None
+
+    tokens = TokenCache("http://gateway/oauth/token", "key", "secret", fetch=fetch)
+    used = {}
+    sent, refreshed = threading.Event(), threading.Event()
+
+    def send_with_old_token():
+        used["old"] = tokens.token()
+        sent.set()
+        # the other worker gets its 401 and refreshes before this one's arrives
+        refreshed.wait()
+        tokens.invalidate(tokens.last_token())
+
+    worker = threading.Thread(target=send_with_old_token)
+    worker.start()
+    sent.wait()
+    tokens.invalidate(tokens.token())
+    assert tokens.token() == "token2"
+    refreshed.set()
+    worker.join()
+    assert used["old"] == "token1"
+    assert tokens.token() == "token2"
+    assert tokens.fetches == 2
+
+
+class Gateway(BaseHTTPRequestHandler if ThreadingHTTPServer else object):
+    requests = []
+    tokens = 0
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, code, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/oauth/token":
+            Gateway.tokens += 1
+            return self.reply(200, {"access_token": "secret-token", "expires_in": 3600})
+        if self.headers.get("Authorization") != "Bearer secret-token":
+            return self.reply(401, {})
+        message = json.loads(body.decode("utf-8"))
+        Gateway.requests.append((self.path, message))
+        self.reply(200, message if self.path.endswith("predictions") else {})
+
+
+@pytest.mark.skipif(ThreadingHTTPServer is None, reason="needs python 3.7")
+def test_scenario_mixes_endpoints_through_the_gateway(tmpdir):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Gateway)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        args = argparse.Namespace(
+            contract=CONTRACT, host="127.0.0.1", port=server.server_address[1], endpoint="predict",
+            mix={"predict": 3, "send-feedback": 1}, n_requests=40, concurrency=4, rate=None,
+            batch_size=2, tensor=True, grpc=False, prnt=False, interval=None,
+            output=str(tmpdir.join("report.json")), seed=3, oauth_port=None, oauth_key="key",
+            oauth_secret="secret", ambassador_path=None)
+        result = run_scenario(args)
+    finally:
+        server.shutdown()
+    assert result.errors == 0
+    assert Gateway.tokens == 1
+    counts = dict((label, result.label_summary(label)["requests"]) for label in result.labels)
+    assert sum(counts.values()) == 40
+    assert 20 <= counts["predict"] < 40
+    assert sum(1 for path, _ in Gateway.requests if path == "/api/v0.1/feedback") == counts["send-feedback"]
+    with open(args.output) as f:
+        assert set(json.load(f)["labels"]) == {"predict", "send-feedback"}
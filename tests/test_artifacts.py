@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import pickle
+
+import numpy as np
+import pytest
+
+from seldon_microservice.artifacts import save_artifacts, load_artifacts, load_artifact, read_manifest
+
+
+def test_artifacts_are_memory_mapped_read_only(tmpdir):
+    path = str(tmpdir.join("model"))
+    weights = np.arange(12, dtype=np.float32).reshape(3, 4)
+    save_artifacts(path, weights=weights, bias=np.ones(4))
+    assert read_manifest(path)["weights"] == {"shape": [3, 4], "dtype": "<f4"}
+
+    artifacts = load_artifacts(path)
+    assert sorted(artifacts) == ["bias", "weights"]
+    assert isinstance(artifacts["weights"], np.memmap)
+    np.testing.assert_array_equal(artifacts["weights"], weights)
+    with pytest.raises(ValueError):
+        artifacts["weights"][0, 0] = 1.0
+    assert not isinstance(load_artifact(path, "bias", mmap=False), np.memmap)
+
+
+def test_artifacts_are_added_and_replaced(tmpdir):
+    path = str(tmpdir)
+    save_artifacts(path, weights=np.zeros(3))
+    save_artifacts(path, weights=np.ones((2, 2)), classes=np.array(["a", "b"]))
+    artifacts = load_artifacts(path)
+    assert artifacts["weights"].shape == (2, 2)
+    assert artifacts["classes"].tolist() == ["a", "b"]
+    assert [f.basename for f in tmpdir.listdir() if f.basename.startswith(".tmp")] == []
+
+
+def test_scalar_and_empty_artifacts(tmpdir):
+    path = str(tmpdir)
+    save_artifacts(path, bias=np.float64(3.0), empty=np.zeros((0, 4), dtype=np.float32))
+    artifacts = load_artifacts(path)
+    assert artifacts["bias"].shape == ()
+    assert artifacts["bias"] == 3.0
+    assert artifacts["empty"].shape == (0, 4)
+    assert artifacts["empty"].dtype == np.float32
+    with pytest.raises(ValueError):
+        artifacts["bias"][...] = 1.0
+
+
+def test_object_arrays_are_rejected(tmpdir):
+    with pytest.raises(ValueError):
+        save_artifacts(str(tmpdir), names=np.array([{"a": 1}], dtype=object))
+
+
+def test_manifest_mismatch(tmpdir):
+    path = str(tmpdir)
+    save_artifacts(path, weights=np.zeros(3))
+    np.save(str(tmpdir.join("weights.npy")), np.zeros(4))
+    with pytest.raises(ValueError):
+        load_artifacts(path)
+
+
+def test_memory_maps_survive_pickle(tmpdir):
+    path = str(tmpdir)
+    save_artifacts(path, weights=np.arange(5.))
+    weights = pickle.loads(pickle.dumps(load_artifacts(path)["weights"]))
+    np.testing.assert_array_equal(weights, np.arange(5.))
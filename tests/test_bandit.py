@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from seldon_microservice import persistence
+from seldon_microservice.bandit import BanditCounters, EpsilonGreedyRouter, ThompsonSamplingRouter
+
+
+def test_concurrent_updates_are_not_lost():
+    counters = BanditCounters(3)
+
+    def update(arm):
+        for _ in range(10000):
+            counters.update(arm, 0.5)
+
+    threads = [threading.Thread(target=update, args=(i % 3,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pulls, rewards = counters.totals()
+    np.testing.assert_array_equal(pulls, [20000, 20000, 20000])
+    np.testing.assert_allclose(rewards, [10000, 10000, 10000])
+
+
+def test_shards_of_finished_threads_are_folded():
+    counters = BanditCounters(2)
+    # one short-lived thread per update, as Flask runs one thread per request
+    for i in range(500):
+        thread = threading.Thread(target=counters.update, args=(i % 2, 1.0))
+        thread.start()
+        thread.join()
+    assert len(counters._shards) <= 2
+    pulls, rewards = counters.totals()
+    np.testing.assert_array_equal(pulls, [250, 250])
+    np.testing.assert_allclose(rewards, [250, 250])
+
+
+def test_update_many():
+    counters = BanditCounters(3)
+    counters.update(0, 1.0)
+    counters.update_many([0, 2, 2], [1.0, 0.5, 0.0])
+    pulls, rewards = counters.totals()
+    np.testing.assert_array_equal(pulls, [2, 0, 2])
+    np.testing.assert_allclose(rewards, [2.0, 0.0, 0.5])
+
+
+@pytest.mark.parametrize("router_class", [EpsilonGreedyRouter, ThompsonSamplingRouter])
+def test_router_learns_the_best_branch(router_class):
+    router = router_class(3, seed=1)
+    success = [0.1, 0.8, 0.3]
+    rng = np.random.RandomState(0)
+    for _ in range(500):
+        branch = router.route(None, None)
+        router.send_feedback(None, None, branch, float(rng.uniform() < success[branch]), None)
+    assert np.bincount(router.select(1000), minlength=3).argmax() == 1
+
+
+def test_epsilon_greedy_tries_every_branch_first():
+    router = EpsilonGreedyRouter(3, epsilon=0.0, seed=0)
+    router.send_feedback(None, None, 0, 1.0, None)
+    router.send_feedback(None, None, 1, 0.0, None)
+    assert router.route(None, None) == 2
+
+
+def test_feedback_batch_and_missing_routing():
+    router = ThompsonSamplingRouter(2, seed=0)
+    router.send_feedback_batch([(None, None, 1, 1.0, None), (None, None, None, 1.0, None),
+                                (None, None, 0, 0.0, None)])
+    pulls, rewards = router.counters.totals()
+    np.testing.assert_array_equal(pulls, [1, 1])
+    np.testing.assert_allclose(rewards, [0.0, 1.0])
+
+
+def test_router_state_is_persisted(tmpdir):
+    backend = persistence.FileBackend(str(tmpdir))
+    router = EpsilonGreedyRouter(2, seed=0)
+    thread = persistence.PersistenceThread(router, 1, compaction_frequency=5, backend=backend)
+    router.send_feedback(None, None, 1, 1.0, None)
+    thread.push_snapshot()
+    router.send_feedback(None, None, 0, 0.5, None)
+    thread.push()
+    assert router.get_state_delta() is None
+    assert len(backend.load_deltas()) == 1
+
+    restored = persistence.restore(EpsilonGreedyRouter, {"n_branches": 2}, backend=backend)
+    pulls, rewards = restored.counters.totals()
+    np.testing.assert_array_equal(pulls, [1, 1])
+    np.testing.assert_allclose(rewards, [0.5, 1.0])
+    restored.send_feedback(None, None, 1, 1.0, None)
+    assert restored.counters.totals()[0].tolist() == [1, 2]
+
+
+def test_pickle_merges_the_shards():
+    router = ThompsonSamplingRouter(2, seed=0)
+    thread = threading.Thread(target=router.send_feedback, args=(None, None, 0, 1.0, None))
+    thread.start()
+    thread.join()
+    router.send_feedback(None, None, 0, 1.0, None)
+    copy = pickle.loads(pickle.dumps(router))
+    assert copy.counters.totals()[0].tolist() == [2, 0]
+    assert copy.route(None, None) in (0, 1)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import pytest
+
+from seldon_microservice.benchmark import parse_shapes, requests_for_shape, compare_results, \
+    format_report, run_benchmark
+
+APPS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_result(transport="REST", throughput=100.0, p99=10.0, cpu=1.0, errors=0):
+    return {
+        "service_type": "MODEL", "transport": transport, "rows": 1, "cols": 10,
+        "throughput_rps": throughput, "errors": errors,
+        "latency_ms": {"p50": p99 / 2, "p99": p99}, "server_cpu_ms_per_request": cpu,
+    }
+
+
+def test_parse_shapes():
+    assert parse_shapes("1x10,1000X10000") == [(1, 10), (1000, 10000)]
+
+
+def test_large_payloads_get_fewer_requests():
+    assert requests_for_shape(1, 10, 1000, 10 ** 6) == 1000
+    assert requests_for_shape(1000, 10000, 1000, 10 ** 8) == 10
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = [make_result(), make_result("GRPC")]
+    assert compare_results(baseline, [make_result(throughput=95.0, p99=10.5)]) == []
+    regressions = compare_results(baseline, [make_result(throughput=80.0),
+                                             make_result("GRPC", p99=20.0, cpu=2.0, errors=3),
+                                             make_result("FBS", throughput=1.0)])
+    assert len(regressions) == 4
+    assert regressions[0].startswith("MODEL REST 1x10: throughput -20.0%")
+
+
+def test_report_lists_every_case():
+    report = format_report([make_result("FBS"), make_result("REST")]).splitlines()
+    assert len(report) == 3
+    assert report[1].split()[1] == "REST"
+
+
+def test_benchmark_runs_template_model():
+    results = run_benchmark(APPS_DIR, ["MODEL"], ["REST"], [(2, 3)], n_requests=20)
+    assert len(results) == 1
+    result = results[0]
+    assert result["errors"] == 0
+    assert result["requests"] == 20
+    assert result["throughput_rps"] > 0
+    assert "p99" in result["latency_ms"]
+
+
+def test_benchmark_sends_large_grpc_payloads():
+    # 600x1000 doubles are above the 4MB default limit of gRPC
+    results = run_benchmark(APPS_DIR, ["MODEL"], ["GRPC"], [(600, 1000)], n_requests=2, corpus_size=1,
+                            tensor=True)
+    assert results[0]["request_bytes"] > 4 * 1024 * 1024
+    assert results[0]["errors"] == 0
+
+
+@pytest.mark.parametrize("service_type", ["COMBINER", "OUTLIER_DETECTOR"])
+@pytest.mark.parametrize("transport", ["REST", "GRPC"])
+def test_benchmark_runs_combiner_and_outlier_detector(service_type, transport):
+    results = run_benchmark(APPS_DIR, [service_type], [transport], [(2, 3)], n_requests=10)
+    assert results[0]["errors"] == 0
+    assert results[0]["requests"] == 10
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from seldon_microservice import model_microservice
+from seldon_microservice.cancellation import CancellationToken, RequestCancelled, cancellation_scope, \
+    current_token, check_cancelled, grpc_token
+from seldon_microservice.pipeline import Pipeline
+
+
+class CountingModel(object):
+
+    def __init__(self, cancel_after=None):
+        self.calls = 0
+        self.cancel_after = cancel_after
+
+    def predict(self, X, feature_names):
+        self.calls += 1
+        for i in range(10):
+            if i == self.cancel_after:
+                current_token().deadline = time.time()
+            current_token().check()
+        return X
+
+
+class FakeContext(object):
+
+    def __init__(self, remaining=None, active=True):
+        self.remaining = remaining
+        self.active = active
+        self.aborted = None
+
+    def time_remaining(self):
+        return self.remaining
+
+    def is_active(self):
+        return self.active
+
+    def abort(self, code, details):
+        self.aborted = (code, details)
+        raise Exception("aborted")
+
+
+def test_token():
+    assert not CancellationToken().cancelled
+    token = CancellationToken.from_timeout(10)
+    assert 9 < token.time_remaining() <= 10 and not token.cancelled
+    with pytest.raises(RequestCancelled) as e:
+        CancellationToken.from_timeout(0).check()
+    assert e.value.grpc_code == "DEADLINE_EXCEEDED" and e.value.status_code == 504
+    with pytest.raises(RequestCancelled) as e:
+        CancellationToken(is_active=lambda: False).check()
+    assert e.value.grpc_code == "CANCELLED"
+
+
+def test_scope_sets_the_current_token():
+    token = CancellationToken.from_timeout(0)
+    with cancellation_scope(token):
+        assert current_token() is token
+        with pytest.raises(RequestCancelled):
+            check_cancelled()
+    check_cancelled()
+
+
+def grpc_request():
+    pytest.importorskip("grpc")
+    from seldon_microservice.common import array_to_grpc_datadef
+    from seldon_microservice.proto import prediction_pb2
+    return prediction_pb2.SeldonMessage(data=array_to_grpc_datadef(np.ones((1, 2)), [], "tensor"))
+
+
+@pytest.mark.parametrize("context,code", [(FakeContext(remaining=0), "DEADLINE_EXCEEDED"),
+                                          (FakeContext(remaining=5, active=False), "CANCELLED")])
+def test_grpc_skips_expired_calls(context, code):
+    request = grpc_request()
+    import grpc
+    model = CountingModel()
+    with pytest.raises(Exception, match="aborted"):
+        model_microservice.SeldonModelGRPC(model).Predict(request, context)
+    assert model.calls == 0
+    assert context.aborted[0] == getattr(grpc.StatusCode, code)
+
+
+def test_grpc_user_code_can_stop_early():
+    request = grpc_request()
+    model = CountingModel(cancel_after=3)
+    context = FakeContext(remaining=5)
+    with pytest.raises(Exception, match="aborted"):
+        model_microservice.SeldonModelGRPC(model).Predict(request, context)
+    assert model.calls == 1
+    assert grpc_token(None).time_remaining() is None
+    response = model_microservice.SeldonModelGRPC(CountingModel()).Predict(request, FakeContext(remaining=5))
+    assert list(response.data.tensor.values) == [1.0, 1.0]
+
+
+def test_rest_timeout_header():
+    pytest.importorskip("flask")
+    model = CountingModel()
+    client = model_microservice.get_rest_microservice(model).test_client()
+    data = {"json": json.dumps({"data": {"ndarray": [[1.0]]}})}
+    rv = client.post("/predict", data=data, headers={"Seldon-Timeout-Ms": "0"})
+    assert rv.status_code == 504
+    assert json.loads(rv.data.decode("utf-8"))["status"]["reason"] == "MICROSERVICE_DEADLINE_EXCEEDED"
+    assert model.calls == 0
+    assert client.post("/predict", data=data, headers={"Seldon-Timeout-Ms": "5000"}).status_code == 200
+    assert model.calls == 1
+
+
+class QueuedModel(object):
+    """Holds its first call until release is set, records the deadline of the others."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.deadlines = []
+
+    def predict(self, X, feature_names):
+        if not self.started.is_set():
+            self.started.set()
+            self.release.wait(5)
+        else:
+            self.deadlines.append(current_token().deadline)
+        return X
+
+
+def test_rest_deadline_counts_the_admission_wait():
+    pytest.importorskip("flask")
+    from seldon_microservice.admission import AdmissionController, add_admission_control
+    model = QueuedModel()
+    app = model_microservice.get_rest_microservice(model)
+    add_admission_control(app, AdmissionController(1, max_queue=1))
+    data = {"json": json.dumps({"data": {"ndarray": [[1.0]]}})}
+    first = threading.Thread(target=lambda: app.test_client().post("/predict", data=data))
+    first.start()
+    assert model.started.wait(5)
+    threading.Timer(0.3, model.release.set).start()
+    sent = time.time()
+    rv = app.test_client().post("/predict", data=data, headers={"Seldon-Timeout-Ms": "5000"})
+    first.join()
+    assert rv.status_code == 200
+    # the 0.3s spent waiting for a slot are taken from the timeout
+    assert sent + 5.0 <= model.deadlines[0] < sent + 5.2
+
+
+def test_pipeline_stops_between_steps():
+    first, second = CountingModel(cancel_after=11), CountingModel()
+
+    class Expire(object):
+        def transform_input(self, X, feature_names):
+            current_token().deadline = time.time()
+            return X
+
+    with cancellation_scope(CancellationToken.from_timeout(5)):
+        with pytest.raises(RequestCancelled):
+            Pipeline([first, Expire(), second]).predict(np.ones((1, 1)), [])
+    assert (first.calls, second.calls) == (1, 0)
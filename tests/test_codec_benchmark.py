@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import pytest
+
+from seldon_microservice.codec_benchmark import iter_cases, run_codec_benchmark, measure_memory, \
+    compare_results, baseline_path, save_baseline, load_baseline, parse_shapes, CODECS, \
+    DEFAULT_SHAPES, DEFAULT_DTYPES
+
+REFERENCE = baseline_path("reference", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                    "benchmarks"))
+
+pytest.importorskip("google.protobuf")
+
+
+def test_runs_every_converter_variant():
+    cases = list(iter_cases(["rest_datadef_to_array", "array_to_grpc_datadef"], [(2, 3)], ["float64", "int64"]))
+    assert [name for name, _ in cases][:2] == [
+        "rest_datadef_to_array[tensor-2x3-float64]", "rest_datadef_to_array[tensor-2x3-int64]"]
+    assert len(cases) == 8
+    results = run_codec_benchmark(cases, min_time=0.001, repeat=2)
+    for result in results:
+        assert 0 < result["min"] <= result["median"] <= result["max"]
+        assert result["calls"] >= 2
+        assert result["peak_bytes"] > 0
+
+
+def test_memory_is_measured_per_call():
+    assert measure_memory(lambda: bytearray(10 ** 6))["peak_bytes"] >= 10 ** 6
+    kept = []
+    assert measure_memory(lambda: kept.append(bytearray(10 ** 5)))["retained_bytes"] >= 10 ** 5
+
+
+def test_baselines_round_trip_and_compare(tmpdir):
+    baseline = [{"name": "a", "median": 1e-5, "peak_bytes": 1000},
+                {"name": "b", "median": 1e-5, "peak_bytes": 1000}]
+    filename = baseline_path("before", str(tmpdir.join("benchmarks")))
+    save_baseline(filename, baseline)
+    stored = load_baseline(filename)["results"]
+    changes = compare_results(stored, [{"name": "a", "median": 1.1e-5, "peak_bytes": 2000},
+                                       {"name": "b", "median": 0.5e-5, "peak_bytes": 1000},
+                                       {"name": "c", "median": 1.0, "peak_bytes": 1}])
+    assert [(name, metric) for name, metric, _, _, _ in changes] == [("a", "peak_bytes"), ("b", "median")]
+    assert changes[1][4] == pytest.approx(-0.5)
+
+
+def test_reference_baseline_covers_the_default_cases():
+    reference = load_baseline(REFERENCE)["results"]
+    cases = iter_cases(sorted(CODECS), parse_shapes(DEFAULT_SHAPES), DEFAULT_DTYPES.split(","))
+    assert sorted(result["name"] for result in reference) == sorted(name for name, _ in cases)
+    for result in reference:
+        assert result["median"] > 0 and result["peak_bytes"] > 0
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import numpy as np
+import pytest
+
+from seldon_microservice import combiner_microservice
+from seldon_microservice.common import SeldonMicroserviceException, rest_datadef_list_to_array
+
+
+class MeanCombiner(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def aggregate(self, Xs, features_names):
+        self.calls.append((Xs.shape, features_names))
+        return Xs.mean(axis=0)
+
+
+def tensor(array):
+    return {"names": ["a", "b"], "tensor": {"shape": list(array.shape), "values": array.ravel().tolist()}}
+
+
+def test_rest_list_is_stacked():
+    stacked = rest_datadef_list_to_array([tensor(np.ones((2, 2))), tensor(np.zeros((2, 2)))])
+    assert stacked.shape == (2, 2, 2)
+    stacked = rest_datadef_list_to_array([{"ndarray": [[1, 2]]}, {"ndarray": [[3, 4]]}])
+    np.testing.assert_array_equal(stacked, [[[1, 2]], [[3, 4]]])
+    with pytest.raises(SeldonMicroserviceException):
+        rest_datadef_list_to_array([{"ndarray": [[1, 2]]}, {"ndarray": [[3, 4], [5, 6]]}])
+
+
+@pytest.mark.parametrize("encoding", ["tensor", "ndarray"])
+def test_rest_aggregate(encoding):
+    pytest.importorskip("flask")
+    combiner = MeanCombiner()
+    client = combiner_microservice.get_rest_microservice(combiner).test_client()
+    outputs = [np.array([[0.2, 0.8], [0.5, 0.5]]), np.array([[0.4, 0.6], [0.1, 0.9]])]
+    if encoding == "tensor":
+        messages = [{"data": tensor(output)} for output in outputs]
+    else:
+        messages = [{"data": {"names": ["a", "b"], "ndarray": output.tolist()}} for output in outputs]
+    rv = client.post("/aggregate", data={"json": json.dumps({"seldonMessages": messages})})
+    assert rv.status_code == 200
+    data = json.loads(rv.data.decode("utf-8"))["data"]
+    assert data["names"] == ["a", "b"]
+    result = data["ndarray"] if encoding == "ndarray" else \
+        np.reshape(data["tensor"]["values"], data["tensor"]["shape"])
+    np.testing.assert_allclose(result, [[0.3, 0.7], [0.3, 0.7]])
+    assert combiner.calls == [((2, 2, 2), [["a", "b"], ["a", "b"]])]
+
+
+def test_rest_aggregate_rejects_empty_list():
+    pytest.importorskip("flask")
+    client = combiner_microservice.get_rest_microservice(MeanCombiner()).test_client()
+    rv = client.post("/aggregate", data={"json": json.dumps({"seldonMessages": []})})
+    assert rv.status_code == 400
+
+
+def test_grpc_aggregate():
+    pytest.importorskip("grpc")
+    from seldon_microservice.common import array_to_grpc_datadef, grpc_datadef_to_array
+    from seldon_microservice.proto import prediction_pb2
+
+    outputs = [np.arange(6.).reshape(3, 2), np.arange(6., 12.).reshape(3, 2)]
+    request = prediction_pb2.SeldonMessageList(seldonMessages=[
+        prediction_pb2.SeldonMessage(data=array_to_grpc_datadef(output, ["a", "b"], "tensor"))
+        for output in outputs])
+    combiner = MeanCombiner()
+    response = combiner_microservice.SeldonCombinerGRPC(combiner).Aggregate(request, None)
+    np.testing.assert_array_equal(grpc_datadef_to_array(response.data), np.mean(outputs, axis=0))
+    assert list(response.data.names) == ["a", "b"]
+    assert combiner.calls[0][0] == (2, 3, 2)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from seldon_microservice.contract import compile_contract, unfold_contract, make_rng
+
+CONTRACT = {
+    "features": [
+        {"name": "a", "ftype": "continuous", "dtype": "FLOAT", "range": [0, 1]},
+        {"name": "pixel", "ftype": "continuous", "dtype": "INT", "range": [0, 255], "repeat": 4},
+        {"name": "b", "ftype": "continuous", "dtype": "FLOAT", "range": [0, 1]},
+        {"name": "c", "ftype": "categorical", "values": [1, 2, 3]},
+    ],
+    "targets": [
+        {"name": "proba", "ftype": "continuous", "dtype": "FLOAT", "range": [0, 1], "repeat": 2},
+    ],
+}
+
+
+def test_compiled_contract_groups_features():
+    features = compile_contract(CONTRACT, "features")
+    assert features.names == [f["name"] for f in unfold_contract(CONTRACT)["features"]]
+    assert len(features.groups) == 3
+    batch = features.generate(100)
+    assert batch.shape == (100, 7)
+    assert batch.dtype == np.float64
+    assert np.all((batch[:, [0, 5]] >= 0) & (batch[:, [0, 5]] <= 1))
+    pixels = batch[:, 1:5]
+    assert np.all(pixels == np.floor(pixels)) and pixels.min() >= 0 and pixels.max() <= 255
+    assert set(np.unique(batch[:, 6])) <= {1, 2, 3}
+
+    targets = compile_contract(CONTRACT, "targets")
+    assert targets.names == ["proba:0", "proba:1"]
+
+
+def test_unfolded_contract_compiles_to_the_same_layout():
+    folded = compile_contract(CONTRACT, "features", seed=1).generate(5)
+    unfolded = compile_contract(unfold_contract(CONTRACT), "features", seed=1).generate(5)
+    np.testing.assert_array_equal(folded, unfolded)
+
+
+def test_seeded_generation_is_reproducible():
+    features = compile_contract(CONTRACT, "features")
+    first = features.generate(3, rng=make_rng([7, 0]))
+    second = features.generate(3, rng=make_rng([7, 0]))
+    np.testing.assert_array_equal(first, second)
+    out = np.empty((3, 7))
+    assert features.generate(3, out=out, rng=make_rng([7, 1])) is out
+    assert not np.array_equal(out, first)
+
+
+def test_mixed_string_and_continuous_features_give_objects():
+    contract = {"features": [
+        {"name": "x", "ftype": "continuous", "dtype": "FLOAT"},
+        {"name": "colour", "ftype": "categorical", "values": ["red", "blue"]},
+    ]}
+    batch = compile_contract(contract).generate(4)
+    assert batch.dtype == object
+    assert set(batch[:, 1]) <= {"red", "blue"}
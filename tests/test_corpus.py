@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import pytest
+
+from seldon_microservice.corpus import RequestCorpus
+
+
+def make_request(i):
+    return {"data": {"names": ["a"], "ndarray": [[float(i)]]}}
+
+
+def test_generate_and_rotate():
+    corpus = RequestCorpus.generate(make_request, 3, "rest")
+    assert len(corpus) == 3
+    assert json.loads(corpus[1].decode("utf-8")) == make_request(1)
+    assert corpus[4] == corpus[1]
+
+
+def test_save_and_memory_map(tmpdir):
+    filename = str(tmpdir.join("requests.corpus"))
+    RequestCorpus.generate(make_request, 5, "rest").save(filename)
+    corpus = RequestCorpus.load(filename)
+    assert corpus.format == "rest"
+    assert [json.loads(corpus[i].decode("utf-8")) for i in range(5)] == \
+        [make_request(i) for i in range(5)]
+
+
+def test_corpus_from_request_log(tmpdir):
+    pytest.importorskip("google.protobuf")
+    from seldon_microservice.proto import prediction_pb2
+
+    log = tmpdir.join("requests.jsonl")
+    log.write("\n".join(json.dumps(make_request(i)) for i in range(3)) + "\n")
+    corpus = RequestCorpus.from_log(str(log), "grpc")
+    message = prediction_pb2.SeldonMessage.FromString(corpus[2])
+    assert message.data.names == ["a"]
+    assert message.data.ndarray.values[0].list_value.values[0].number_value == 2.0
+
+
+def test_rejects_unknown_files(tmpdir):
+    filename = tmpdir.join("bad.corpus")
+    filename.write("not a corpus")
+    with pytest.raises(ValueError):
+        RequestCorpus.load(str(filename))
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("flatbuffers")
+pytest.importorskip("tornado")
+
+from seldon_microservice import seldon_flatbuffers  # noqa: E402
+from seldon_microservice.loadgen import FBSClient, recv_frame, run_load  # noqa: E402
+from seldon_microservice.tester_flatbuffers import NumpyArrayToSeldonRPC  # noqa: E402
+
+
+class DoublingServer(object):
+    """
+    Answers each size-prefixed request of a connection in order, with the features
+    doubled, writing replies a few bytes at a time so that clients see partial reads.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.connections = 0
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+        thread = threading.Thread(target=self.accept)
+        thread.daemon = True
+        thread.start()
+
+    def accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except socket.error:
+                return
+            self.connections += 1
+            thread = threading.Thread(target=self.serve, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def serve(self, sock):
+        try:
+            while True:
+                features, names = seldon_flatbuffers.SeldonRPCToNumpyArray(recv_frame(sock))
+                time.sleep(self.delay)
+                reply = bytes(seldon_flatbuffers.NumpyArrayToSeldonRPC(features * 2, names))
+                for i in range(0, len(reply), 7):
+                    sock.sendall(reply[i:i + 7])
+        except (IOError, socket.error):
+            sock.close()
+
+    def close(self):
+        self.listener.close()
+
+
+@pytest.fixture
+def server():
+    server = DoublingServer()
+    yield server
+    server.close()
+
+
+def make_request(i):
+    return bytes(NumpyArrayToSeldonRPC(np.array([[float(i), 1.0]]), []))
+
+
+def test_reuses_connection_and_reads_whole_frames(server):
+    client = FBSClient("127.0.0.1", server.port)
+    for i in range(5):
+        features, _ = client(make_request(i))
+        np.testing.assert_array_equal(features, [[2.0 * i, 2.0]])
+    assert server.connections == 1
+    client.close()
+
+
+def test_pipelined_replies_go_to_their_request(server):
+    server.delay = 0.002
+    client = FBSClient("127.0.0.1", server.port, pipeline=4)
+    replies = {}
+
+    def on_response(i, request, response):
+        replies[i] = response[0][0, 0]
+
+    result = run_load(client, make_request, 40, concurrency=8, on_response=on_response)
+    client.close()
+    assert result.errors == 0
+    assert replies == dict((i, 2.0 * i) for i in range(40))
+    assert server.connections == 2
+
+
+def test_reconnects_after_a_failure(server):
+    client = FBSClient("127.0.0.1", server.port)
+    client(make_request(1))
+    client.connection().close()
+    features, _ = client(make_request(2))
+    assert features[0, 0] == 4.0
+    assert server.connections == 2
+    client.close()
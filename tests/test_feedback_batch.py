@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+
+from seldon_microservice import model_microservice, router_microservice  # noqa: E402
+
+
+def make_feedback(i, routing=None):
+    feedback = {
+        "request": {"data": {"names": ["a", "b"], "ndarray": [[float(i), 1.0]]}},
+        "response": {"meta": {}, "data": {"ndarray": [[0.5]]}},
+        "reward": float(i),
+        "truth": {"ndarray": [[1.0]]},
+    }
+    if routing is not None:
+        feedback["response"]["meta"]["routing"] = {"router": routing}
+    return feedback
+
+
+class LoopModel(object):
+
+    def __init__(self):
+        self.feedbacks = []
+
+    def send_feedback(self, features, feature_names, reward, truth):
+        self.feedbacks.append((features.tolist(), feature_names, reward, truth.tolist()))
+
+
+class BatchModel(LoopModel):
+
+    def __init__(self):
+        super(BatchModel, self).__init__()
+        self.batches = 0
+
+    def send_feedback_batch(self, feedbacks):
+        self.batches += 1
+        for feedback in feedbacks:
+            self.send_feedback(*feedback)
+
+
+@pytest.mark.parametrize("model_class", [LoopModel, BatchModel])
+def test_model_rest_feedback_batch(model_class):
+    model = model_class()
+    client = model_microservice.get_rest_microservice(model).test_client()
+    response = client.post("/send-feedback-batch",
+                           data={"json": json.dumps([make_feedback(i) for i in range(3)])})
+    assert response.status_code == 200
+    assert model.feedbacks == [([[float(i), 1.0]], ["a", "b"], float(i), [[1.0]]) for i in range(3)]
+    if model_class is BatchModel:
+        assert model.batches == 1
+
+
+def test_feedback_batch_must_be_a_list():
+    client = model_microservice.get_rest_microservice(LoopModel()).test_client()
+    response = client.post("/send-feedback-batch", data={"json": json.dumps(make_feedback(0))})
+    assert response.status_code == 400
+    response = client.post("/send-feedback-batch",
+                           data={"json": json.dumps({"feedbacks": [make_feedback(0)]})})
+    assert response.status_code == 200
+
+
+def test_router_rest_feedback_batch(monkeypatch):
+    monkeypatch.setattr(router_microservice, "PRED_UNIT_ID", "router")
+    received = []
+
+    class Router(object):
+        def send_feedback(self, features, feature_names, routing, reward, truth):
+            received.append((routing, reward))
+
+    client = router_microservice.get_rest_microservice(Router()).test_client()
+    response = client.post("/send-feedback-batch",
+                           data={"json": json.dumps([make_feedback(i, routing=i % 2) for i in range(4)])})
+    assert response.status_code == 200
+    assert received == [(0, 0.0), (1, 1.0), (0, 2.0), (1, 3.0)]
+
+
+def test_grpc_feedback_batch(monkeypatch):
+    pytest.importorskip("google.protobuf")
+    from google.protobuf import json_format
+    from seldon_microservice.proto import prediction_pb2
+
+    def make_grpc_feedback(i):
+        feedback = make_feedback(i, routing=1)
+        feedback["truth"] = {"data": feedback["truth"]}
+        return json_format.ParseDict(feedback, prediction_pb2.Feedback())
+
+    feedbacks = prediction_pb2.FeedbackList(feedbacks=[make_grpc_feedback(i) for i in range(2)])
+
+    model = BatchModel()
+    model_microservice.SeldonModelGRPC(model).SendFeedbackBatch(feedbacks, None)
+    assert model.batches == 1
+    assert model.feedbacks == [([[float(i), 1.0]], ["a", "b"], float(i), [[1.0]]) for i in range(2)]
+
+    monkeypatch.setattr(router_microservice, "PRED_UNIT_ID", "router")
+    batches = []
+
+    class Router(object):
+        def send_feedback_batch(self, feedbacks):
+            batches.append([(routing, reward) for _, _, routing, reward, _ in feedbacks])
+
+    router_microservice.SeldonRouterGRPC(Router()).SendFeedbackBatch(feedbacks, None)
+    assert batches == [[(1, 0.0), (1, 1.0)]]
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from seldon_microservice.feedback_queue import FeedbackQueue, FeedbackQueueFull, with_feedback_queue, \
+    add_feedback_metrics_endpoint
+
+
+class BlockedHandler(object):
+    """Records batches, holding the worker on its first batch until released."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, batch):
+        self.started.set()
+        self.release.wait(5)
+        self.batches.append(batch)
+
+
+def fill(policy, timeout=0.05):
+    handler = BlockedHandler()
+    queue = FeedbackQueue(handler, maxsize=2, batch_size=10, policy=policy, timeout=timeout).start()
+    queue.put(0)
+    assert handler.started.wait(5)
+    queue.put(1)
+    queue.put(2)
+    return handler, queue
+
+
+def test_feedback_is_handled_in_micro_batches():
+    handler = BlockedHandler()
+    queue = FeedbackQueue(handler, maxsize=100, batch_size=4).start()
+    for i in range(10):
+        queue.put(i)
+    handler.release.set()
+    assert queue.join(5)
+    assert [item for batch in handler.batches for item in batch] == list(range(10))
+    assert max(len(batch) for batch in handler.batches) == 4
+    metrics = queue.metrics()
+    assert metrics["processed"] == 10 and metrics["depth"] == 0
+    assert metrics["batches"] == len(handler.batches) < 10
+    queue.stop()
+
+
+def test_block_policy_rejects_after_timeout():
+    handler, queue = fill("block")
+    t1 = time.time()
+    with pytest.raises(FeedbackQueueFull) as e:
+        queue.put(3)
+    assert time.time() - t1 >= 0.05
+    assert e.value.status_code == 503
+    metrics = queue.metrics()
+    assert metrics["rejected"] == 1 and metrics["depth"] == 2 and metrics["lag_seconds"] > 0
+    handler.release.set()
+    queue.stop()
+    assert handler.batches == [[0], [1, 2]]
+
+
+def test_block_policy_waits_for_room():
+    handler, queue = fill("block", timeout=5)
+    threading.Timer(0.05, handler.release.set).start()
+    queue.put(3)
+    queue.stop()
+    assert [item for batch in handler.batches for item in batch] == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("policy,kept", [("drop-newest", [1, 2]), ("drop-oldest", [2, 3])])
+def test_drop_policies_shed_feedback(policy, kept):
+    handler, queue = fill(policy)
+    queue.put(3)
+    assert queue.metrics()["dropped"] == 1
+    handler.release.set()
+    queue.stop()
+    assert handler.batches == [[0], kept]
+
+
+def test_failed_batches_do_not_stop_the_worker():
+    def handle(batch):
+        if 0 in batch:
+            raise ValueError("bad feedback")
+
+    queue = FeedbackQueue(handle, maxsize=10, batch_size=1).start()
+    for i in range(3):
+        queue.put(i)
+    queue.stop()
+    assert queue.metrics()["failed"] == 1
+    assert queue.metrics()["processed"] == 2
+
+
+def test_block_policy_queues_a_batch_whole_or_not_at_all():
+    handler, queue = fill("block")
+    handler.release.set()
+    assert queue.join(5)
+    handler.release.clear()
+    handler.started.clear()
+    queue.put(3)
+    assert handler.started.wait(5)
+    # one slot left, a batch of two waits for room then is rejected entirely
+    queue.put(4)
+    with pytest.raises(FeedbackQueueFull):
+        queue.put_many([5, 6])
+    with pytest.raises(FeedbackQueueFull):
+        queue.put_many(list(range(3)))
+    assert queue.metrics()["depth"] == 1 and queue.metrics()["rejected"] == 5
+    handler.release.set()
+    queue.stop()
+    assert [item for batch in handler.batches for item in batch] == [0, 1, 2, 3, 4]
+
+
+def test_grpc_full_queue_is_resource_exhausted():
+    pytest.importorskip("grpc")
+    from seldon_microservice import model_microservice
+    from seldon_microservice.common import array_to_grpc_datadef
+    from seldon_microservice.proto import prediction_pb2
+
+    class Context(object):
+        def abort(self, code, details):
+            self.code = code
+            raise Exception(details)
+
+    class Model(object):
+        def send_feedback(self, features, feature_names, reward, truth):
+            pass
+
+    served = with_feedback_queue(Model(), 1, timeout=0.01)
+    handler = BlockedHandler()
+    served.feedback_queue.handle_batch = handler
+    servicer = model_microservice.SeldonModelGRPC(served)
+    message = prediction_pb2.SeldonMessage(data=array_to_grpc_datadef(np.ones((1, 1)), [], "tensor"))
+    feedback = prediction_pb2.Feedback(request=message, truth=message, reward=1.0)
+    servicer.SendFeedback(feedback, Context())
+    assert handler.started.wait(5)
+    servicer.SendFeedback(feedback, Context())
+    context = Context()
+    with pytest.raises(Exception):
+        servicer.SendFeedbackBatch(prediction_pb2.FeedbackList(feedbacks=[feedback]), context)
+    import grpc
+    assert context.code == grpc.StatusCode.RESOURCE_EXHAUSTED
+    handler.release.set()
+    served.feedback_queue.stop()
+
+
+def test_rest_feedback_is_acknowledged_before_the_update():
+    pytest.importorskip("flask")
+    from seldon_microservice import model_microservice
+
+    class SlowModel(object):
+        def __init__(self):
+            self.rewards = []
+
+        def predict(self, X, feature_names):
+            return X
+
+        def send_feedback(self, features, feature_names, reward, truth):
+            time.sleep(0.2)
+            self.rewards.append(reward)
+
+    model = SlowModel()
+    served = with_feedback_queue(model, 10)
+    app = model_microservice.get_rest_microservice(served)
+    add_feedback_metrics_endpoint(app, served)
+    client = app.test_client()
+    feedback = {"request": {"data": {"ndarray": [[1.0]]}}, "reward": 1.0}
+    t1 = time.time()
+    assert client.post("/send-feedback", data={"json": json.dumps(feedback)}).status_code == 200
+    assert time.time() - t1 < 0.2
+    assert client.post("/predict", data={"json": json.dumps({"data": {"ndarray": [[2.0]]}})}).status_code == 200
+    served.feedback_queue.stop()
+    assert model.rewards == [1.0]
+    metrics = json.loads(client.get("/feedback-metrics").data.decode("utf-8"))
+    assert metrics["processed"] == 1
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from seldon_microservice.histogram import LatencyHistogram
+
+
+def test_percentiles_within_precision():
+    values = np.random.RandomState(0).lognormal(8, 1.5, size=100000).astype(np.int64)
+    histogram = LatencyHistogram(significant_figures=3)
+    histogram.record_values(values)
+    assert histogram.total_count == len(values)
+    ordered = np.sort(values)
+    for p, value in histogram.percentiles((50, 90, 99, 99.9)).items():
+        # nearest-rank percentile
+        expected = ordered[int(np.ceil(p / 100. * len(values))) - 1]
+        assert abs(value - expected) <= max(expected * 2e-3, 1)
+    assert histogram.max_value == values.max()
+
+
+def test_add_and_reset():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    first.record_values(range(1, 101))
+    second.record(1000000, count=100)
+    total = first.copy().add(second)
+    assert total.total_count == 200
+    assert total.min_value == 1
+    assert total.value_at_percentile(50) == 100
+    assert abs(total.value_at_percentile(99) - 1000000) <= 1000
+    first.reset()
+    assert first.total_count == 0
+    assert first.value_at_percentile(50) is None
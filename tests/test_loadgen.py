@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import csv
+import json
+import threading
+import time
+
+from seldon_microservice.loadgen import run_load
+
+
+def test_closed_loop_runs_every_request_concurrently():
+    lock = threading.Lock()
+    active = [0, 0]
+    seen = []
+
+    def send(request):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return request * 2
+
+    result = run_load(send, lambda i: i, 40, concurrency=4,
+                      on_response=lambda i, request, response: seen.append(response))
+    assert result.n_requests == 40
+    assert result.errors == 0
+    assert sorted(seen) == list(range(0, 80, 2))
+    assert active[1] == 4
+    assert result.throughput > 100
+
+
+def test_errors_are_counted_not_timed():
+    def send(request):
+        if request % 2:
+            raise RuntimeError("failed")
+        return request
+
+    failed = []
+    result = run_load(send, lambda i: i, 10, concurrency=2,
+                      on_error=lambda i, request, e: failed.append(i))
+    assert result.errors == 5
+    assert result.completed == 5
+    assert sorted(failed) == [1, 3, 5, 7, 9]
+
+
+def test_open_loop_follows_target_rate():
+    result = run_load(lambda request: request, lambda i: i, 20, concurrency=2, rate=100)
+    # the last request is scheduled 190ms after the start
+    assert result.duration >= 0.19
+    assert abs(result.throughput - 100) < 25
+
+
+def test_report_has_percentiles():
+    result = run_load(lambda request: request, lambda i: i, 10)
+    summary = result.summary()
+    assert set(summary["latency_ms"]) == {"p50", "p90", "p99", "p99.9", "mean", "max"}
+    assert "p99.9" in result.report()
+
+
+def test_open_loop_latency_includes_queueing_delay():
+    # one worker and 10ms requests scheduled every 5ms: requests wait longer and longer
+    # for the worker, which the scheduled-time latency has to show
+    def send(request):
+        time.sleep(0.01)
+
+    result = run_load(send, lambda i: i, 20, concurrency=1, rate=200)
+    service = result.service_histogram.value_at_percentile(99)
+    response = result.response_histogram.value_at_percentile(99)
+    assert service < 20000
+    assert response > 80000
+
+
+def test_wall_clock_steps_do_not_skew_latencies(monkeypatch):
+    real_time = time.time
+    steps = [0]
+
+    def stepping_time():
+        # the wall clock jumps an hour back at every reading
+        steps[0] += 1
+        return real_time() - 3600 * steps[0]
+
+    monkeypatch.setattr(time, "time", stepping_time)
+    result = run_load(lambda request: time.sleep(0.001), lambda i: i, 20, rate=1000)
+    assert result.errors == 0
+    assert result.response_histogram.max_value < 1000000
+    assert 0 < result.duration < 60
+
+
+def test_interval_reports_and_output(tmpdir):
+    intervals = []
+    result = run_load(lambda request: time.sleep(0.001), lambda i: i, 30, rate=100,
+                      interval=0.1, on_interval=intervals.append)
+    assert len(intervals) >= 2
+    assert intervals == result.intervals
+    assert sum(interval["requests"] for interval in intervals) == 30
+
+    json_file = str(tmpdir.join("report.json"))
+    result.write(json_file)
+    with open(json_file) as f:
+        report = json.load(f)
+    assert report["coordinated_omission_corrected"]
+    assert report["requests"] == 30
+    assert len(report["intervals"]) == len(intervals)
+
+    csv_file = str(tmpdir.join("report.csv"))
+    result.write(csv_file)
+    with open(csv_file) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(intervals) + 1
+    assert rows[-1]["interval"] == "total"
+    assert float(rows[-1]["p99_ms"]) > 0
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import importlib
+import sys
+
+import numpy as np
+import pytest
+
+from seldon_microservice import object_cache
+
+MODEL_SOURCE = '''
+import numpy as np
+
+class CachedModel(object):
+    constructions = 0
+
+    def __init__(self, size=10, version={version}):
+        CachedModel.constructions += 1
+        self.weights = np.arange(size, dtype=np.float64) * version
+
+    def predict(self, X, feature_names):
+        return X.dot(self.weights[:X.shape[1]])
+'''
+
+
+@pytest.fixture
+def user_module(tmpdir, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmpdir))
+
+    def load(version=1):
+        tmpdir.join("CachedModel.py").write(MODEL_SOURCE.format(version=version))
+        sys.modules.pop("CachedModel", None)
+        importlib.invalidate_caches()
+        return importlib.import_module("CachedModel")
+
+    yield load
+    sys.modules.pop("CachedModel", None)
+
+
+def test_constructed_once_then_loaded(tmpdir, user_module):
+    cache_dir = str(tmpdir.join("cache"))
+    module = user_module()
+    first = object_cache.construct(module.CachedModel, {"size": 1000}, cache_dir, module)
+    second = object_cache.construct(module.CachedModel, {"size": 1000}, cache_dir, module)
+    assert module.CachedModel.constructions == 1
+    np.testing.assert_array_equal(second.weights, first.weights)
+    assert second.predict(np.ones((1, 3)), None) == 3.0
+    # other parameters, e.g. of another deployment, are another entry kept alongside
+    object_cache.construct(module.CachedModel, {"size": 5}, cache_dir, module)
+    object_cache.construct(module.CachedModel, {"size": 1000}, cache_dir, module)
+    assert module.CachedModel.constructions == 2
+    assert len(tmpdir.join("cache").listdir()) == 2
+
+
+def test_code_change_invalidates_the_cache(tmpdir, user_module):
+    cache_dir = str(tmpdir.join("cache"))
+    module = user_module(version=1)
+    object_cache.construct(module.CachedModel, {}, cache_dir, module)
+    module = user_module(version=2)
+    user_object = object_cache.construct(module.CachedModel, {}, cache_dir, module)
+    assert module.CachedModel.constructions == 1
+    assert user_object.weights[1] == 2.0
+    # the entry of the old code is removed
+    assert len(tmpdir.join("cache").listdir()) == 1
+
+
+def test_stale_entry_removed_by_another_replica(tmpdir, user_module, monkeypatch):
+    cache_dir = str(tmpdir.join("cache"))
+    module = user_module(version=1)
+    object_cache.construct(module.CachedModel, {}, cache_dir, module)
+    module = user_module(version=2)
+
+    def removed_meanwhile(filename):
+        raise OSError(2, "No such file or directory", filename)
+
+    monkeypatch.setattr(object_cache.os, "remove", removed_meanwhile)
+    user_object = object_cache.construct(module.CachedModel, {}, cache_dir, module)
+    assert user_object.weights[1] == 2.0
+
+
+def test_corrupt_entry_is_rebuilt(tmpdir, user_module):
+    cache_dir = tmpdir.join("cache")
+    module = user_module()
+    key = object_cache.cache_key("CachedModel", {}, module)
+    cache_dir.ensure(dir=True)
+    cache_dir.join("CachedModel-{}.object".format(key)).write("garbage")
+    user_object = object_cache.construct(module.CachedModel, {}, str(cache_dir), module)
+    assert user_object.weights.shape == (10,)
+    assert object_cache.construct(module.CachedModel, {}, str(cache_dir), module).weights.shape == (10,)
+    assert module.CachedModel.constructions == 1
+
+
+def test_without_cache_dir_the_class_is_called(user_module):
+    module = user_module()
+    object_cache.construct(module.CachedModel, {}, None)
+    assert module.CachedModel.constructions == 1
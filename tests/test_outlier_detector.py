@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import numpy as np
+import pytest
+
+from seldon_microservice import outlier_detector_microservice as outlier
+
+
+class Detector(object):
+
+    def score(self, X, feature_names):
+        return np.abs(X).sum(axis=1).astype(np.float32)
+
+
+def test_scores_encodings_roundtrip():
+    scores = np.array([0.5, 1.25, -3.0], dtype=np.float32)
+    assert outlier.encode_scores(scores, "list") == [0.5, 1.25, -3.0]
+    packed = outlier.encode_scores(scores, "packed")
+    np.testing.assert_array_equal(outlier.decode_scores(packed), scores)
+    np.testing.assert_array_equal(outlier.decode_scores([0.5, 1.25, -3.0]), scores)
+
+
+@pytest.mark.parametrize("encoding", ["list", "packed"])
+def test_rest_tags_the_request(monkeypatch, encoding):
+    pytest.importorskip("flask")
+    monkeypatch.setattr(outlier, "OUTLIER_SCORE_ENCODING", encoding)
+    client = outlier.get_rest_microservice(Detector()).test_client()
+    request = {"data": {"names": ["a", "b"], "ndarray": [[1.0, -2.0], [0.5, 0.0]]}}
+    rv = client.post("/transform-input", data={"json": json.dumps(request)})
+    assert rv.status_code == 200
+    response = json.loads(rv.data.decode("utf-8"))
+    assert response["data"] == request["data"]
+    np.testing.assert_array_equal(outlier.decode_scores(response["meta"]["tags"]["outlierScore"]), [3.0, 0.5])
+
+
+def make_grpc_request():
+    from seldon_microservice.common import array_to_grpc_datadef
+    from seldon_microservice.proto import prediction_pb2
+    request = prediction_pb2.SeldonMessage(data=array_to_grpc_datadef(np.array([[1.0, -2.0]]), ["a", "b"], "tensor"))
+    request.meta.puid = "p1"
+    request.meta.tags["other"].string_value = "kept"
+    return request
+
+
+def test_grpc_pass_through_patches_only_the_meta():
+    pytest.importorskip("grpc")
+    from seldon_microservice.proto import prediction_pb2
+
+    request = make_grpc_request()
+    detector = outlier.SeldonTransformerGRPC(Detector())
+    response_bytes = detector.TransformInputBytes(request.SerializeToString(), None)
+    assert response_bytes.startswith(request.SerializeToString())
+    response = prediction_pb2.SeldonMessage.FromString(response_bytes)
+    assert response == detector.TransformInput(make_grpc_request(), None)
+    assert response.data == request.data
+    assert response.meta.puid == "p1"
+    assert response.meta.tags["other"].string_value == "kept"
+    assert [v.number_value for v in response.meta.tags["outlierScore"].list_value.values] == [3.0]
+
+
+@pytest.mark.parametrize("passthrough", [False, True])
+def test_grpc_server_serves_transform_input(monkeypatch, passthrough):
+    grpc = pytest.importorskip("grpc")
+    from seldon_microservice.benchmark import free_port
+    from seldon_microservice.proto import prediction_pb2_grpc
+
+    called = []
+    for name in ("TransformInput", "TransformInputBytes"):
+        method = getattr(outlier.SeldonTransformerGRPC, name)
+        monkeypatch.setattr(outlier.SeldonTransformerGRPC, name,
+                            lambda self, *args, _name=name, _method=method: called.append(_name) or _method(self, *args))
+    port = free_port()
+    server = outlier.get_grpc_server(Detector(), passthrough=passthrough)
+    server.add_insecure_port("127.0.0.1:{}".format(port))
+    server.start()
+    try:
+        channel = grpc.insecure_channel("127.0.0.1:{}".format(port))
+        response = prediction_pb2_grpc.TransformerStub(channel).TransformInput(make_grpc_request(), timeout=10)
+        assert list(response.data.tensor.values) == [1.0, -2.0]
+        assert response.meta.tags["outlierScore"].list_value.values[0].number_value == 3.0
+        assert response.meta.tags["other"].string_value == "kept"
+        assert called == ["TransformInputBytes" if passthrough else "TransformInput"]
+        channel.close()
+    finally:
+        server.stop(0)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from seldon_microservice import persistence
+
+
+class FakeRedis(object):
+    """In-memory stand-in for the subset of redis.StrictRedis (and fakeredis) used by persistence."""
+
+    def __init__(self, *args, **kwargs):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value):
+        self.store[key] = bytes(value) if isinstance(value, memoryview) else value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def rpush(self, key, value):
+        self.store.setdefault(key, []).append(value)
+
+    def lrange(self, key, start, end):
+        values = self.store.get(key, [])
+        return values[start:] if end == -1 else values[start:end + 1]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.commands.append((name, args))
+        return queue
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def redis_backend(fake_redis):
+    return persistence.RedisBackend(client=fake_redis)
+
+
+@pytest.fixture(params=["redis", "file"])
+def backend(request, tmpdir):
+    if request.param == "redis":
+        return persistence.RedisBackend(client=FakeRedis())
+    return persistence.FileBackend(str(tmpdir))
+
+
+class Counters(object):
+
+    def __init__(self):
+        self.counts = {}
+        self.dirty = set()
+
+    def update(self, key):
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.dirty.add(key)
+
+    def get_state_delta(self):
+        if not self.dirty:
+            return None
+        delta = dict((key, self.counts[key]) for key in self.dirty)
+        self.dirty = set()
+        return delta
+
+    def apply_state_delta(self, delta):
+        self.counts.update(delta)
+
+
+def test_restore_without_saved_state(backend):
+    user_object = persistence.restore(Counters, {}, backend=backend)
+    assert user_object.counts == {}
+
+
+def test_deltas_are_replayed_on_restore(backend):
+    user_object = Counters()
+    thread = persistence.PersistenceThread(user_object, 1, compaction_frequency=3, backend=backend)
+
+    user_object.update("a")
+    thread.push()
+    thread.push()  # nothing changed, no delta written
+    user_object.update("b")
+    user_object.update("a")
+    thread.push()
+
+    assert backend.load_state() is None
+    assert len(backend.load_deltas()) == 2
+    assert persistence.restore(Counters, {}, backend=backend).counts == {"a": 2, "b": 1}
+
+
+def test_compaction_writes_snapshot_and_drops_deltas(backend):
+    user_object = Counters()
+    thread = persistence.PersistenceThread(user_object, 1, compaction_frequency=1, backend=backend)
+
+    user_object.update("a")
+    thread.push()
+    user_object.update("a")
+    thread.push()  # compaction
+    assert backend.load_deltas() == []
+
+    user_object.update("c")
+    thread.push()
+    restored = persistence.restore(Counters, {}, backend=backend)
+    assert restored.counts == {"a": 2, "c": 1}
+    assert not restored.dirty
+
+
+def test_full_snapshot_without_delta_protocol(backend):
+    user_object = {"weights": [1, 2, 3]}
+    thread = persistence.PersistenceThread(user_object, 1, backend=backend)
+    thread.push()
+    assert persistence.restore(dict, {}, backend=backend) == {"weights": [1, 2, 3]}
+
+
+def test_snapshot_is_compressed_and_chunked(fake_redis, redis_backend, monkeypatch):
+    monkeypatch.setattr(persistence, "CHUNK_SIZE", 64)
+    monkeypatch.setattr(persistence, "PIPELINE_SIZE", 3)
+    user_object = {"weights": list(range(1000))}
+    thread = persistence.PersistenceThread(user_object, 1, backend=redis_backend)
+    thread.push()
+
+    manifest = persistence.read_manifest(fake_redis)
+    assert manifest["codec"] == persistence.CODEC
+    assert manifest["compressed_size"] < manifest["size"]
+    assert manifest["chunks"] > persistence.PIPELINE_SIZE
+    assert persistence.restore(dict, {}, backend=redis_backend) == user_object
+
+    # a new snapshot replaces the previous generation of chunks
+    user_object["weights"].append(-1)
+    thread.push()
+    new_manifest = persistence.read_manifest(fake_redis)
+    assert new_manifest["generation"] > manifest["generation"]
+    assert persistence.chunk_key(manifest["generation"], 0) not in fake_redis.store
+    assert persistence.restore(dict, {}, backend=redis_backend) == user_object
+
+
+def test_restore_legacy_single_key_state(fake_redis, redis_backend):
+    fake_redis.store[persistence.REDIS_KEY] = persistence.pickle.dumps({"legacy": True})
+    assert persistence.restore(dict, {}, backend=redis_backend) == {"legacy": True}
+
+
+@pytest.mark.parametrize("codec", ["zlib", "none", "zstd", "lz4"])
+def test_codec_roundtrip(codec):
+    if codec == "zstd" and persistence.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    if codec == "lz4" and persistence.lz4_frame is None:
+        pytest.skip("lz4 is not installed")
+    data = b"seldon" * 1000
+    assert persistence.decompress(persistence.compress(data, codec), codec) == data
+
+
+def test_file_backend_restores_arrays_from_memory_map(tmpdir):
+    np = pytest.importorskip("numpy")
+    if persistence.pickle.HIGHEST_PROTOCOL < 5:
+        pytest.skip("out-of-band buffers need pickle protocol 5")
+    backend = persistence.FileBackend(str(tmpdir))
+    user_object = {"weights": np.arange(100000, dtype=np.float32).reshape(1000, 100),
+                   "bias": np.ones(7)}
+    backend.save_state(user_object)
+    assert [f.basename for f in tmpdir.listdir()] == [persistence.REDIS_KEY + ".state"]
+
+    restored = backend.load_state()
+    np.testing.assert_array_equal(restored["weights"], user_object["weights"])
+    np.testing.assert_array_equal(restored["bias"], user_object["bias"])
+    assert not restored["weights"].flags.owndata
+    assert restored["weights"].ctypes.data % persistence.FILE_ALIGNMENT == 0
+    # copy-on-write: the restored arrays can be modified without touching the file
+    restored["weights"][0, 0] = -1
+    assert backend.load_state()["weights"][0, 0] == 0
+
+
+def test_file_backend_ignores_partial_delta(tmpdir):
+    backend = persistence.FileBackend(str(tmpdir))
+    backend.append_delta({"a": 1})
+    with open(backend.deltas_file, "ab") as f:
+        f.write(persistence.DELTA_HEADER.pack(100) + b"trunc")
+    assert backend.load_deltas() == [{"a": 1}]
+
+
+def test_snapshots_and_artifacts_are_synced_before_they_replace_a_file(tmpdir, monkeypatch):
+    import os
+    import stat
+    import numpy as np
+    from seldon_microservice import artifacts
+
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(stat.S_ISDIR(os.fstat(fd).st_mode)) or fsync(fd))
+    persistence.dump_file({"a": 1}, str(tmpdir.join("state")))
+    artifacts.save_artifacts(str(tmpdir.join("model")), weights=np.ones(3))
+    # the file, then its directory, for the snapshot, the artifact and the manifest
+    assert synced == [False, True] * 3
+
+    def fail(f):
+        f.write(b"partial")
+        raise IOError("disk full")
+
+    with pytest.raises(IOError):
+        persistence.write_atomically(str(tmpdir.join("state")), fail)
+    assert persistence.load_file(str(tmpdir.join("state"))) == {"a": 1}
+    assert [f.basename for f in tmpdir.listdir() if f.basename.startswith(".tmp")] == []
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import numpy as np
+import pytest
+
+from seldon_microservice import model_microservice
+from seldon_microservice.pipeline import Pipeline, step_parameters
+
+
+class Scaler(object):
+    feature_names = ["scaled"]
+
+    def __init__(self, factor=2.0):
+        self.factor = factor
+
+    def transform_input(self, X, feature_names):
+        return X * self.factor
+
+
+class Detector(object):
+
+    def score(self, X, feature_names):
+        return np.abs(X).sum(axis=1)
+
+
+class Model(object):
+    class_names = ["proba"]
+
+    def __init__(self):
+        self.feedbacks = []
+
+    def predict(self, X, feature_names):
+        assert feature_names == ["scaled"]
+        return X + 1
+
+    def send_feedback(self, features, feature_names, reward, truth):
+        self.feedbacks.append((features.tolist(), feature_names, reward))
+
+
+class Rounder(object):
+    class_names = ["rounded"]
+
+    def transform_output(self, X, feature_names):
+        assert feature_names == ["proba"]
+        return np.round(X)
+
+
+def make_pipeline():
+    model = Model()
+    return Pipeline([Detector(), Rounder(), Scaler(), model]), model
+
+
+def test_steps_are_chained_in_graph_order():
+    pipeline, _ = make_pipeline()
+    predictions = pipeline.predict(np.array([[0.2], [-1.4]]), ["x"])
+    np.testing.assert_array_equal(predictions, [[1.0], [-2.0]])
+    assert pipeline.class_names == ["rounded"]
+    assert pipeline.tags() == {"outlierScore": [0.2, 1.4]}
+
+
+def test_feedback_reaches_models_with_their_features():
+    pipeline, model = make_pipeline()
+    pipeline.send_feedback(np.array([[1.0]]), ["x"], 1.0, None)
+    assert model.feedbacks == [([[2.0]], ["scaled"], 1.0)]
+
+
+def test_step_parameters():
+    parameters = {"Scaler.factor": 3.0, "Model.factor": 1.0, "debug": True}
+    assert step_parameters("Scaler", parameters) == {"factor": 3.0, "debug": True}
+
+
+def test_rest_predict_returns_the_tags():
+    pytest.importorskip("flask")
+    pipeline, _ = make_pipeline()
+    client = model_microservice.get_rest_microservice(pipeline).test_client()
+    rv = client.post("/predict", data={"json": json.dumps({"data": {"names": ["x"], "ndarray": [[0.2]]}})})
+    response = json.loads(rv.data.decode("utf-8"))
+    assert rv.status_code == 200
+    assert response["data"] == {"names": ["rounded"], "ndarray": [[1.0]]}
+    assert response["meta"]["tags"] == {"outlierScore": [0.2]}
+
+
+def test_grpc_predict_returns_the_tags():
+    pytest.importorskip("grpc")
+    from seldon_microservice.common import array_to_grpc_datadef, grpc_datadef_to_array
+    from seldon_microservice.proto import prediction_pb2
+
+    pipeline, _ = make_pipeline()
+    request = prediction_pb2.SeldonMessage(data=array_to_grpc_datadef(np.array([[0.2]]), ["x"], "tensor"))
+    response = model_microservice.SeldonModelGRPC(pipeline).Predict(request, None)
+    np.testing.assert_array_equal(grpc_datadef_to_array(response.data), [[1.0]])
+    assert list(response.data.names) == ["rounded"]
+    assert response.meta.tags["outlierScore"].list_value.values[0].number_value == 0.2
+
+
+def test_models_with_a_tags_attribute_are_not_called():
+    pytest.importorskip("flask")
+    pytest.importorskip("grpc")
+    from seldon_microservice.common import array_to_grpc_datadef
+    from seldon_microservice.proto import prediction_pb2
+
+    class TaggedModel(object):
+        tags = ["a"]
+
+        def predict(self, X, feature_names):
+            return X
+
+    client = model_microservice.get_rest_microservice(TaggedModel()).test_client()
+    rv = client.post("/predict", data={"json": json.dumps({"data": {"ndarray": [[0.2]]}})})
+    assert rv.status_code == 200
+    assert "meta" not in json.loads(rv.data.decode("utf-8"))
+    request = prediction_pb2.SeldonMessage(data=array_to_grpc_datadef(np.array([[0.2]]), [], "tensor"))
+    response = model_microservice.SeldonModelGRPC(TaggedModel()).Predict(request, None)
+    assert len(response.meta.tags) == 0
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("flask")
+
+from seldon_microservice import router_microservice  # noqa: E402
+
+
+class RowRouter(object):
+
+    def route(self, features, feature_names):
+        return 0
+
+    def route_batch(self, features, feature_names):
+        return (features[:, 0] > 0).astype(int)
+
+
+class SingleRouter(object):
+
+    def route(self, features, feature_names):
+        return 1
+
+
+def post_route(router, ndarray):
+    client = router_microservice.get_rest_microservice(router).test_client()
+    rv = client.post("/route", data={"json": json.dumps({"data": {"ndarray": ndarray}})})
+    return rv.status_code, json.loads(rv.data.decode("utf-8"))
+
+
+def test_rest_routes_each_row():
+    status, response = post_route(RowRouter(), [[1.0], [-1.0], [2.0]])
+    assert status == 200
+    assert response["data"]["ndarray"] == [[1], [0], [1]]
+
+
+def test_rest_single_route_without_route_batch():
+    status, response = post_route(SingleRouter(), [[1.0], [-1.0]])
+    assert status == 200
+    assert response["data"]["ndarray"] == [[1]]
+
+
+def test_route_batch_must_route_every_row():
+    class ShortRouter(RowRouter):
+        def route_batch(self, features, feature_names):
+            return [0]
+
+    status, response = post_route(ShortRouter(), [[1.0], [2.0]])
+    assert status == 400
+    assert "2 rows" in response["status"]["info"]
+
+
+def test_grpc_routes_each_row():
+    pytest.importorskip("grpc")
+    from seldon_microservice.common import array_to_grpc_datadef, grpc_datadef_to_array
+    from seldon_microservice.proto import prediction_pb2
+
+    request = prediction_pb2.SeldonMessage(
+        data=array_to_grpc_datadef(np.array([[-1.0], [3.0]]), [], "tensor"))
+    response = router_microservice.SeldonRouterGRPC(RowRouter()).Route(request, None)
+    np.testing.assert_array_equal(grpc_datadef_to_array(response.data), [[0], [1]])
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+SERVICE_MODULES = (
+    "seldon_microservice.model_microservice",
+    "seldon_microservice.router_microservice",
+    "seldon_microservice.transformer_microservice",
+    "seldon_microservice.outlier_detector_microservice",
+    "seldon_microservice.combiner_microservice",
+)
+
+# milliseconds a service module may add to the start of the microservice, once
+# seldon_microservice.microservice and numpy are loaded. They take a few ms; importing a
+# transport at startup (flask alone takes ~200ms) exceeds it.
+SERVICE_MODULE_BUDGET_MS = 50
+
+HEAVY_MODULES = ("flask", "flask_cors", "grpc", "tornado", "flatbuffers", "google.protobuf")
+
+TRANSPORT_MODULES = {
+    "REST": ("flask", "flask_cors"),
+    "GRPC": ("grpc", "google.protobuf"),
+    "FBS": ("tornado", "flatbuffers"),
+}
+
+
+def import_profile(code):
+    """
+    Run code in a fresh interpreter with -X importtime, the same way the
+    seldon-microservice-python entry point starts, and return the imported
+    modules mapped to their cumulative import time in microseconds.
+    """
+    p = subprocess.Popen((sys.executable, "-X", "importtime", "-c", code),
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate()
+    assert p.returncode == 0, stderr.decode("utf-8")
+    profile = {}
+    for line in stderr.decode("utf-8").splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def imported(profile, package):
+    return [name for name in profile if name == package or name.startswith(package + ".")]
+
+
+@pytest.mark.parametrize("module", SERVICE_MODULES)
+def test_service_modules_import_no_transport(module):
+    profile = import_profile("import seldon_microservice.microservice, %s" % module)
+    for package in HEAVY_MODULES:
+        assert not imported(profile, package), "%s imported %s at startup" % (module, package)
+    import_ms = profile[module] / 1000.
+    print("%s: %.1f ms" % (module, import_ms))
+    assert import_ms < SERVICE_MODULE_BUDGET_MS, \
+        "%s took %.1f ms to import, over the %d ms budget" % (module, import_ms, SERVICE_MODULE_BUDGET_MS)
+
+
+@pytest.mark.parametrize("api_type", ["REST", "GRPC"])
+def test_transport_loads_only_its_dependencies(api_type):
+    if api_type == "REST":
+        start = "model_microservice.get_rest_microservice(object())"
+    else:
+        start = "model_microservice.get_grpc_server(object())"
+    code = ("import sys, json\n"
+            "from seldon_microservice import model_microservice\n"
+            "%s\n"
+            "print(json.dumps(sorted(sys.modules)))\n" % start)
+    modules = json.loads(subprocess.check_output((sys.executable, "-c", code)).decode("utf-8"))
+    for transport, packages in TRANSPORT_MODULES.items():
+        for package in packages:
+            loaded = [name for name in modules if name == package or name.startswith(package + ".")]
+            if transport == api_type:
+                assert loaded
+            else:
+                assert not loaded, "%s server imported %s" % (api_type, package)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import pickle
+
+import numpy as np
+import pytest
+
+from seldon_microservice import persistence
+from seldon_microservice.streaming_stats import RunningMoments, ExponentialMoments, Reservoir, TDigest
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    return rng.multivariate_normal([1.0, -2.0, 3.0], [[2.0, 0.5, 0.0], [0.5, 1.0, 0.3], [0.0, 0.3, 0.5]],
+                                   size=5000)
+
+
+def test_running_moments_match_numpy(data):
+    moments = RunningMoments(3)
+    for batch in np.array_split(data, 37):
+        moments.update(batch)
+    assert moments.count == 5000
+    np.testing.assert_allclose(moments.mean, data.mean(axis=0))
+    np.testing.assert_allclose(moments.covariance_matrix, np.cov(data, rowvar=False))
+    np.testing.assert_allclose(moments.variance, data.var(axis=0, ddof=1))
+
+    diagonal = RunningMoments(3, covariance=False).update(data[:2500]).merge(
+        RunningMoments(3, covariance=False).update(data[2500:]))
+    np.testing.assert_allclose(diagonal.variance, data.var(axis=0, ddof=1))
+
+
+def test_mahalanobis_flags_outliers(data):
+    moments = RunningMoments(3).update(data)
+    distances = moments.mahalanobis(np.array([[1.0, -2.0, 3.0], [10.0, 10.0, 10.0]]))
+    assert distances[0] < 0.1 < 5 < distances[1]
+
+
+def test_exponential_moments_forget_old_points():
+    moments = ExponentialMoments(1, half_life=100)
+    moments.update(np.zeros((1000, 1)))
+    moments.update(np.full((1000, 1), 5.0))
+    assert moments.mean[0] == pytest.approx(5.0, abs=0.01)
+    # batch updates are the same as one point at a time
+    single = ExponentialMoments(1, half_life=100)
+    for x in [1.0, 2.0, 4.0]:
+        single.update([[x]])
+    batch = ExponentialMoments(1, half_life=100).update([[1.0], [2.0], [4.0]])
+    np.testing.assert_allclose([batch.mean, batch.variance], [single.mean, single.variance])
+
+
+def test_reservoir_is_uniform_and_bounded():
+    counts = np.zeros(1000)
+    for seed in range(200):
+        reservoir = Reservoir(10, 1, seed=seed)
+        for batch in np.array_split(np.arange(1000.), 7):
+            reservoir.update(batch.reshape(-1, 1))
+        assert reservoir.sample.shape == (10, 1)
+        counts[reservoir.sample[:, 0].astype(int)] += 1
+    # each point is kept with probability 1/100: the first and last tenths as often
+    assert abs(counts[:100].sum() - counts[-100:].sum()) < 0.3 * counts[:100].sum()
+
+
+def test_tdigest_quantiles():
+    values = np.random.RandomState(1).exponential(size=100000)
+    digest = TDigest(compression=100)
+    for batch in np.array_split(values, 100):
+        digest.update(batch)
+    assert len(digest.means) <= 100
+    qs = [0.01, 0.1, 0.5, 0.9, 0.99]
+    np.testing.assert_allclose(digest.quantile(qs), np.quantile(values, qs), rtol=0.05)
+    assert digest.cdf(np.median(values)) == pytest.approx(0.5, abs=0.01)
+    assert digest.quantile(0.0) == values.min() and digest.quantile(1.0) == values.max()
+
+
+def test_statistics_are_persisted(tmpdir, data):
+    backend = persistence.FileBackend(str(tmpdir))
+    detector = {"moments": RunningMoments(3).update(data), "digest": TDigest().update(data[:, 0]),
+                "reservoir": Reservoir(5, 3, seed=0).update(data)}
+    backend.save_state(detector)
+    restored = backend.load_state()
+    np.testing.assert_allclose(restored["moments"].mean, detector["moments"].mean)
+    assert restored["digest"].quantile(0.5) == detector["digest"].quantile(0.5)
+    restored["reservoir"].update(data)
+    assert pickle.loads(pickle.dumps(restored["reservoir"])).count == 10000
+
+
+def test_concurrent_updates_are_not_lost(data):
+    import threading
+
+    moments, digest = RunningMoments(3), TDigest(buffer_size=64)
+    batches = np.array_split(data, 100)
+    barrier = threading.Barrier(8)
+
+    def update(batches):
+        barrier.wait()
+        for batch in batches:
+            moments.update(batch)
+            digest.update(batch[:, 0])
+            digest.quantile(0.5)
+            moments.mahalanobis(batch)
+
+    threads = [threading.Thread(target=update, args=(batches[i::8],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert moments.count == len(data)
+    np.testing.assert_allclose(moments.mean, data.mean(axis=0))
+    np.testing.assert_allclose(moments.covariance_matrix, np.cov(data, rowvar=False))
+    assert digest.count == len(data)
+    restored = pickle.loads(pickle.dumps(digest))
+    assert restored.count == len(data)
+    assert restored.update([0.0]).count == len(data) + 1
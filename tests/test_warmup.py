@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+from os.path import dirname, join
+import threading
+
+from seldon_microservice import model_microservice
+from seldon_microservice.warmup import warmup, warmup_in_background, add_health_endpoints
+
+CONTRACT = join(dirname(__file__), "model-template-app", "contract.json")
+
+
+class CountingModel(object):
+
+    def __init__(self):
+        self.batch_shapes = []
+
+    def predict(self, X, feature_names):
+        self.batch_shapes.append(X.shape)
+        return X
+
+
+class HookModel(CountingModel):
+
+    def __init__(self):
+        super(HookModel, self).__init__()
+        self.warmed_up = False
+
+    def warmup(self):
+        self.warmed_up = True
+
+
+def test_warmup_from_contract():
+    model = CountingModel()
+    calls = warmup(model, "MODEL", n_requests=2, batch_sizes=[1, 8], contract_file=CONTRACT)
+    assert calls == 4
+    assert model.batch_shapes == [(1, 4), (1, 4), (8, 4), (8, 4)]
+
+
+def test_warmup_hook_takes_precedence():
+    model = HookModel()
+    warmup(model, "MODEL", n_requests=2, contract_file=CONTRACT)
+    assert model.warmed_up
+    assert model.batch_shapes == []
+
+
+def test_warmup_without_contract_is_skipped():
+    model = CountingModel()
+    assert warmup(model, "MODEL", n_requests=2, contract_file="missing.json") == 0
+
+
+def test_ready_endpoint_waits_for_warmup():
+    model = CountingModel()
+    app = model_microservice.get_rest_microservice(model)
+    ready = threading.Event()
+    add_health_endpoints(app, ready)
+    client = app.test_client()
+
+    assert client.get("/live").status_code == 200
+    assert client.get("/ready").status_code == 503
+
+    warmup_in_background(ready, model, "MODEL", 1, [2], CONTRACT).join()
+    assert client.get("/ready").status_code == 200
+    assert model.batch_shapes == [(2, 4)]